@@ -0,0 +1,899 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from hashtag_analyzer import HashtagAnalyzer
+from models.database import Database, to_epoch
+from models.query_plans import QueryPlanRecorder, check_query_plans
+from services.fake_api_client import FakeApiClient, SimpleDataset, SyntheticDataset
+from services.fake_nominatim_server import FakeNominatimServer
+from services.geocoding_service import GeocodingService
+from services.monitor_scheduler import FakeClock
+from services.response_archive import ResponseArchive, ReplayApiClient, zstandard
+from services.result_cache import ResultCache
+from services.sentiment_analyzer import SentimentAnalyzer
+from services.twitter_service import TwitterService, orjson, parse_twitter_date
+
+
+def benchmark_pipeline(args):
+    """Compare serial and pipelined tweet collection against a fake API."""
+    for pipelined in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            client = FakeApiClient(
+                dataset=SimpleDataset(total_tweets=args.tweets, user_count=args.users),
+                latency=args.latency
+            )
+            analyzer = HashtagAnalyzer(os.path.join(tmp, 'benchmark.db'), api_client=client)
+            hashtag_id = analyzer.db.get_or_create_hashtag('benchmark')['id']
+            
+            started = time.perf_counter()
+            collected = analyzer._collect_tweets('benchmark', hashtag_id, args.tweets, 'Latest', pipelined)
+            elapsed = time.perf_counter() - started
+            analyzer.close()
+        
+        mode = 'pipelined' if pipelined else 'serial'
+        print(f"{mode:>10}: {collected['inserted']} tweets in {elapsed:.2f}s "
+              f"({collected['inserted'] / elapsed:.0f} tweets/s)")
+        for stage, stats in collected.get('pipeline', {}).items():
+            if isinstance(stats, dict):
+                print(f"{'':>12}{stage:>8}: {stats['pages']} pages, busy {stats['busy_seconds']:.2f}s, "
+                      f"{stats['tweets_per_second']:.0f} tweets/s")
+
+
+def benchmark_sentiment(args):
+    """Compare serial and process-pool sentiment scoring, and scoring with the memo cache."""
+    dataset = SimpleDataset(total_tweets=args.tweets)
+    texts = [dataset.item(index, '#benchmark')[0]['content'] + f" {index}" for index in range(args.tweets)]
+    
+    # Without a cache, so both passes run the engine on every text
+    analyzer = SentimentAnalyzer(workers=args.workers, parallel_threshold=1, cache_size=0, db=None)
+    
+    started = time.perf_counter()
+    serial = analyzer.analyze_tweets([{'content': text} for text in texts])
+    serial_seconds = time.perf_counter() - started
+    
+    # Start and warm up the pool outside the timed run
+    analyzer.analyze_tweets_parallel([{'content': text} for text in texts[:analyzer.workers * 2]])
+    started = time.perf_counter()
+    parallel = analyzer.analyze_tweets_parallel([{'content': text} for text in texts])
+    parallel_seconds = time.perf_counter() - started
+    analyzer.close()
+    
+    assert analyzer.cache_stats()['hits'] == 0
+    assert [t['sentiment_score'] for t in serial] == [t['sentiment_score'] for t in parallel]
+    print(f"  serial: {args.tweets / serial_seconds:.0f} tweets/s")
+    print(f"parallel: {args.tweets / parallel_seconds:.0f} tweets/s with {analyzer.workers} workers")
+    
+    # The cache on its own: a timeline with retweets scored cold, then again warm
+    synthetic = SyntheticDataset(total_tweets=args.tweets, user_count=args.tweets // 10)
+    timeline = [synthetic.item(index, '#benchmark')[0]['content'] for index in range(args.tweets)]
+    cached = SentimentAnalyzer(parallel_threshold=args.tweets + 1)
+    for label in ('cold', 'warm'):
+        cached.reset_cache_stats()
+        started = time.perf_counter()
+        cached.analyze_tweets([{'content': text} for text in timeline])
+        elapsed = time.perf_counter() - started
+        stats = cached.cache_stats()
+        print(f"{'cache ' + label:>10}: {args.tweets / elapsed:.0f} tweets/s, {stats['hit_rate']:.0%} hit rate")
+    cached.close()
+    
+    # The collection path scores one page at a time, with the default threshold
+    for workers in (1, analyzer.workers):
+        with tempfile.TemporaryDirectory() as tmp:
+            dataset = SyntheticDataset(total_tweets=args.tweets, user_count=args.tweets // 10)
+            page_analyzer = HashtagAnalyzer(os.path.join(tmp, 'sentiment.db'), api_client=FakeApiClient(dataset))
+            page_analyzer.sentiment_analyzer.close()
+            page_analyzer.sentiment_analyzer = SentimentAnalyzer(workers=workers, cache_size=0)
+            page_analyzer.sentiment_analyzer.analyze_tweets_parallel([{'content': text} for text in texts[:100]])
+            pages = [page_analyzer.twitter_service.search_hashtag('benchmark', 100, cursor=f"offset:{offset}")
+                     for offset in range(0, args.tweets, 100)]
+            
+            started = time.perf_counter()
+            for page in pages:
+                page_analyzer._process_page(page)
+            elapsed = time.perf_counter() - started
+            page_analyzer.close()
+        print(f"   pages: {args.tweets / elapsed:.0f} tweets/s through _process_page with {workers} worker(s)")
+
+
+def benchmark_lexicon(args):
+    """Compare the lexicon engine with TextBlob for throughput and score agreement."""
+    dataset = SimpleDataset(total_tweets=args.tweets)
+    texts = [dataset.item(index, '#benchmark')[0]['content'] + f" {index}" for index in range(args.tweets)]
+    
+    scores = {}
+    for engine in SentimentAnalyzer.ENGINES:
+        analyzer = SentimentAnalyzer(engine=engine, cache_size=0)
+        started = time.perf_counter()
+        scores[engine] = analyzer._run_engine(texts, parallel=False)
+        elapsed = time.perf_counter() - started
+        print(f"{engine:>9}: {args.tweets / elapsed:.0f} tweets/s")
+    
+    textblob_scores, lexicon_scores = scores['textblob'], scores['lexicon']
+    count = len(texts)
+    mean_t = sum(textblob_scores) / count
+    mean_l = sum(lexicon_scores) / count
+    covariance = sum((t - mean_t) * (l - mean_l) for t, l in zip(textblob_scores, lexicon_scores))
+    spread_t = sum((t - mean_t) ** 2 for t in textblob_scores) ** 0.5
+    spread_l = sum((l - mean_l) ** 2 for l in lexicon_scores) ** 0.5
+    label = analyzer.get_sentiment_label
+    
+    print(f"agreement: correlation {covariance / (spread_t * spread_l or 1):.3f}, "
+          f"mean abs diff {sum(abs(t - l) for t, l in zip(textblob_scores, lexicon_scores)) / count:.3f}, "
+          f"same label {sum(label(t) == label(l) for t, l in zip(textblob_scores, lexicon_scores)) / count:.1%}")
+
+
+
+def benchmark_geocode(args):
+    """Compare serial and concurrent geocoding against a local stand-in Nominatim server."""
+    # Every place written three ways, plus places the server doesn't know
+    locations = []
+    for index in range(args.locations):
+        locations += [f"Place {index}", f"place {index}!", f"  PLACE {index}"]
+    locations += [f"Nowhere {index}" for index in range(args.locations // 4)]
+    distinct = args.locations + args.locations // 4
+    
+    answers = {}
+    for concurrency in (1, args.concurrency):
+        with tempfile.TemporaryDirectory() as tmp, FakeNominatimServer(latency=args.latency) as server:
+            host = urlsplit(server.url).netloc
+            service = GeocodingService(
+                cache_file=os.path.join(tmp, 'cache.db'), legacy_cache_file=None, gazetteer_file=None,
+                endpoint=server.url, concurrency=concurrency, rate_limits={host: (args.rate, args.burst)}
+            )
+            
+            started = time.perf_counter()
+            if concurrency == 1:
+                answers[concurrency] = {location: service.geocode(location) for location in locations}
+            else:
+                answers[concurrency] = service.batch_geocode(locations)
+            elapsed = time.perf_counter() - started
+            service.close()
+        
+        assert server.requests == distinct, f"{server.requests} requests for {distinct} distinct places"
+        mode = 'serial' if concurrency == 1 else 'concurrent'
+        print(f"{mode:>10}: {len(locations)} locations in {elapsed:.2f}s, {server.requests} requests, "
+              f"at most {server.max_active} in flight")
+    
+    assert answers[1] == answers[args.concurrency]
+    
+    # Identical lookups issued together share one request
+    with FakeNominatimServer(latency=args.latency) as server:
+        service = GeocodingService(legacy_cache_file=None, gazetteer_file=None, endpoint=server.url,
+                                   concurrency=args.concurrency)
+        
+        async def same_place():
+            return await asyncio.gather(*(service.remote.lookup("Place 1", "place 1") for _ in range(20)))
+        
+        results = asyncio.run(same_place())
+        service.remote.close()
+    
+    assert server.requests == 1 and len(set(map(str, results))) == 1
+    print(f"coalescing: 20 identical lookups, {server.requests} request, {service.remote.coalesced} coalesced")
+
+
+
+def benchmark_results(args):
+    """Compare computing analysis results with serving them from the result cache."""
+    with tempfile.TemporaryDirectory() as tmp, FakeNominatimServer() as server:
+        client = FakeApiClient(dataset=SimpleDataset(total_tweets=args.tweets, user_count=args.users))
+        cache = ResultCache(cache_dir=os.path.join(tmp, 'results'))
+        geocoding_service = GeocodingService(
+            cache_file=os.path.join(tmp, 'location_cache.db'), legacy_cache_file=None, endpoint=server.url
+        )
+        analyzer = HashtagAnalyzer(os.path.join(tmp, 'results.db'), api_client=client, result_cache=cache,
+                                   geocoding_service=geocoding_service)
+        hashtag_id = analyzer.analyze_hashtag('results', args.tweets // 2)['summary']['hashtag']['id']
+        
+        def timed(prepare=None):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                if prepare:
+                    prepare()
+                results = analyzer._get_analysis_results(hashtag_id)
+            return (time.perf_counter() - start) / args.repeat, results
+        
+        computed_seconds, computed = timed(lambda: cache.invalidate(namespace=analyzer.db.identity))
+        memory_seconds, from_memory = timed()
+        disk_seconds, from_disk = timed(lambda: cache._entries.clear())
+        assert from_memory == computed
+        assert from_disk['summary']['hashtag'] == computed['summary']['hashtag']
+        
+        # New tweets change the version, the next read recomputes
+        misses = cache.misses
+        analyzer.analyze_hashtag('results', args.tweets)
+        assert cache.misses == misses + 1
+        fresh = analyzer._get_analysis_results(hashtag_id)
+        cache.invalidate(namespace=analyzer.db.identity)
+        assert fresh == analyzer._get_analysis_results(hashtag_id)
+        analyzer.close()
+    
+    print(f"computed: {computed_seconds * 1000:.2f} ms")
+    print(f"  memory: {memory_seconds * 1e6:.1f} us")
+    print(f"    disk: {disk_seconds * 1000:.2f} ms")
+    print(f"tweets {computed['summary']['hashtag']['total_tweets']} -> {fresh['summary']['hashtag']['total_tweets']}, "
+          f"recomputed after ingest")
+
+
+class PerHashtagDataset(SimpleDataset):
+    """SimpleDataset whose tweet IDs differ per hashtag while the users are shared."""
+    
+    def item(self, index, hashtag):
+        tweet, user = super().item(index, hashtag)
+        tweet['id'] = f"{tweet['id']}{sum(map(ord, hashtag)) % 1000:03d}"
+        return tweet, user
+
+
+def benchmark_many(args):
+    """Compare analyzing hashtags back to back with one concurrent batch."""
+    hashtags = [f"batch{index}" for index in range(args.hashtags)]
+    timings = {}
+    answers = {}
+    
+    for mode in ('serial', 'batch'):
+        with tempfile.TemporaryDirectory() as tmp, FakeNominatimServer() as server:
+            client = FakeApiClient(
+                dataset=PerHashtagDataset(total_tweets=args.tweets, user_count=args.users),
+                latency=args.latency
+            )
+            geocoding_service = GeocodingService(
+                cache_file=os.path.join(tmp, 'location_cache.db'), legacy_cache_file=None, endpoint=server.url
+            )
+            analyzer = HashtagAnalyzer(os.path.join(tmp, 'many.db'), api_client=client,
+                                       geocoding_service=geocoding_service)
+            
+            start = time.perf_counter()
+            if mode == 'serial':
+                results = {hashtag: analyzer.analyze_hashtag(hashtag, args.tweets) for hashtag in hashtags}
+            else:
+                batch = analyzer.analyze_many(hashtags, args.tweets, workers=args.workers)
+                results = batch['results']
+            timings[mode] = time.perf_counter() - start
+            answers[mode] = {
+                hashtag: (result['summary']['hashtag']['total_tweets'], result['top_contributors'],
+                          result['locations'])
+                for hashtag, result in results.items()
+            }
+            analyzer.close()
+    
+    assert answers['serial'] == answers['batch']
+    print(f"serial: {timings['serial']:.2f}s for {args.hashtags} hashtags")
+    print(f" batch: {timings['batch']:.2f}s with {args.workers} workers "
+          f"(crawl {batch['timing']['crawl_seconds']:.2f}s)")
+    print(f" users: {batch['users']['written']} profile writes for {batch['users']['saved']} distinct "
+          f"of {batch['users']['records']} returned")
+
+
+class GrowingDataset(SimpleDataset):
+    """SimpleDataset that can receive tweets newer than all the ones before."""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.new_tweets = 0
+    
+    def __len__(self):
+        return self.total_tweets + self.new_tweets
+    
+    def item(self, index, hashtag):
+        # Negative positions continue the timeline into the future
+        return super().item(index - self.new_tweets, hashtag)
+
+
+def benchmark_incremental(args):
+    """Compare refreshing a stored hashtag with a full and an incremental crawl."""
+    report = {}
+    for incremental in (False, True):
+        with tempfile.TemporaryDirectory() as tmp, FakeNominatimServer() as server:
+            dataset = GrowingDataset(total_tweets=args.tweets, user_count=args.users)
+            client = FakeApiClient(dataset=dataset, latency=args.latency)
+            geocoding_service = GeocodingService(
+                cache_file=os.path.join(tmp, 'location_cache.db'), legacy_cache_file=None, endpoint=server.url
+            )
+            analyzer = HashtagAnalyzer(os.path.join(tmp, 'incremental.db'), api_client=client,
+                                       geocoding_service=geocoding_service)
+            analyzer.analyze_hashtag('refresh', args.tweets)
+            
+            dataset.new_tweets = args.new
+            calls = client.calls
+            start = time.perf_counter()
+            results = analyzer.analyze_hashtag('refresh', args.tweets, incremental=incremental)
+            report[incremental] = (
+                time.perf_counter() - start,
+                client.calls - calls,
+                results['collection']['inserted'],
+                results['summary']['hashtag']['total_tweets']
+            )
+            analyzer.close()
+    
+    assert report[True][2:] == (args.new, args.tweets + args.new) == report[False][2:]
+    for incremental, (seconds, calls, inserted, total) in report.items():
+        print(f"{'incremental' if incremental else 'full':>11}: {seconds:.2f}s, {calls} API calls, "
+              f"{inserted} new tweets")
+
+
+class StreamDataset(PerHashtagDataset):
+    """PerHashtagDataset whose hashtags keep receiving tweets as a clock moves."""
+    
+    def __init__(self, clock, profiles, horizon, *args, **kwargs):
+        """
+        Args:
+            clock: Clock whose now() is the seconds since the stream started
+            profiles (dict): Hashtag to a list of (start second, tweets per second) segments
+            horizon (float): Seconds the stream runs for
+        """
+        super().__init__(*args, **kwargs)
+        self.clock = clock
+        self.profiles = profiles
+        self.horizon = horizon
+    
+    def __len__(self):
+        return self.total_tweets + max(self.arrivals(hashtag, self.horizon) for hashtag in self.profiles)
+    
+    def _segments(self, hashtag):
+        """Yield (start, end, rate) of a hashtag's constant-rate stretches."""
+        segments = self.profiles.get(hashtag.lstrip('#'), [(0, 0.0)])
+        for position, (start, rate) in enumerate(segments):
+            end = segments[position + 1][0] if position + 1 < len(segments) else float('inf')
+            yield start, end, rate
+    
+    def arrivals(self, hashtag, at):
+        """Number of tweets a hashtag has received by a time."""
+        total = 0.0
+        for start, end, rate in self._segments(hashtag):
+            if at > start:
+                total += (min(at, end) - start) * rate
+        return int(total)
+    
+    def arrival_time(self, hashtag, number):
+        """Time at which a hashtag received its tweet with a sequence number."""
+        total = 0.0
+        for start, end, rate in self._segments(hashtag):
+            if rate and total + (end - start) * rate > number:
+                return start + (number + 1 - total) / rate
+            total += (end - start) * rate
+        return float('inf')
+    
+    def item(self, index, hashtag):
+        # Positions before the stream's tweets are the history
+        number = self.arrivals(hashtag, self.clock.now()) - 1 - index
+        tweet, user = super().item(-number - 1, hashtag)
+        if number >= 0:
+            tweet['created_at'] = self.start_time + timedelta(seconds=self.arrival_time(hashtag, number))
+        return tweet, user
+
+
+def benchmark_monitor(args):
+    """Compare adaptive monitoring with polling every hashtag at a fixed interval."""
+    hours = args.hours * 3600
+    profiles = {
+        'spiking': [(0, 0.02), (hours * 0.4, 1.0), (hours * 0.6, 0.05)],
+        'steady': [(0, 0.1)],
+        'dead': [(0, 0.0)]
+    }
+    
+    for mode in ('fixed', 'adaptive'):
+        with tempfile.TemporaryDirectory() as tmp, FakeNominatimServer() as server:
+            clock = FakeClock()
+            dataset = StreamDataset(clock, profiles, hours, total_tweets=args.history, user_count=args.users)
+            geocoding_service = GeocodingService(
+                cache_file=os.path.join(tmp, 'location_cache.db'), legacy_cache_file=None, endpoint=server.url
+            )
+            analyzer = HashtagAnalyzer(os.path.join(tmp, 'monitor.db'), api_client=FakeApiClient(dataset=dataset),
+                                       geocoding_service=geocoding_service)
+            
+            if mode == 'fixed':
+                intervals = {'min_interval': args.fixed_interval, 'max_interval': args.fixed_interval}
+            else:
+                intervals = {'min_interval': args.min_interval, 'max_interval': args.max_interval}
+            scheduler = analyzer.create_monitor(
+                list(profiles), args.count, clock=clock, requests_per_hour=args.requests_per_hour, **intervals
+            )
+            
+            # Measure how long stored tweets waited after they were posted, and
+            # how many were posted before a poll but never retrieved
+            lag = {hashtag: 0.0 for hashtag in profiles}
+            polled_arrivals = {hashtag: 0 for hashtag in profiles}
+            poll = scheduler.poll
+            
+            def timed_poll(hashtag):
+                outcome = poll(hashtag)
+                now = clock.now()
+                arrived = dataset.arrivals(hashtag, now)
+                polled_arrivals[hashtag] = arrived
+                for number in range(max(0, arrived - outcome['new_tweets']), arrived):
+                    lag[hashtag] += now - dataset.arrival_time(hashtag, number)
+                return outcome
+            
+            scheduler.poll = timed_poll
+            start = time.perf_counter()
+            scheduler.run(until=hours)
+            seconds = time.perf_counter() - start
+            
+            state = scheduler.queue_state()
+            print(f"{mode}: {args.hours}h simulated in {seconds:.2f}s, "
+                  f"{sum(entry['requests'] for entry in state['hashtags'])} requests")
+            for entry in sorted(state['hashtags'], key=lambda entry: entry['hashtag']):
+                hashtag = entry['hashtag']
+                # The first poll also stores the history
+                stored = entry['new_tweets'] - min(args.history, args.count)
+                posted = dataset.arrivals(hashtag, clock.now())
+                missed = polled_arrivals[hashtag] - stored
+                mean_lag = lag[hashtag] / stored if stored > 0 else 0.0
+                print(f"  #{hashtag:<8} {entry['polls']:>4} polls, {entry['requests']:>4} requests, "
+                      f"{stored:>5}/{posted:<5} posted tweets stored, {missed:>5} missed, "
+                      f"mean lag {mean_lag:6.0f}s, interval now {entry['interval']:.0f}s")
+            analyzer.close()
+
+
+def reference_search_results(raw, hashtag):
+    """Decode and extract a search page the way TwitterService did before its fast path."""
+    response = json.loads(raw)
+    processed = {'tweets': [], 'users': {}, 'cursor': None}
+    if 'cursor' in response:
+        processed['cursor'] = {'top': response['cursor'].get('top', ''), 'bottom': response['cursor'].get('bottom', '')}
+    
+    for instruction in response['result']['timeline'].get('instructions', []):
+        if 'entries' not in instruction:
+            continue
+        for entry in instruction['entries']:
+            if 'content' not in entry or entry['content'].get('entryType') != 'TimelineTimelineItem':
+                continue
+            for item_wrapper in entry['content'].get('items', []):
+                if 'item' not in item_wrapper or 'itemContent' not in item_wrapper['item']:
+                    continue
+                item_content = item_wrapper['item']['itemContent']
+                if item_content.get('itemType') != 'TimelineTweet':
+                    continue
+                
+                if 'user_results' in item_content and 'result' in item_content['user_results']:
+                    user_data = item_content['user_results']['result']
+                    legacy = user_data['legacy']
+                    created_at = datetime.strptime(legacy['created_at'], '%a %b %d %H:%M:%S %z %Y')
+                    processed['users'][user_data['rest_id']] = {
+                        'id': user_data.get('rest_id', ''),
+                        'username': legacy.get('screen_name', ''),
+                        'display_name': legacy.get('name', ''),
+                        'profile_image_url': legacy.get('profile_image_url_https', ''),
+                        'followers_count': legacy.get('followers_count', 0),
+                        'following_count': legacy.get('friends_count', 0),
+                        'tweet_count': legacy.get('statuses_count', 0),
+                        'location': legacy.get('location', ''),
+                        'account_created_at': created_at.strftime('%Y-%m-%d %H:%M:%S'),
+                        'is_verified': legacy.get('verified', False) or user_data.get('is_blue_verified', False)
+                    }
+                
+                if 'tweet_results' in item_content and 'result' in item_content['tweet_results']:
+                    tweet_data = item_content['tweet_results']['result']
+                    legacy = tweet_data['legacy']
+                    created_at = datetime.strptime(legacy['created_at'], '%a %b %d %H:%M:%S %z %Y')
+                    processed['tweets'].append({
+                        'id': tweet_data.get('rest_id', ''),
+                        'content': legacy.get('full_text', ''),
+                        'retweet_count': legacy.get('retweet_count', 0),
+                        'like_count': legacy.get('favorite_count', 0),
+                        'reply_count': legacy.get('reply_count', 0),
+                        'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S'),
+                        'is_retweet': 'retweeted_status_result' in legacy,
+                        'is_reply': legacy.get('in_reply_to_status_id_str', '') != '',
+                        'has_media': 'entities' in legacy and 'media' in legacy['entities'],
+                        'user_id': legacy.get('user_id_str', ''),
+                        'hashtag': hashtag
+                    })
+    return processed
+
+
+def benchmark_decode(args):
+    """Compare decoding recorded search pages with the stdlib path and the fast path."""
+    client = FakeApiClient(dataset=SimpleDataset(total_tweets=args.pages * args.page_size, user_count=args.users))
+    pages = []
+    cursor = ''
+    for _ in range(args.pages):
+        response = client.call_api('Twitter/search_twitter', {'query': '#decode', 'count': args.page_size,
+                                                               'cursor': cursor})
+        pages.append(json.dumps(response).encode('utf-8'))
+        cursor = response['cursor']['bottom']
+    
+    service = TwitterService(client=client)
+    reference = [reference_search_results(raw, '#decode') for raw in pages]
+    assert [service._process_search_results(raw, '#decode') for raw in pages] == reference
+    
+    timings = {}
+    for name, decode in (('stdlib', reference_search_results), ('fast', service._process_search_results)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            # Each repetition is a fresh crawl, so timestamps are only cached within it
+            parse_twitter_date.cache_clear()
+            for raw in pages:
+                decode(raw, '#decode')
+        timings[name] = time.perf_counter() - start
+    
+    size = sum(len(raw) for raw in pages) * args.repeat
+    records = args.pages * args.page_size * args.repeat
+    for name, seconds in timings.items():
+        print(f"{name:>6}: {seconds:.2f}s, {records / seconds:,.0f} tweets/s, {size / seconds / 1e6:.1f} MB/s")
+    print(f"json library: {'orjson' if orjson is not None else 'json'}, "
+          f"date cache {parse_twitter_date.cache_info().hits} hits")
+
+
+def search_pages(dataset, hashtag, page_size):
+    """Yield every search results page of a dataset as TwitterService returns it."""
+    service = TwitterService(client=FakeApiClient(dataset=dataset))
+    cursor = ''
+    while True:
+        page = service.search_hashtag(hashtag, page_size, cursor=cursor)
+        yield page
+        cursor = page['cursor']['bottom'] if page['cursor'] else ''
+        if not cursor:
+            break
+
+
+def benchmark_timeline(args):
+    """Compare hourly timelines bucketed from text timestamps, epoch columns and rollups."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'timeline.db'))
+        hashtag_id = db.get_or_create_hashtag('timeline')['id']
+        dataset = SimpleDataset(total_tweets=args.tweets, user_count=args.users)
+        pages = list(search_pages(dataset, 'timeline', 100))
+        
+        # Ingest cost, with the share spent maintaining the rollups
+        add_to_rollups = db._add_to_rollups
+        rollup_seconds = []
+        
+        def timed_add_to_rollups(*rollup_args):
+            started = time.perf_counter()
+            add_to_rollups(*rollup_args)
+            rollup_seconds.append(time.perf_counter() - started)
+        
+        db._add_to_rollups = timed_add_to_rollups
+        start = time.perf_counter()
+        for page in pages:
+            db.save_page(page['tweets'], page['users'], hashtag_id)
+        ingest_seconds = time.perf_counter() - start
+        db._add_to_rollups = add_to_rollups
+        
+        newest = dataset.start_time
+        since = newest - timedelta(days=args.days)
+        queries = {
+            'text': (
+                """
+                SELECT strftime('%Y-%m-%d %H:00:00', created_at) AS bucket, COUNT(*) FROM tweets
+                WHERE hashtag_id = ? AND created_at >= ?
+                GROUP BY bucket ORDER BY bucket
+                """,
+                (hashtag_id, since.strftime('%Y-%m-%d %H:%M:%S'))
+            ),
+            'epoch': (
+                """
+                SELECT created_epoch - created_epoch % 3600 AS bucket, COUNT(*) FROM tweets
+                WHERE hashtag_id = ? AND created_epoch >= ?
+                GROUP BY bucket ORDER BY bucket
+                """,
+                (hashtag_id, to_epoch(since))
+            ),
+            'epoch+users': (
+                """
+                SELECT created_epoch - created_epoch % 3600 AS bucket, COUNT(*), COUNT(DISTINCT user_id) FROM tweets
+                WHERE hashtag_id = ? AND created_epoch >= ?
+                GROUP BY bucket ORDER BY bucket
+                """,
+                (hashtag_id, to_epoch(since))
+            )
+        }
+        
+        answers = {}
+        timings = {}
+        for name, (sql, params) in queries.items():
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                rows = db.conn.execute(sql, params).fetchall()
+            timings[name] = (time.perf_counter() - start) / args.repeat
+            answers[name] = [row[1] for row in rows]
+        
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            timeline = db.get_activity_timeline(hashtag_id, 'hour', start=since)
+        timings['rollups'] = (time.perf_counter() - start) / args.repeat
+        answers['rollups'] = [bucket['tweet_count'] for bucket in timeline]
+        exact_users = [row[2] for row in rows]
+        
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            db.get_hashtag_summary(hashtag_id, include_locations=False)
+        summary_seconds = (time.perf_counter() - start) / args.repeat
+        db.close()
+    
+    assert answers['text'] == answers['epoch'] == answers['epoch+users'] == answers['rollups']
+    error = max(abs(bucket['user_count'] - exact) / exact for bucket, exact in zip(timeline, exact_users))
+    print(f"{args.tweets} tweets, hourly timeline of the last {args.days} days ({len(timeline)} buckets), "
+          f"rollups include distinct user estimates (worst error {error:.1%})")
+    print(f"  ingest: {ingest_seconds:.2f}s in save_page, {sum(rollup_seconds):.2f}s of it maintaining rollups")
+    for name, seconds in timings.items():
+        print(f"{name:>11}: {seconds * 1000:.2f} ms ({timings['text'] / seconds:.1f}x)")
+    print(f"    summary: {summary_seconds * 1000:.2f} ms for get_hashtag_summary")
+
+
+class NeverMatchingFingerprints(dict):
+    """Fingerprint map that never matches a profile, so every user record is written."""
+    
+    def __contains__(self, user_id):
+        return True
+    
+    def get(self, user_id, default=None):
+        return None
+
+
+def benchmark_users(args):
+    """Compare re-crawling stored tweets while writing every user record or only changed profiles."""
+    dataset = SimpleDataset(total_tweets=args.tweets, user_count=args.users)
+    pages = list(search_pages(dataset, 'profiles', args.page_size))
+    changed = [
+        dict(page, users={
+            user_id: dict(user, followers_count=user['followers_count'] + 1)
+            for user_id, user in page['users'].items()
+        })
+        for page in pages
+    ]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'users.db'))
+        hashtag_id = db.get_or_create_hashtag('profiles')['id']
+        
+        crawls = (
+            ('first crawl', pages, dict),
+            ('write all', pages, NeverMatchingFingerprints),
+            ('unchanged', pages, dict),
+            ('all changed', changed, dict)
+        )
+        for name, crawl, fingerprint_map in crawls:
+            fingerprints = fingerprint_map()
+            records = written = 0
+            start = time.perf_counter()
+            for page in crawl:
+                saved = db.save_page(page['tweets'], page['users'], hashtag_id, fingerprints=fingerprints)
+                records += saved['users']
+                written += saved['users_written']
+            seconds = time.perf_counter() - start
+            print(f"{name:>11}: {seconds:.2f}s, {written} profile writes for {records} user records "
+                  f"({records - written} skipped)")
+        db.close()
+
+
+def benchmark_replay(args):
+    """Record a crawl into a response archive, then rebuild a database by replaying it."""
+    suffix = '.zst' if args.compression == 'zstd' else '.gz'
+    with tempfile.TemporaryDirectory() as tmp, FakeNominatimServer() as server:
+        archive_path = os.path.join(tmp, 'responses.jsonl' + suffix)
+        timings = {}
+        answers = {}
+        
+        for mode in ('record', 'replay'):
+            if mode == 'record':
+                archive = ResponseArchive(archive_path, args.compression)
+                client = FakeApiClient(dataset=SimpleDataset(total_tweets=args.tweets, user_count=args.users),
+                                       latency=args.latency)
+            else:
+                archive = None
+                client = ReplayApiClient(archive_path, args.compression)
+            geocoding_service = GeocodingService(
+                cache_file=os.path.join(tmp, 'location_cache.db'), legacy_cache_file=None, endpoint=server.url
+            )
+            analyzer = HashtagAnalyzer(os.path.join(tmp, f'{mode}.db'), api_client=client, archive=archive,
+                                       geocoding_service=geocoding_service)
+            
+            start = time.perf_counter()
+            results = analyzer.analyze_hashtag('replay', args.tweets)
+            timings[mode] = time.perf_counter() - start
+            # Everything but when the hashtag row was written must match
+            summary = dict(results['summary'], hashtag=dict(results['summary']['hashtag'], created_at=None,
+                                                            updated_at=None))
+            answers[mode] = (summary, results['top_contributors'], results['locations'])
+            analyzer.close()
+            (archive or client).close()
+        
+        assert answers['record'] == answers['replay']
+        with ResponseArchive(archive_path, args.compression, readonly=True) as archive:
+            pages = len(archive)
+            raw_size = sum(len(json.dumps(record['response']).encode('utf-8')) for record in archive)
+            start = time.perf_counter()
+            # Newest record first, each read is one seek through the index
+            for position in reversed(range(pages)):
+                archive.read(position)
+            read_seconds = time.perf_counter() - start
+        archive_size = os.path.getsize(archive_path)
+    
+    print(f"record: {timings['record']:.2f}s crawling {pages} pages from the API")
+    print(f"replay: {timings['replay']:.2f}s rebuilding the same results from the archive")
+    print(f"archive: {archive_size / 1024:.0f} KB {args.compression} for {raw_size / 1024:.0f} KB of JSON "
+          f"({raw_size / archive_size:.1f}x), {read_seconds / pages * 1000:.2f} ms per random page read")
+
+
+def benchmark_load(args):
+    """Ingest a large synthetic timeline through the real crawl, sentiment, storage and geocoding path."""
+    started = time.perf_counter()
+    dataset = SyntheticDataset(total_tweets=args.tweets, user_count=args.users, seed=args.seed)
+    shape = dataset.describe()
+    print(f"dataset: {shape['tweets']} tweets by {shape['users']} users over {shape['span_seconds'] / 3600:.1f}h, "
+          f"{shape['burst_blocks']} of {shape['blocks']} blocks bursting, top 1% of users expected to post "
+          f"{shape['top_1pct_user_share']:.0%} ({time.perf_counter() - started:.2f}s to set up)")
+    
+    with tempfile.TemporaryDirectory() as tmp, FakeNominatimServer() as server:
+        host = urlsplit(server.url).netloc
+        client = FakeApiClient(dataset=dataset)
+        geocoding_service = GeocodingService(
+            cache_file=os.path.join(tmp, 'location_cache.db'), legacy_cache_file=None, endpoint=server.url,
+            rate_limits={host: (args.rate, args.rate)}
+        )
+        analyzer = HashtagAnalyzer(os.path.join(tmp, 'load.db'), api_client=client,
+                                   geocoding_service=geocoding_service)
+        
+        started = time.perf_counter()
+        results = analyzer.analyze_hashtag('load', args.tweets, pipelined=args.pipelined)
+        elapsed = time.perf_counter() - started
+        
+        hashtag_id = results['summary']['hashtag']['id']
+        top = analyzer.db.conn.execute(
+            "SELECT tweet_count FROM hashtag_user_counts WHERE hashtag_id = ?", (hashtag_id,)
+        ).fetchall()
+        analyzer.close()
+        db_size = os.path.getsize(os.path.join(tmp, 'load.db'))
+    
+    collection = results['collection']
+    counts = sorted((row[0] for row in top), reverse=True)
+    top_share = sum(counts[:max(1, len(counts) // 100)]) / sum(counts)
+    sentiment = collection['sentiment_cache']
+    geocoding = collection['geocoding'] or {}
+    print(f"ingest: {collection['inserted']} tweets in {elapsed:.2f}s "
+          f"({collection['inserted'] / elapsed:.0f} tweets/s), {client.calls} pages, database {db_size / 1048576:.1f} MB")
+    print(f"users: {len(counts)} posted, top 1% posted {top_share:.0%}, "
+          f"{collection['users']['written']} profile writes for {collection['users']['records']} user records")
+    print(f"sentiment: {sentiment['hit_rate']:.0%} cache hit rate, {sentiment['misses']} texts scored")
+    distinct = geocoding.get('locations', 0) - geocoding.get('duplicates', 0)
+    print(f"locations: {distinct} distinct, {server.requests} geocoding requests, "
+          f"{geocoding.get('gazetteer', 0)} from the gazetteer")
+
+
+def check_plans(args):
+    """Run an ingest and dashboard workload and check every statement's query plan."""
+    with tempfile.TemporaryDirectory() as tmp, FakeNominatimServer() as server:
+        client = FakeApiClient(dataset=SimpleDataset(total_tweets=args.tweets, user_count=args.users))
+        geocoding_service = GeocodingService(
+            cache_file=os.path.join(tmp, 'location_cache.db'), legacy_cache_file=None, endpoint=server.url
+        )
+        analyzer = HashtagAnalyzer(os.path.join(tmp, 'plans.db'), api_client=client,
+                                   geocoding_service=geocoding_service)
+        db = analyzer.db
+        
+        with QueryPlanRecorder(db.conn) as recorder:
+            # A first run, then one overlapping it, so backfill, new and duplicate paths all run
+            analyzer.analyze_hashtag('plans', args.tweets // 2)
+            results = analyzer.analyze_hashtag('plans', args.tweets)
+            hashtag_id = results['summary']['hashtag']['id']
+            activity = db.get_activity_timeline(hashtag_id, 'minute')
+            window = (activity[0]['bucket'], activity[-1]['bucket'])
+            db.get_activity_timeline(hashtag_id, 'minute', *window)
+            db.get_sentiment_timeline(hashtag_id, 'day', start=window[0])
+            db.get_recent_velocity(hashtag_id)
+        
+        report = check_query_plans(db.conn, recorder.statements)
+        analyzer.close()
+    
+    failures = [entry for entry in report if entry[2]]
+    for sql, plan, problems in report:
+        if problems or args.verbose:
+            print(("FAIL " if problems else "ok   ") + ' '.join(sql.split())[:150])
+            for step in plan:
+                print(f"       {'!' if step in problems else ' '} {step}")
+    
+    print(f"{len(report)} statements checked, {len(failures)} with full scans or temp sorts")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the hashtag analyzer.")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    
+    pipeline_parser = subparsers.add_parser('pipeline', help="Serial vs pipelined tweet collection")
+    pipeline_parser.add_argument('--tweets', type=int, default=2000)
+    pipeline_parser.add_argument('--users', type=int, default=300)
+    pipeline_parser.add_argument('--latency', type=float, default=0.2, help="Seconds per API call")
+    pipeline_parser.set_defaults(run=benchmark_pipeline)
+    
+    sentiment_parser = subparsers.add_parser('sentiment', help="Serial vs process-pool sentiment scoring")
+    sentiment_parser.add_argument('--tweets', type=int, default=20000)
+    sentiment_parser.add_argument('--workers', type=int, default=None)
+    sentiment_parser.set_defaults(run=benchmark_sentiment)
+    
+    lexicon_parser = subparsers.add_parser('lexicon', help="Lexicon engine vs TextBlob sentiment")
+    lexicon_parser.add_argument('--tweets', type=int, default=20000)
+    lexicon_parser.set_defaults(run=benchmark_lexicon)
+    
+    geocode_parser = subparsers.add_parser('geocode', help="Serial vs concurrent geocoding on a local server")
+    geocode_parser.add_argument('--locations', type=int, default=200, help="Distinct known places")
+    geocode_parser.add_argument('--latency', type=float, default=0.05, help="Seconds per server response")
+    geocode_parser.add_argument('--concurrency', type=int, default=8)
+    geocode_parser.add_argument('--rate', type=float, default=100.0, help="Requests per second allowed")
+    geocode_parser.add_argument('--burst', type=int, default=8)
+    geocode_parser.set_defaults(run=benchmark_geocode)
+    
+    results_parser = subparsers.add_parser('results', help="Computed vs cached analysis results")
+    results_parser.add_argument('--tweets', type=int, default=3000)
+    results_parser.add_argument('--users', type=int, default=400)
+    results_parser.add_argument('--repeat', type=int, default=50)
+    results_parser.set_defaults(run=benchmark_results)
+    
+    many_parser = subparsers.add_parser('many', help="Back-to-back vs batched multi-hashtag analysis")
+    many_parser.add_argument('--hashtags', type=int, default=8)
+    many_parser.add_argument('--tweets', type=int, default=500, help="Tweets per hashtag")
+    many_parser.add_argument('--users', type=int, default=200)
+    many_parser.add_argument('--latency', type=float, default=0.1, help="Seconds per API call")
+    many_parser.add_argument('--workers', type=int, default=4)
+    many_parser.set_defaults(run=benchmark_many)
+    
+    incremental_parser = subparsers.add_parser('incremental', help="Full vs incremental refresh crawl")
+    incremental_parser.add_argument('--tweets', type=int, default=3000, help="Tweets stored before the refresh")
+    incremental_parser.add_argument('--new', type=int, default=150, help="Tweets posted since")
+    incremental_parser.add_argument('--users', type=int, default=300)
+    incremental_parser.add_argument('--latency', type=float, default=0.05, help="Seconds per API call")
+    incremental_parser.set_defaults(run=benchmark_incremental)
+    
+    monitor_parser = subparsers.add_parser('monitor', help="Fixed-interval vs velocity-adaptive monitoring")
+    monitor_parser.add_argument('--hours', type=float, default=12, help="Simulated hours")
+    monitor_parser.add_argument('--history', type=int, default=200, help="Tweets per hashtag before monitoring")
+    monitor_parser.add_argument('--users', type=int, default=300)
+    monitor_parser.add_argument('--count', type=int, default=200, help="Most tweets fetched per poll")
+    monitor_parser.add_argument('--requests-per-hour', type=float, default=120)
+    monitor_parser.add_argument('--fixed-interval', type=float, default=900, help="Seconds between fixed polls")
+    monitor_parser.add_argument('--min-interval', type=float, default=60)
+    monitor_parser.add_argument('--max-interval', type=float, default=3600)
+    monitor_parser.set_defaults(run=benchmark_monitor)
+    
+    decode_parser = subparsers.add_parser('decode', help="Stdlib vs fast search response decoding")
+    decode_parser.add_argument('--pages', type=int, default=50, help="Recorded search pages")
+    decode_parser.add_argument('--page-size', type=int, default=100)
+    decode_parser.add_argument('--users', type=int, default=500)
+    decode_parser.add_argument('--repeat', type=int, default=20)
+    decode_parser.set_defaults(run=benchmark_decode)
+    
+    timeline_parser = subparsers.add_parser('timeline', help="Text vs epoch timestamp bucketing vs rollups")
+    timeline_parser.add_argument('--tweets', type=int, default=100000)
+    timeline_parser.add_argument('--users', type=int, default=2000)
+    timeline_parser.add_argument('--days', type=int, default=7, help="Length of the timeline window")
+    timeline_parser.add_argument('--repeat', type=int, default=20)
+    timeline_parser.set_defaults(run=benchmark_timeline)
+    
+    users_parser = subparsers.add_parser('users', help="Profile writes skipped by change detection")
+    users_parser.add_argument('--tweets', type=int, default=20000)
+    users_parser.add_argument('--users', type=int, default=500)
+    users_parser.add_argument('--page-size', type=int, default=100)
+    users_parser.set_defaults(run=benchmark_users)
+    
+    replay_parser = subparsers.add_parser('replay', help="Recorded crawl vs replay from a response archive")
+    replay_parser.add_argument('--tweets', type=int, default=2000)
+    replay_parser.add_argument('--users', type=int, default=300)
+    replay_parser.add_argument('--latency', type=float, default=0.2, help="Seconds per API call while recording")
+    replay_parser.add_argument('--compression', choices=('gzip', 'zstd'), default='zstd' if zstandard else 'gzip')
+    replay_parser.set_defaults(run=benchmark_replay)
+    
+    load_parser = subparsers.add_parser('load', help="Ingest a large synthetic timeline end to end")
+    load_parser.add_argument('--tweets', type=int, default=50000, help="Up to millions, generated on the fly")
+    load_parser.add_argument('--users', type=int, default=10000)
+    load_parser.add_argument('--seed', type=int, default=0)
+    load_parser.add_argument('--rate', type=float, default=1000.0, help="Geocoding requests per second")
+    load_parser.add_argument('--pipelined', action='store_true', help="Prefetch pages while earlier ones are saved")
+    load_parser.set_defaults(run=benchmark_load)
+    
+    plans_parser = subparsers.add_parser('plans', help="Check the query plans of every statement a workload runs")
+    plans_parser.add_argument('--tweets', type=int, default=600)
+    plans_parser.add_argument('--users', type=int, default=80)
+    plans_parser.add_argument('--verbose', action='store_true', help="Print the plans that pass too")
+    plans_parser.set_defaults(run=check_plans)
+    
+    args = parser.parse_args()
+    args.run(args)
@@ -1,27 +1,55 @@
 import os
 import sys
 import json
+import time
+import queue
+import argparse
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-from models.database import Database
+from models.database import Database, tweet_id_key
 from services.twitter_service import TwitterService
 from services.geocoding_service import GeocodingService
 from services.sentiment_analyzer import SentimentAnalyzer
+from services.collection_pipeline import CollectionPipeline
+from services.result_cache import ResultCache
+from services.monitor_scheduler import MonitorScheduler
+from services.response_archive import ResponseArchive, ReplayApiClient
 
 class HashtagAnalyzer:
-    def __init__(self, db_path='twitter_hashtag_analyzer.db'):
+    def __init__(self, db_path='twitter_hashtag_analyzer.db', concurrent=False, api_client=None,
+                 pipeline_queue_size=2, sentiment_engine='textblob', result_cache=None, archive=None,
+                 geocoding_service=None):
         """
         Initialize the hashtag analyzer.
         
         Args:
             db_path (str): Path to the SQLite database file
+            concurrent (bool): Open the database in concurrent mode so analysis
+                reads can be served from other threads while a crawl is writing
+            api_client: Client used by TwitterService, defaults to the data API client
+            pipeline_queue_size (int): Pages buffered between pipelined collection stages
+            sentiment_engine (str): Sentiment engine, 'textblob' or 'lexicon'
+            result_cache (ResultCache): Cache for analysis results, defaults to an in-memory one
+            archive (ResponseArchive): Archive keeping every raw API response, for replays
+            geocoding_service (GeocodingService): Geocoder for user locations, defaults to
+                one whose location cache sits next to the database file
         """
-        self.db = Database(db_path)
-        self.twitter_service = TwitterService()
-        self.geocoding_service = GeocodingService()
-        self.sentiment_analyzer = SentimentAnalyzer()
+        self.db = Database(db_path, concurrent=concurrent)
+        self.twitter_service = TwitterService(api_client, archive=archive)
+        self.pipeline_queue_size = pipeline_queue_size
+        if geocoding_service is None:
+            directory = os.path.dirname(os.path.abspath(db_path))
+            geocoding_service = GeocodingService(
+                cache_file=os.path.join(directory, 'location_cache.db'),
+                legacy_cache_file=os.path.join(directory, 'location_cache.json')
+            )
+        self.geocoding_service = geocoding_service
+        self.sentiment_analyzer = SentimentAnalyzer(db=self.db, engine=sentiment_engine)
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
     
-    def analyze_hashtag(self, hashtag, count=100, search_type="Latest"):
+    def analyze_hashtag(self, hashtag, count=100, search_type="Latest", pipelined=False, incremental=False):
         """
         Analyze a Twitter hashtag.
         
@@ -29,33 +57,344 @@ class HashtagAnalyzer:
             hashtag (str): Hashtag to analyze (with or without #)
             count (int): Number of tweets to retrieve
             search_type (str): Type of search (Top, Latest, Photos, Videos, People)
+            pipelined (bool): Prefetch pages while earlier ones are analyzed and saved
+            incremental (bool): Stop paging at tweets stored by earlier crawls,
+                for Latest searches, which return the newest tweets first
             
         Returns:
             dict: Analysis results
+            
+        Raises:
+            ValueError: For an incremental search other than Latest
         """
+        self._check_incremental(search_type, incremental)
+        
         # Clean hashtag format
-        clean_hashtag = hashtag.strip()
-        if clean_hashtag.startswith('#'):
-            clean_hashtag = clean_hashtag[1:]
+        clean_hashtag = self._clean_hashtag(hashtag)
         
         # Get or create hashtag record
         hashtag_record = self.db.get_or_create_hashtag(clean_hashtag)
-        hashtag_id = hashtag_record['id']
         
-        # Collect tweets
-        collected_data = self._collect_tweets(clean_hashtag, hashtag_id, count, search_type)
+        # Record the crawl, only down to the high-water mark when incremental
+        since_id = hashtag_record['newest_tweet_id'] if incremental else None
+        job = self.db.create_crawl_job(hashtag_record['id'], search_type, count, since_id)
+        return self._run_crawl_job(clean_hashtag, job, pipelined)
+    
+    def resume_crawl(self, hashtag, pipelined=False):
+        """
+        Continue the last unfinished crawl of a hashtag and analyze it.
+        
+        Paging restarts from the cursor committed with the last saved
+        page, for the tweets the crawl still had to retrieve.
+        
+        Args:
+            hashtag (str): Hashtag whose crawl to resume (with or without #)
+            pipelined (bool): Prefetch pages while earlier ones are analyzed and saved
+            
+        Returns:
+            dict: Analysis results
+        """
+        clean_hashtag = self._clean_hashtag(hashtag)
+        hashtag_record = self.db.get_or_create_hashtag(clean_hashtag)
+        
+        job = self.db.get_unfinished_crawl_job(hashtag_record['id'])
+        if job is None:
+            raise ValueError(f"No unfinished crawl to resume for #{clean_hashtag}")
+        return self._run_crawl_job(clean_hashtag, job, pipelined)
+    
+    def _run_crawl_job(self, hashtag, job, pipelined=False):
+        """
+        Collect the tweets a crawl job still needs and analyze the hashtag.
+        
+        Args:
+            hashtag (str): Clean hashtag
+            job (dict): Crawl job from the database
+            pipelined (bool): Prefetch pages while earlier ones are analyzed and saved
+            
+        Returns:
+            dict: Analysis results
+        """
+        hashtag_id = job['hashtag_id']
+        resumed = job['fetched_count'] > 0
+        
+        # An empty cursor means the last page was already saved
+        remaining = job['target_count'] - job['fetched_count'] if job['last_cursor'] != '' else 0
         
-        # Process locations
-        self._process_locations(collected_data['users'])
+        try:
+            collected_data = self._collect_tweets(
+                hashtag, hashtag_id, remaining, job['search_type'], pipelined, job['since_id'],
+                cursor=job['last_cursor'], job_id=job['id']
+            )
+        except Exception as e:
+            self.db.finish_crawl_job(job['id'], 'failed', str(e))
+            raise
+        collected_data['crawl']['gap'] = self.db.finish_crawl_job(
+            job['id'], reached_known=collected_data['crawl']['reached_known']
+        )
+        collected_data['crawl']['job_id'] = job['id']
+        collected_data['crawl']['resumed'] = resumed
+        
+        # Process locations, including users of pages saved before an interruption
+        users = collected_data['users']
+        if resumed:
+            users = dict(self.db.get_unlocated_users(hashtag_id), **users)
+        geocoding_stats = self._process_locations(users)
         
         # Update statistics
         self.db.update_hashtag_stats(hashtag_id)
         self.db.update_top_contributors(hashtag_id)
         
         # Get analysis results
-        return self._get_analysis_results(hashtag_id)
+        results = self._get_analysis_results(hashtag_id)
+        results['collection'] = {
+            'inserted': collected_data['inserted'],
+            'duplicates': collected_data['duplicates'],
+            'users': collected_data['user_writes'],
+            'sentiment_cache': collected_data['sentiment_cache'],
+            'geocoding': geocoding_stats,
+            'crawl': collected_data['crawl']
+        }
+        if 'pipeline' in collected_data:
+            results['collection']['pipeline'] = collected_data['pipeline']
+        return results
+    
+    def analyze_many(self, hashtags, count=100, search_type="Latest", workers=4, incremental=False,
+                     resume=False):
+        """
+        Analyze several hashtags, crawling them concurrently.
+        
+        Up to `workers` hashtags are fetched at the same time on worker
+        threads, while their pages are scored and saved on the calling
+        thread as they arrive. Each user is upserted once per batch no
+        matter how many crawls returned them, and the location strings of
+        all crawls are geocoded and linked together once the crawls end.
+        
+        If the batch is interrupted, the crawl jobs it had not finished
+        are marked failed, so a later resume continues them.
+        
+        Args:
+            hashtags (list): Hashtags to analyze (with or without #)
+            count (int): Number of tweets to retrieve per hashtag
+            search_type (str): Type of search (Top, Latest, Photos, Videos, People)
+            workers (int): Maximum number of hashtags crawled at the same time
+            incremental (bool): Stop paging each hashtag at tweets stored by earlier crawls
+            resume (bool): Continue the last unfinished crawl of each hashtag
+                instead of starting new ones; count, search_type and
+                incremental then come from those crawls
+            
+        Returns:
+            dict: 'results' with each hashtag's analysis results (or its
+                error), 'timing' in seconds per phase, and user, location
+                and sentiment cache counts for the batch
+                
+        Raises:
+            ValueError: For an incremental search other than Latest
+        """
+        if not resume:
+            self._check_incremental(search_type, incremental)
+        started_at = time.perf_counter()
+        
+        hashtag_ids = {}
+        jobs = {}
+        errors = {}
+        for hashtag in hashtags:
+            clean_hashtag = self._clean_hashtag(hashtag)
+            if clean_hashtag not in hashtag_ids:
+                hashtag_record = self.db.get_or_create_hashtag(clean_hashtag)
+                hashtag_ids[clean_hashtag] = hashtag_record['id']
+                if resume:
+                    job = self.db.get_unfinished_crawl_job(hashtag_record['id'])
+                    if job is None:
+                        errors[clean_hashtag] = f"No unfinished crawl to resume for #{clean_hashtag}"
+                        continue
+                    jobs[clean_hashtag] = job
+                else:
+                    since_id = hashtag_record['newest_tweet_id'] if incremental else None
+                    jobs[clean_hashtag] = self.db.create_crawl_job(hashtag_record['id'], search_type, count,
+                                                                   since_id)
+        
+        collected = {
+            hashtag: {
+                'inserted': 0,
+                'duplicates': 0,
+                'users': {'records': 0, 'written': 0, 'skipped': 0},
+                'crawl': {
+                    'incremental': job['since_id'] is not None,
+                    'since_id': job['since_id'],
+                    'job_id': job['id'],
+                    'resumed': job['fetched_count'] > 0
+                }
+            }
+            for hashtag, job in jobs.items()
+        }
+        finished = set()
+        users = {}
+        # One fingerprint map for the batch, so users shared by hashtags are compared once
+        fingerprints = {}
+        
+        # Worker threads only fetch; (hashtag, page, error) items with no page end a crawl
+        pages = queue.Queue(maxsize=self.pipeline_queue_size * workers)
+        stop = threading.Event()
+        
+        def put(item):
+            # Give up waiting once the saving side has stopped
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def crawl(hashtag):
+            job = jobs[hashtag]
+            # An empty cursor means the last page was already saved
+            remaining = job['target_count'] - job['fetched_count'] if job['last_cursor'] != '' else 0
+            try:
+                pages_fetched = self._fetch_pages(hashtag, remaining, job['search_type'], cursor=job['last_cursor'],
+                                                  since_id=job['since_id'], progress=collected[hashtag]['crawl'])
+                for page in pages_fetched:
+                    if not put((hashtag, page, None)):
+                        return
+                put((hashtag, None, None))
+            except Exception as e:
+                put((hashtag, None, e))
+        
+        self.sentiment_analyzer.reset_cache_stats()
+        executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='crawl')
+        interruption = None
+        try:
+            for hashtag in jobs:
+                executor.submit(crawl, hashtag)
+            
+            while len(finished) < len(jobs):
+                hashtag, page, error = pages.get()
+                if page is None:
+                    finished.add(hashtag)
+                    if error is not None:
+                        print(f"Error crawling #{hashtag}: {str(error)}")
+                        errors[hashtag] = str(error)
+                        self.db.finish_crawl_job(jobs[hashtag]['id'], 'failed', str(error))
+                    else:
+                        collected[hashtag]['crawl']['gap'] = self.db.finish_crawl_job(
+                            jobs[hashtag]['id'], reached_known=collected[hashtag]['crawl']['reached_known']
+                        )
+                    continue
+                
+                page = self._process_page(page)
+                saved = self.db.save_page(page['tweets'], page['users'], hashtag_ids[hashtag],
+                                          job_id=jobs[hashtag]['id'], cursor=self._next_cursor(page),
+                                          fingerprints=fingerprints)
+                users.update(page['users'])
+                collected[hashtag]['inserted'] += saved['inserted']
+                collected[hashtag]['duplicates'] += saved['duplicates']
+                self._count_user_writes(collected[hashtag]['users'], saved)
+        except BaseException as e:
+            interruption = e
+            raise
+        finally:
+            stop.set()
+            executor.shutdown()
+            # Jobs left running would never be resumed by the next batch either
+            for hashtag, job in jobs.items():
+                if hashtag not in finished:
+                    self.db.finish_crawl_job(job['id'], 'failed', f"Batch interrupted: {interruption!r}")
+        crawled_at = time.perf_counter()
+        
+        # Users of pages saved before an interruption are located with the batch
+        for hashtag, job in jobs.items():
+            if collected[hashtag]['crawl']['resumed'] and hashtag not in errors:
+                users = dict(self.db.get_unlocated_users(job['hashtag_id']), **users)
+        
+        # Every distinct location string of the batch is geocoded once
+        geocoding_stats = self._process_locations(users)
+        geocoded_at = time.perf_counter()
+        
+        results = {}
+        for hashtag, hashtag_id in hashtag_ids.items():
+            if hashtag in errors:
+                results[hashtag] = {'error': errors[hashtag]}
+                continue
+            self.db.update_hashtag_stats(hashtag_id)
+            self.db.update_top_contributors(hashtag_id)
+            results[hashtag] = self._get_analysis_results(hashtag_id)
+            results[hashtag]['collection'] = collected[hashtag]
+        finished_at = time.perf_counter()
+        
+        return {
+            'results': results,
+            'timing': {
+                'crawl_seconds': crawled_at - started_at,
+                'geocode_seconds': geocoded_at - crawled_at,
+                'analysis_seconds': finished_at - geocoded_at,
+                'total_seconds': finished_at - started_at
+            },
+            'users': {
+                'records': sum(collection['users']['records'] for collection in collected.values()),
+                'saved': len(users),
+                'written': sum(collection['users']['written'] for collection in collected.values())
+            },
+            'geocoding': geocoding_stats,
+            'sentiment_cache': self.sentiment_analyzer.cache_stats()
+        }
+    
+    def create_monitor(self, hashtags, count=100, search_type="Latest", clock=None, **options):
+        """
+        Create a scheduler that keeps hashtags up to date.
+        
+        Each poll is an incremental analysis of one hashtag, and the
+        hashtag's velocity is read from its stats snapshots and minute
+        activity, so busy hashtags are polled more often than quiet ones.
+        
+        Args:
+            hashtags (list): Hashtags to monitor (with or without #)
+            count (int): Most tweets retrieved per poll
+            search_type (str): Type of search, Latest for incremental polls to stop early
+            clock: Scheduler clock, defaults to the wall clock
+            **options: MonitorScheduler options such as requests_per_hour
+            
+        Returns:
+            MonitorScheduler: Scheduler with the hashtags queued, started with run()
+            
+        Raises:
+            ValueError: For a search other than Latest, since polls are incremental
+        """
+        self._check_incremental(search_type, True)
+        hashtag_ids = {}
+        
+        def poll(hashtag):
+            results = self.analyze_hashtag(hashtag, count, search_type, incremental=True)
+            return {
+                'new_tweets': results['collection']['inserted'],
+                'requests': results['collection']['crawl']['requests']
+            }
+        
+        def velocity(hashtag):
+            return self.db.get_recent_velocity(hashtag_ids[hashtag])
+        
+        options.setdefault('poll_capacity', count)
+        scheduler = MonitorScheduler(poll, velocity, clock=clock, **options)
+        for hashtag in hashtags:
+            clean_hashtag = self._clean_hashtag(hashtag)
+            hashtag_ids[clean_hashtag] = self.db.get_or_create_hashtag(clean_hashtag)['id']
+            scheduler.add(clean_hashtag)
+        return scheduler
+    
+    def _check_incremental(self, search_type, incremental):
+        """Reject incremental crawls of searches that don't return the newest tweets first."""
+        if incremental and search_type != 'Latest':
+            raise ValueError(f"Incremental crawls need Latest searches, not {search_type}: "
+                             f"only those page from the newest tweets down to stored ones")
+    
+    def _clean_hashtag(self, hashtag):
+        """Strip whitespace and a leading # from a hashtag."""
+        clean_hashtag = hashtag.strip()
+        if clean_hashtag.startswith('#'):
+            clean_hashtag = clean_hashtag[1:]
+        return clean_hashtag
     
-    def _collect_tweets(self, hashtag, hashtag_id, count, search_type):
+    def _collect_tweets(self, hashtag, hashtag_id, count, search_type, pipelined=False, since_id=None,
+                        cursor=None, job_id=None):
         """
         Collect tweets for a hashtag.
         
@@ -64,20 +403,92 @@ class HashtagAnalyzer:
             hashtag_id (int): Database ID of the hashtag
             count (int): Number of tweets to retrieve
             search_type (str): Type of search
+            pipelined (bool): Overlap fetching, sentiment analysis and saving
+            since_id (str): Stop at tweets no newer than this one, None to page up to count
+            cursor (str): Pagination cursor to start from
+            job_id (int): Crawl job whose progress is saved with each page
             
         Returns:
-            dict: Collected data including tweets and users
+            dict: Collected data including tweets, users, the number of
+                inserted and duplicate tweets and how the crawl ended
         """
         collected_data = {
             'tweets': [],
-            'users': {}
+            'users': {},
+            'inserted': 0,
+            'duplicates': 0,
+            'user_writes': {'records': 0, 'written': 0, 'skipped': 0},
+            'crawl': {
+                'incremental': since_id is not None,
+                'since_id': since_id,
+                'requests': 0,
+                'pages': 0,
+                'reached_known': False
+            }
         }
         
+        pages = self._fetch_pages(hashtag, count, search_type, cursor=cursor, since_id=since_id,
+                                  progress=collected_data['crawl'])
+        self.sentiment_analyzer.reset_cache_stats()
+        # Profiles already written during this crawl, so repeat posters aren't rewritten
+        fingerprints = {}
+        
+        def persist(page):
+            # Save tweets, users and the crawl job's next cursor in one transaction
+            saved = self.db.save_page(page['tweets'], page['users'], hashtag_id,
+                                      job_id=job_id, cursor=self._next_cursor(page), fingerprints=fingerprints)
+            collected_data['inserted'] += saved['inserted']
+            collected_data['duplicates'] += saved['duplicates']
+            self._count_user_writes(collected_data['user_writes'], saved)
+            collected_data['tweets'].extend(page['tweets'])
+            collected_data['users'].update(page['users'])
+        
+        if pipelined:
+            pipeline = CollectionPipeline(queue_size=self.pipeline_queue_size)
+            collected_data['pipeline'] = pipeline.run(pages, self._process_page, persist)
+        else:
+            for page in pages:
+                persist(self._process_page(page))
+        
+        collected_data['sentiment_cache'] = self.sentiment_analyzer.cache_stats()
+        return collected_data
+    
+    def _count_user_writes(self, user_writes, saved):
+        """Add a saved page's users to a crawl's counts of written and skipped profiles."""
+        user_writes['records'] += saved['users']
+        user_writes['written'] += saved['users_written']
+        user_writes['skipped'] += saved['users'] - saved['users_written']
+    
+    def _fetch_pages(self, hashtag, count, search_type, cursor=None, since_id=None, progress=None):
+        """
+        Fetch search result pages until enough tweets have been retrieved.
+        
+        With a since_id, paging also stops at the first page holding
+        tweets no newer than it: a page made only of such tweets is
+        dropped, and after a page that reaches them every later page
+        would be older still.
+        
+        Args:
+            hashtag (str): Hashtag to search for
+            count (int): Number of tweets to retrieve, not counting those missing an ID or author
+            search_type (str): Type of search
+            cursor (str): Pagination cursor to start from
+            since_id (str): High-water mark of tweets already stored
+            progress (dict): Updated with the number of API 'requests' made and
+                'pages' yielded, and whether paging stopped because it
+                'reached_known' tweets
+            
+        Yields:
+            dict: Search results with tweets, users and cursor
+        """
+        progress = progress if progress is not None else {}
+        progress.setdefault('requests', 0)
+        progress.setdefault('pages', 0)
+        progress.setdefault('reached_known', False)
+        since_key = tweet_id_key(since_id) if since_id is not None else None
+        
         # Format hashtag for search
         search_hashtag = f"#{hashtag}"
-        
-        # Search for tweets
-        cursor = None
         remaining = count
         
         while remaining > 0:
@@ -90,42 +501,60 @@ class HashtagAnalyzer:
                 search_type=search_type,
                 cursor=cursor
             )
+            progress['requests'] += 1
             
             if not results or not results['tweets']:
                 break
             
-            # Process tweets
-            tweets = results['tweets']
-            users = results['users']
-            
-            # Analyze sentiment
-            tweets = self.sentiment_analyzer.analyze_tweets(tweets)
+            known = 0
+            if since_key is not None:
+                known = sum(1 for tweet in results['tweets'] if tweet_id_key(tweet.get('id')) <= since_key)
+                if known == len(results['tweets']):
+                    progress['reached_known'] = True
+                    break
             
-            # Save tweets and users to database
-            for tweet in tweets:
-                # Skip if missing essential data
-                if not tweet.get('id') or not tweet.get('user_id'):
-                    continue
-                
-                # Save tweet
-                self.db.save_tweet(tweet, hashtag_id)
-                collected_data['tweets'].append(tweet)
+            progress['pages'] += 1
+            yield results
             
-            # Save users
-            for user_id, user in users.items():
-                self.db.save_user(user)
-                collected_data['users'][user_id] = user
+            if known:
+                progress['reached_known'] = True
+                break
             
-            # Update remaining count
-            remaining -= len(tweets)
+            # Count the tweets that will be saved, as the crawl job's fetched_count does,
+            # so a resumed crawl aims for the same total
+            remaining -= sum(1 for tweet in results['tweets'] if self._is_complete(tweet))
             
             # Update cursor for pagination
             if results.get('cursor') and results['cursor'].get('bottom'):
                 cursor = results['cursor']['bottom']
             else:
                 break
+    
+    def _next_cursor(self, page):
+        """Get the cursor of the page after this one, '' if there is none."""
+        return (page.get('cursor') or {}).get('bottom') or ''
+    
+    def _is_complete(self, tweet):
+        """Check that a tweet has the essential data it is saved with."""
+        return bool(tweet.get('id') and tweet.get('user_id'))
+    
+    def _process_page(self, results):
+        """
+        Analyze sentiment for a page of search results.
         
-        return collected_data
+        Args:
+            results (dict): Search results with tweets and users
+            
+        Returns:
+            dict: Page with scored tweets, skipping tweets missing essential data
+        """
+        tweets = self.sentiment_analyzer.analyze_tweets_parallel(results['tweets'])
+        
+        return {
+            'tweets': [tweet for tweet in tweets if self._is_complete(tweet)],
+            'users': results['users'],
+            'cursor': results.get('cursor')
+        }
     
     def _process_locations(self, users):
         """
@@ -133,6 +562,9 @@ class HashtagAnalyzer:
         
         Args:
             users (dict): Dictionary of user data
+            
+        Returns:
+            dict: Geocoding cache statistics for the batch
         """
         # Collect unique locations
         locations = set()
@@ -164,6 +596,8 @@ class HashtagAnalyzer:
                 # Link user to location
                 if location_id:
                     self.db.link_user_location(user_id, location_id)
+        
+        return self.geocoding_service.last_batch_stats
     
     def _get_analysis_results(self, hashtag_id):
         """
@@ -175,8 +609,22 @@ class HashtagAnalyzer:
         Returns:
             dict: Analysis results
         """
+        # Results for the current data version are still valid. Data
+        # committed while computing them only makes them newer than
+        # their version, never older, so storing them is safe.
+        data_version = self.db.get_data_version(hashtag_id)
+        if data_version is not None:
+            cached = self.result_cache.get(hashtag_id, data_version, namespace=self.db.identity)
+            if cached is not None:
+                return cached
+        
+        # Get location stats, shared with the summary
+        locations = self.db.get_location_stats(hashtag_id)
+        
         # Get summary data
-        summary = self.db.get_hashtag_summary(hashtag_id)
+        summary = self.db.get_hashtag_summary(hashtag_id, include_locations=False)
+        if summary is not None:
+            summary['locations'] = locations['locations']
         
         # Get top contributors
         top_contributors = self.db.get_top_contributors(hashtag_id)
@@ -184,33 +632,48 @@ class HashtagAnalyzer:
         # Get sentiment analysis
         sentiment = self.db.get_sentiment_analysis(hashtag_id)
         
-        # Get location stats
-        locations = self.db.get_location_stats(hashtag_id)
-        
-        return {
+        results = {
             'summary': summary,
             'top_contributors': top_contributors,
             'sentiment': sentiment,
             'locations': locations
         }
+        if data_version is not None:
+            self.result_cache.put(hashtag_id, data_version, results, namespace=self.db.identity)
+        return results
     
     def close(self):
-        """Close database connection."""
+        """Close database connection and stop worker processes."""
+        self.sentiment_analyzer.close()
+        self.geocoding_service.close()
         self.db.close()
 
 
 # Main application controller
 class HashtagAnalyzerApp:
-    def __init__(self, db_path='twitter_hashtag_analyzer.db'):
+    def __init__(self, db_path='twitter_hashtag_analyzer.db', concurrent=False, api_client=None,
+                 sentiment_engine='textblob', result_cache_dir=None, archive_path=None, replay_path=None):
         """
         Initialize the hashtag analyzer application.
         
         Args:
             db_path (str): Path to the SQLite database file
+            concurrent (bool): Open the database in concurrent mode
+            api_client: Client used by TwitterService, defaults to the data API client
+            sentiment_engine (str): Sentiment engine, 'textblob' or 'lexicon'
+            result_cache_dir (str): Directory keeping analysis results between runs
+            archive_path (str): Response archive every raw API page is appended to
+            replay_path (str): Response archive to answer API calls from instead of the API
         """
-        self.analyzer = HashtagAnalyzer(db_path)
+        self.archive = ResponseArchive(archive_path) if archive_path else None
+        self.replay_client = ReplayApiClient(replay_path) if replay_path else None
+        self.analyzer = HashtagAnalyzer(db_path, concurrent=concurrent,
+                                        api_client=self.replay_client or api_client,
+                                        sentiment_engine=sentiment_engine,
+                                        result_cache=ResultCache(cache_dir=result_cache_dir),
+                                        archive=self.archive)
     
-    def analyze_hashtag(self, hashtag, count=100, search_type="Latest"):
+    def analyze_hashtag(self, hashtag, count=100, search_type="Latest", pipelined=False, incremental=False):
         """
         Analyze a Twitter hashtag.
         
@@ -218,33 +681,166 @@ class HashtagAnalyzerApp:
             hashtag (str): Hashtag to analyze (with or without #)
             count (int): Number of tweets to retrieve
             search_type (str): Type of search (Top, Latest, Photos, Videos, People)
+            pipelined (bool): Prefetch pages while earlier ones are analyzed and saved
+            incremental (bool): Only page down to tweets stored by earlier crawls
             
         Returns:
             dict: Analysis results
         """
         try:
-            return self.analyzer.analyze_hashtag(hashtag, count, search_type)
+            return self.analyzer.analyze_hashtag(hashtag, count, search_type, pipelined, incremental)
         except Exception as e:
             print(f"Error analyzing hashtag: {str(e)}")
             return {"error": str(e)}
     
+    def resume_crawl(self, hashtag, pipelined=False):
+        """
+        Continue the last unfinished crawl of a hashtag and analyze it.
+        
+        Args:
+            hashtag (str): Hashtag whose crawl to resume (with or without #)
+            pipelined (bool): Prefetch pages while earlier ones are analyzed and saved
+            
+        Returns:
+            dict: Analysis results
+        """
+        try:
+            return self.analyzer.resume_crawl(hashtag, pipelined)
+        except Exception as e:
+            print(f"Error resuming crawl: {str(e)}")
+            return {"error": str(e)}
+    
+    def analyze_many(self, hashtags, count=100, search_type="Latest", workers=4, incremental=False,
+                     resume=False):
+        """
+        Analyze several hashtags, crawling them concurrently.
+        
+        Args:
+            hashtags (list): Hashtags to analyze (with or without #)
+            count (int): Number of tweets to retrieve per hashtag
+            search_type (str): Type of search (Top, Latest, Photos, Videos, People)
+            workers (int): Maximum number of hashtags crawled at the same time
+            incremental (bool): Only page down to tweets stored by earlier crawls
+            resume (bool): Continue each hashtag's last unfinished crawl
+            
+        Returns:
+            dict: Per-hashtag results and batch timing
+        """
+        try:
+            return self.analyzer.analyze_many(hashtags, count, search_type, workers, incremental, resume)
+        except Exception as e:
+            print(f"Error analyzing hashtags: {str(e)}")
+            return {"error": str(e)}
+    
     def close(self):
         """Close the application."""
         self.analyzer.close()
+        if self.archive is not None:
+            self.archive.close()
+        if self.replay_client is not None:
+            self.replay_client.close()
 
 
 # Example usage
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python hashtag_analyzer.py <hashtag> [count] [search_type]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Analyze a Twitter hashtag.")
+    parser.add_argument('hashtag', nargs='?', help="Hashtag to analyze (with or without #)")
+    parser.add_argument('count', nargs='?', type=int, default=100, help="Number of tweets to retrieve")
+    parser.add_argument('search_type', nargs='?', default="Latest", help="Top, Latest, Photos, Videos or People")
+    parser.add_argument('--pipelined', action='store_true', help="Prefetch pages while earlier ones are processed")
+    parser.add_argument('--sentiment-engine', choices=SentimentAnalyzer.ENGINES, default='textblob',
+                        help="Score tweets with TextBlob or with the vectorized lexicon engine")
+    parser.add_argument('--rebuild-counters', action='store_true',
+                        help="Recompute every hashtag's running counters from the stored tweets")
+    parser.add_argument('--result-cache-dir',
+                        help="Keep analysis results in this directory and reuse them while no new data arrives")
+    parser.add_argument('--also', nargs='+', default=[], metavar='HASHTAG',
+                        help="More hashtags to analyze in the same batch, crawled concurrently")
+    parser.add_argument('--workers', type=int, default=4, help="Hashtags crawled at the same time in a batch")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only fetch tweets newer than the ones already stored")
+    parser.add_argument('--monitor', action='store_true',
+                        help="Keep polling the hashtags, more often the faster they receive tweets")
+    parser.add_argument('--requests-per-hour', type=float, default=900,
+                        help="API requests the monitor may make per hour across all hashtags")
+    parser.add_argument('--min-interval', type=float, default=60, help="Shortest monitor poll interval in seconds")
+    parser.add_argument('--max-interval', type=float, default=3600, help="Longest monitor poll interval in seconds")
+    parser.add_argument('--archive', metavar='PATH',
+                        help="Append every raw API response to a compressed archive (.gz or .zst)")
+    parser.add_argument('--replay', metavar='PATH',
+                        help="Answer API calls from a response archive instead of the API")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue the last interrupted crawl of the hashtag, or of each --also batch "
+                             "hashtag, from its last saved page")
+    args = parser.parse_args()
+    
+    if not args.hashtag and not args.rebuild_counters:
+        parser.error("a hashtag is required")
+    if args.also and args.pipelined:
+        parser.error("--pipelined only applies to single hashtags; --also batches always fetch pages "
+                     "on worker threads while earlier pages are saved")
+    if (args.incremental or args.monitor) and args.search_type != 'Latest':
+        parser.error(f"--incremental and --monitor need Latest searches, not {args.search_type}")
     
-    hashtag = sys.argv[1]
-    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
-    search_type = sys.argv[3] if len(sys.argv) > 3 else "Latest"
+    hashtag = args.hashtag
     
-    app = HashtagAnalyzerApp()
-    results = app.analyze_hashtag(hashtag, count, search_type)
+    app = HashtagAnalyzerApp(sentiment_engine=args.sentiment_engine, result_cache_dir=args.result_cache_dir,
+                             archive_path=args.archive, replay_path=args.replay)
+    
+    if args.rebuild_counters:
+        app.analyzer.db.rebuild_hashtag_counters()
+        print("Hashtag counters rebuilt")
+        if not hashtag:
+            app.close()
+            sys.exit(0)
+    
+    if args.monitor:
+        scheduler = app.analyzer.create_monitor(
+            [hashtag] + args.also, args.count, args.search_type,
+            requests_per_hour=args.requests_per_hour,
+            min_interval=args.min_interval,
+            max_interval=args.max_interval
+        )
+        
+        def report(record):
+            print(f"#{record['hashtag']}: {record['new_tweets']} new tweets in {record['requests']} requests, "
+                  f"next poll in {record['interval']:.0f}s")
+        
+        try:
+            scheduler.run(on_poll=report)
+        except KeyboardInterrupt:
+            for entry in scheduler.queue_state()['hashtags']:
+                print(f"#{entry['hashtag']}: {entry['polls']} polls, {entry['new_tweets']} new tweets, "
+                      f"interval {entry['interval']:.0f}s")
+        app.close()
+        sys.exit(0)
+    
+    if args.also:
+        batch = app.analyze_many([hashtag] + args.also, args.count, args.search_type, workers=args.workers,
+                                 incremental=args.incremental, resume=args.resume)
+        if 'error' in batch:
+            app.close()
+            sys.exit(1)
+        for name, results in batch['results'].items():
+            if 'error' in results:
+                print(f"#{name}: failed, {results['error']}")
+                continue
+            output_file = f"{name}_analysis.json"
+            with open(output_file, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"#{name}: {results['collection']['inserted']} new tweets, saved to {output_file}")
+        print(f"Users: {batch['users']['saved']} distinct of {batch['users']['records']} returned, "
+              f"{batch['users']['written']} profile writes")
+        print(f"Batch took {batch['timing']['total_seconds']:.1f}s "
+              f"(crawl {batch['timing']['crawl_seconds']:.1f}s, geocode {batch['timing']['geocode_seconds']:.1f}s)")
+        app.close()
+        sys.exit(0)
+    
+    if args.resume:
+        results = app.resume_crawl(hashtag, pipelined=args.pipelined)
+    else:
+        results = app.analyze_hashtag(hashtag, args.count, args.search_type, pipelined=args.pipelined,
+                                      incremental=args.incremental)
     
     # Print summary
     if 'summary' in results and 'hashtag' in results['summary']:
@@ -254,6 +850,17 @@ if __name__ == "__main__":
         print(f"Total contributors: {hashtag_data['total_contributors']}")
         print(f"Sentiment score: {hashtag_data['sentiment_score']:.2f}")
     
+    if 'collection' in results:
+        collection = results['collection']
+        print(f"New tweets: {collection['inserted']} (duplicates: {collection['duplicates']}, "
+              f"pages: {collection['crawl']['pages']})")
+        print(f"User profiles written: {collection['users']['written']} "
+              f"(unchanged, skipped: {collection['users']['skipped']})")
+        print(f"Sentiment cache hit rate: {collection['sentiment_cache']['hit_rate']:.0%}")
+        print(f"Geocoding cache hit rate: {collection['geocoding']['hit_rate']:.0%}")
+        print(f"Geocoded offline: {collection['geocoding']['gazetteer']} "
+              f"(network lookups: {collection['geocoding']['misses']})")
+    
     # Save results to file
     output_file = f"{hashtag}_analysis.json"
     with open(output_file, 'w') as f:
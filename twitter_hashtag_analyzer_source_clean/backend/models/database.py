@@ -1,16 +1,312 @@
 import sqlite3
 import os
 import json
-from datetime import datetime
+import queue
+import threading
+import hashlib
+import functools
+import itertools
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+from models.hyperloglog import HyperLogLog, hash_value
+from models.migrations import migrate
+
+# Rollup resolution to bucket width in seconds
+ROLLUP_RESOLUTIONS = {
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400
+}
+
+# HyperLogLog precision of each resolution's user sketches; minute buckets
+# hold few users and are the most numerous, so they get smaller sketches
+ROLLUP_PRECISIONS = {
+    'minute': 10,
+    'hour': 12,
+    'day': 12
+}
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+EPOCH = datetime(1970, 1, 1)
+
+# Tweets scoring beyond these thresholds count as positive or negative in rollups
+POSITIVE_THRESHOLD = 0.5
+NEGATIVE_THRESHOLD = -0.5
+
+
+def tweet_id_key(tweet_id):
+    """
+    Get a sort key ordering tweet IDs from oldest to newest.
+    
+    Tweet IDs are numeric strings that grow over time, so a longer ID
+    is newer and IDs of equal length compare as text.
+    
+    Args:
+        tweet_id (str): Tweet ID
+        
+    Returns:
+        tuple: Sort key
+    """
+    tweet_id = str(tweet_id or '')
+    return (len(tweet_id), tweet_id)
+
+
+def to_epoch(value):
+    """
+    Convert a stored timestamp to seconds since the Unix epoch.
+    
+    Timestamps without an offset are UTC, like SQLite's own date functions
+    assume, so the result matches strftime('%s', value) in SQL.
+    
+    Args:
+        value: 'YYYY-MM-DD HH:MM:SS' string, datetime or epoch seconds
+        
+    Returns:
+        int: Epoch seconds, None if the value can't be parsed
+    """
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return (parsed - EPOCH) // timedelta(seconds=1)
+
+
+def from_epoch(epoch):
+    """Format epoch seconds as a 'YYYY-MM-DD HH:MM:SS' UTC timestamp."""
+    return (EPOCH + timedelta(seconds=epoch)).strftime(TIMESTAMP_FORMAT)
+
+
+def _time_buckets(created_epoch):
+    """Get the rollup bucket of an epoch timestamp at every resolution."""
+    return {
+        resolution: created_epoch - created_epoch % width
+        for resolution, width in ROLLUP_RESOLUTIONS.items()
+    }
+
+
+# Profile fields rewritten when a user is seen again, in users table column order
+USER_COLUMNS = (
+    'id', 'username', 'display_name', 'profile_image_url', 'followers_count',
+    'following_count', 'tweet_count', 'location', 'account_created_at', 'is_verified'
+)
+
+
+def _user_row(user_data):
+    """Get the users table row of a user dictionary."""
+    return (
+        user_data['id'],
+        user_data['username'],
+        user_data.get('display_name', ''),
+        user_data.get('profile_image_url', ''),
+        user_data.get('followers_count', 0),
+        user_data.get('following_count', 0),
+        user_data.get('tweet_count', 0),
+        user_data.get('location', ''),
+        user_data.get('account_created_at', ''),
+        user_data.get('is_verified', False)
+    )
+
+
+def _user_profile(row):
+    """
+    Get the profile fields of a users row as SQLite stores them.
+    
+    Booleans are stored as integers and datetimes as ISO text, so a
+    fresh row of an unchanged profile equals the stored one field by
+    field.
+    """
+    return tuple(
+        int(value) if isinstance(value, bool) else value.isoformat(' ') if isinstance(value, datetime) else value
+        for value in tuple(row)[1:]
+    )
+
+
+def _writes(method):
+    """Run a database method on the writer thread in concurrent mode."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._writer is None:
+            # Serialize threads sharing the single connection
+            with self._lock:
+                return method(self, *args, **kwargs)
+        if self._writer.is_current():
+            return method(self, *args, **kwargs)
+        return self._writer.submit(method, self, *args, **kwargs)
+    return wrapper
+
+
+def _reads(method):
+    """Run a database method on a pooled read-only connection in concurrent mode."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._readers is None:
+            with self._lock:
+                return method(self, *args, **kwargs)
+        if self._writer.is_current() or getattr(self._local, 'conn', None) is not None:
+            return method(self, *args, **kwargs)
+        with self._readers.connection() as conn:
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._local.conn = None
+                self._local.cursor = None
+    return wrapper
+
+
+class _WriterThread(threading.Thread):
+    """Dedicated thread that owns the write connection and drains a queue of writes."""
+    
+    def __init__(self, conn):
+        super().__init__(name='database-writer', daemon=True)
+        self.conn = conn
+        self.queue = queue.Queue()
+    
+    def is_current(self):
+        """Check whether the calling thread is the writer thread."""
+        return threading.current_thread() is self
+    
+    def submit(self, operation, *args, **kwargs):
+        """
+        Queue a write operation and wait for its result.
+        
+        Args:
+            operation (callable): Function to run on the writer thread
+            
+        Returns:
+            The return value of the operation
+        """
+        future = Future()
+        self.queue.put((future, operation, args, kwargs))
+        return future.result()
+    
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            
+            future, operation, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            
+            try:
+                future.set_result(operation(*args, **kwargs))
+            except BaseException as e:
+                # Never leave a half-applied write open for the next operation
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+                future.set_exception(e)
+    
+    def stop(self):
+        """Finish queued writes and stop the thread."""
+        self.queue.put(None)
+        self.join()
+
+
+class _ReaderPool:
+    """Small pool of read-only connections handed out to reading threads."""
+    
+    def __init__(self, db_path, size):
+        self.uri = f"file:{quote(os.path.abspath(db_path))}?mode=ro"
+        self.slots = threading.BoundedSemaphore(size)
+        self.idle = queue.LifoQueue()
+        self.all = []
+        self.lock = threading.Lock()
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        with self.lock:
+            self.all.append(conn)
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        """Check out a read-only connection for the duration of a read."""
+        with self.slots:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            
+            try:
+                yield conn
+            finally:
+                self.idle.put(conn)
+    
+    def close(self):
+        """Close every connection the pool has opened."""
+        with self.lock:
+            for conn in self.all:
+                conn.close()
+            self.all = []
+
 
 class Database:
-    def __init__(self, db_path='twitter_hashtag_analyzer.db'):
-        """Initialize database connection and create tables if they don't exist."""
+    def __init__(self, db_path='twitter_hashtag_analyzer.db', concurrent=False, max_readers=4):
+        """
+        Initialize database connection and create tables if they don't exist.
+        
+        Args:
+            db_path (str): Path to the SQLite database file
+            concurrent (bool): Use WAL journaling, a pool of read-only connections
+                and a single writer thread so reads can run while ingest writes
+            max_readers (int): Maximum number of read-only connections in concurrent mode
+        """
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
-        self.conn.row_factory = sqlite3.Row
-        self.cursor = self.conn.cursor()
+        self.concurrent = concurrent
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._writer = None
+        self._readers = None
+        
+        if concurrent and db_path == ':memory:':
+            raise ValueError("Concurrent mode needs a database file, not ':memory:'")
+        
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._cursor = self._conn.cursor()
         self._create_tables()
+        self.identity = self._identity()
+        
+        if concurrent:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._readers = _ReaderPool(db_path, max_readers)
+            self._writer = _WriterThread(self._conn)
+            self._writer.start()
+    
+    @property
+    def conn(self):
+        """Connection for the current operation."""
+        if self._readers is None or self._writer.is_current():
+            return self._conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            raise RuntimeError("Database access outside a read or write operation in concurrent mode")
+        return conn
+    
+    @property
+    def cursor(self):
+        """Cursor for the current operation."""
+        if self._readers is None or self._writer.is_current():
+            return self._cursor
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            raise RuntimeError("Database access outside a read or write operation in concurrent mode")
+        return cursor
     
     def _create_tables(self):
         """Create database tables based on the schema."""
@@ -23,6 +319,8 @@ class Database:
             total_tweets INTEGER DEFAULT 0,
             total_contributors INTEGER DEFAULT 0,
             sentiment_score REAL DEFAULT 0,
+            newest_tweet_id TEXT,
+            newest_tweet_at TIMESTAMP,
             UNIQUE(name)
         );
 
@@ -39,6 +337,7 @@ class Database:
             is_reply BOOLEAN DEFAULT FALSE,
             has_media BOOLEAN DEFAULT FALSE,
             sentiment_score REAL DEFAULT 0,
+            created_epoch INTEGER,
             FOREIGN KEY (hashtag_id) REFERENCES hashtags(id),
             FOREIGN KEY (user_id) REFERENCES users(id)
         );
@@ -85,6 +384,7 @@ class Database:
             reply_count INTEGER DEFAULT 0,
             media_count INTEGER DEFAULT 0,
             sentiment_score REAL DEFAULT 0,
+            timestamp_epoch INTEGER,
             FOREIGN KEY (hashtag_id) REFERENCES hashtags(id)
         );
 
@@ -100,16 +400,78 @@ class Database:
             FOREIGN KEY (user_id) REFERENCES users(id)
         );
 
-        CREATE INDEX IF NOT EXISTS idx_tweets_hashtag_id ON tweets(hashtag_id);
+        CREATE TABLE IF NOT EXISTS sentiment_cache (
+            content_hash TEXT PRIMARY KEY,
+            score REAL NOT NULL
+        ) WITHOUT ROWID;
+        
+        CREATE TABLE IF NOT EXISTS hashtag_counters (
+            hashtag_id INTEGER PRIMARY KEY,
+            tweet_count INTEGER DEFAULT 0,
+            contributor_count INTEGER DEFAULT 0,
+            retweet_count INTEGER DEFAULT 0,
+            reply_count INTEGER DEFAULT 0,
+            media_count INTEGER DEFAULT 0,
+            sentiment_sum REAL DEFAULT 0,
+            data_version INTEGER DEFAULT 0,
+            FOREIGN KEY (hashtag_id) REFERENCES hashtags(id)
+        );
+        
+        CREATE TABLE IF NOT EXISTS hashtag_user_counts (
+            hashtag_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            tweet_count INTEGER DEFAULT 0,
+            retweet_count INTEGER DEFAULT 0,
+            reply_count INTEGER DEFAULT 0,
+            dirty INTEGER DEFAULT 1,
+            PRIMARY KEY (hashtag_id, user_id),
+            FOREIGN KEY (hashtag_id) REFERENCES hashtags(id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        ) WITHOUT ROWID;
+        
+        CREATE TABLE IF NOT EXISTS tweet_rollups (
+            hashtag_id INTEGER NOT NULL,
+            resolution TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            tweet_count INTEGER DEFAULT 0,
+            original_count INTEGER DEFAULT 0,
+            retweet_count INTEGER DEFAULT 0,
+            reply_count INTEGER DEFAULT 0,
+            media_count INTEGER DEFAULT 0,
+            positive_count INTEGER DEFAULT 0,
+            negative_count INTEGER DEFAULT 0,
+            sentiment_sum REAL DEFAULT 0,
+            users BLOB,
+            user_count INTEGER DEFAULT 0,
+            PRIMARY KEY (hashtag_id, resolution, bucket),
+            FOREIGN KEY (hashtag_id) REFERENCES hashtags(id)
+        ) WITHOUT ROWID;
+        
         CREATE INDEX IF NOT EXISTS idx_tweets_user_id ON tweets(user_id);
-        CREATE INDEX IF NOT EXISTS idx_tweets_created_at ON tweets(created_at);
         CREATE INDEX IF NOT EXISTS idx_users_location ON users(location);
-        CREATE INDEX IF NOT EXISTS idx_hashtag_stats_hashtag_id ON hashtag_stats(hashtag_id);
-        CREATE INDEX IF NOT EXISTS idx_hashtag_stats_timestamp ON hashtag_stats(timestamp);
         CREATE INDEX IF NOT EXISTS idx_locations_country_city ON locations(country, city);
         ''')
         self.conn.commit()
+        
+        # Later schema changes are versioned migrations
+        migrate(self.conn)
     
+    def _identity(self):
+        """
+        Name the database for caches kept outside of it.
+        
+        The name combines the resolved file path with the random id the
+        database got when it was created, so neither another database
+        file nor one recreated at the same path shares it.
+        
+        Returns:
+            str: Hex identity of the database
+        """
+        uuid = self._conn.execute("SELECT value FROM database_info WHERE key = 'uuid'").fetchone()[0]
+        path = self.db_path if self.db_path == ':memory:' else os.path.realpath(self.db_path)
+        return hashlib.sha1(f"{path}\n{uuid}".encode('utf-8')).hexdigest()[:16]
+    
+    @_writes
     def get_or_create_hashtag(self, hashtag_name):
         """Get a hashtag by name or create it if it doesn't exist."""
         self.cursor.execute(
@@ -128,16 +490,18 @@ class Database:
         
         return dict(hashtag)
     
+    @_writes
     def save_tweet(self, tweet_data, hashtag_id):
         """Save a tweet to the database."""
         try:
+            self._ensure_counters(hashtag_id)
             self.cursor.execute(
                 """
                 INSERT INTO tweets 
                 (id, hashtag_id, user_id, content, created_at, 
                 retweet_count, like_count, reply_count, 
-                is_retweet, is_reply, has_media, sentiment_score)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                is_retweet, is_reply, has_media, sentiment_score, created_epoch)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
                 (
                     tweet_data['id'],
@@ -151,286 +515,1066 @@ class Database:
                     tweet_data.get('is_retweet', False),
                     tweet_data.get('is_reply', False),
                     tweet_data.get('has_media', False),
-                    tweet_data.get('sentiment_score', 0)
+                    tweet_data.get('sentiment_score', 0),
+                    to_epoch(tweet_data['created_at'])
                 )
             )
+            self._add_to_counters(hashtag_id, [tweet_data])
             self.conn.commit()
             return True
         except sqlite3.IntegrityError:
             # Tweet already exists
+            self.conn.commit()
             return False
     
-    def save_user(self, user_data):
-        """Save a user to the database."""
-        try:
+    @_writes
+    def create_crawl_job(self, hashtag_id, search_type, target_count, since_id=None):
+        """
+        Start a crawl job for a hashtag.
+        
+        Unfinished jobs of the hashtag are abandoned, so the newest job
+        is the one a resume continues.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+            search_type (str): Type of search
+            target_count (int): Number of tweets to retrieve
+            since_id (str): High-water mark an incremental crawl stops at
+            
+        Returns:
+            dict: The new job
+        """
+        with self.conn:
             self.cursor.execute(
                 """
-                INSERT INTO users 
-                (id, username, display_name, profile_image_url, 
-                followers_count, following_count, tweet_count, 
-                location, account_created_at, is_verified)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                UPDATE crawl_jobs SET status = 'abandoned', updated_at = CURRENT_TIMESTAMP
+                WHERE hashtag_id = ? AND status IN ('running', 'failed')
                 """,
-                (
-                    user_data['id'],
-                    user_data['username'],
-                    user_data.get('display_name', ''),
-                    user_data.get('profile_image_url', ''),
-                    user_data.get('followers_count', 0),
-                    user_data.get('following_count', 0),
-                    user_data.get('tweet_count', 0),
-                    user_data.get('location', ''),
-                    user_data.get('account_created_at', ''),
-                    user_data.get('is_verified', False)
-                )
+                (hashtag_id,)
             )
-            self.conn.commit()
-            return True
-        except sqlite3.IntegrityError:
-            # User already exists, update instead
             self.cursor.execute(
                 """
-                UPDATE users SET
-                username = ?,
-                display_name = ?,
-                profile_image_url = ?,
-                followers_count = ?,
-                following_count = ?,
-                tweet_count = ?,
-                location = ?,
-                account_created_at = ?,
-                is_verified = ?
-                WHERE id = ?
+                INSERT INTO crawl_jobs (hashtag_id, search_type, target_count, since_id)
+                VALUES (?, ?, ?, ?)
                 """,
-                (
-                    user_data['username'],
-                    user_data.get('display_name', ''),
-                    user_data.get('profile_image_url', ''),
-                    user_data.get('followers_count', 0),
-                    user_data.get('following_count', 0),
-                    user_data.get('tweet_count', 0),
-                    user_data.get('location', ''),
-                    user_data.get('account_created_at', ''),
-                    user_data.get('is_verified', False),
-                    user_data['id']
-                )
+                (hashtag_id, search_type, target_count, since_id)
             )
-            self.conn.commit()
-            return True
+            job_id = self.cursor.lastrowid
+        return self.get_crawl_job(job_id)
     
-    def save_location(self, location_text, latitude=None, longitude=None, country=None, city=None):
-        """Save a location to the database."""
-        if not location_text:
-            return None
+    @_writes
+    def finish_crawl_job(self, job_id, status='completed', error=None, reached_known=False):
+        """
+        Record how a crawl job ended.
+        
+        A completed job also moves its hashtag's high-water mark, or
+        records the gap it left below its tweets, in the same transaction.
+        
+        Args:
+            job_id (int): Crawl job ID
+            status (str): 'completed' or 'failed'
+            error (str): Error that stopped the crawl
+            reached_known (bool): Whether paging stopped at tweets no newer than the job's since_id
             
-        try:
+        Returns:
+            dict: Gap the completed crawl left above the high-water mark, None if there is none
+        """
+        with self.conn:
             self.cursor.execute(
+                "UPDATE crawl_jobs SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (status, error, job_id)
+            )
+            if status == 'completed':
+                return self._record_crawl_coverage(job_id, reached_known)
+        return None
+    
+    @_reads
+    def get_crawl_job(self, job_id):
+        """Get a crawl job by ID."""
+        self.cursor.execute("SELECT * FROM crawl_jobs WHERE id = ?", (job_id,))
+        job = self.cursor.fetchone()
+        return dict(job) if job else None
+    
+    @_reads
+    def get_unfinished_crawl_job(self, hashtag_id):
+        """
+        Get the crawl job of a hashtag that a resume would continue.
+        
+        Jobs still marked running were interrupted without recording an
+        error, for example by a process restart.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+            
+        Returns:
+            dict: The newest running or failed job, None if there is none
+        """
+        self.cursor.execute(
+            """
+            SELECT * FROM crawl_jobs
+            WHERE hashtag_id = ? AND status IN ('running', 'failed')
+            ORDER BY id DESC
+            LIMIT 1
+            """,
+            (hashtag_id,)
+        )
+        job = self.cursor.fetchone()
+        return dict(job) if job else None
+    
+    @_reads
+    def get_unlocated_users(self, hashtag_id):
+        """
+        Get a hashtag's users with a location text but no linked location.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+            
+        Returns:
+            dict: User ID to user data with 'location'
+        """
+        self.cursor.execute(
+            """
+            SELECT u.id, u.location
+            FROM hashtag_user_counts c
+            JOIN users u ON u.id = c.user_id
+            WHERE c.hashtag_id = ? AND u.location != ''
+            AND NOT EXISTS (SELECT 1 FROM user_locations ul WHERE ul.user_id = u.id)
+            """,
+            (hashtag_id,)
+        )
+        return {row['id']: dict(row) for row in self.cursor.fetchall()}
+    
+    @_writes
+    def save_user(self, user_data, fingerprints=None):
+        """
+        Save a user to the database, skipping the write if the stored profile is the same.
+        
+        Args:
+            user_data (dict): User data
+            fingerprints (dict): Stored profiles by user ID, shared by the calls of a crawl
+            
+        Returns:
+            bool: True if the user was inserted or updated, False if unchanged
+        """
+        with self.conn:
+            written, profiles = self._save_users([_user_row(user_data)], fingerprints)
+        if fingerprints is not None:
+            fingerprints.update(profiles)
+        return bool(written)
+    
+    @_writes
+    def save_page(self, tweets, users, hashtag_id, job_id=None, cursor=None, fingerprints=None):
+        """
+        Save a page of search results in a single transaction.
+        
+        Tweets are inserted with one executemany call, ignoring tweets that
+        are already stored, and new or changed users are upserted the same
+        way, so a page costs one commit instead of one per row. The
+        hashtag's running counters, and the progress of the crawl job the
+        page belongs to, are updated in the same transaction.
+        
+        Args:
+            tweets (list): List of tweet dictionaries
+            users (dict or list): User dictionaries, keyed by user ID or as a list
+            hashtag_id (int): Database ID of the hashtag
+            job_id (int): Crawl job that fetched the page
+            cursor (str): Cursor of the page after this one, '' if it was the last
+            fingerprints (dict): Stored profiles by user ID, shared by the pages of a crawl,
+                updated once the page is committed
+            
+        Returns:
+            dict: Number of inserted and duplicate tweets, of users on the
+                page and of users written because they were new or changed
+        """
+        if isinstance(users, dict):
+            users = list(users.values())
+        
+        tweet_rows = [
+            (
+                tweet['id'],
+                hashtag_id,
+                tweet['user_id'],
+                tweet['content'],
+                tweet['created_at'],
+                tweet.get('retweet_count', 0),
+                tweet.get('like_count', 0),
+                tweet.get('reply_count', 0),
+                tweet.get('is_retweet', False),
+                tweet.get('is_reply', False),
+                tweet.get('has_media', False),
+                tweet.get('sentiment_score', 0),
+                to_epoch(tweet['created_at'])
+            )
+            for tweet in tweets
+        ]
+        user_rows = [_user_row(user) for user in users]
+        
+        with self.conn:
+            self._ensure_counters(hashtag_id)
+            new_tweets = self._new_tweets(tweets)
+            
+            changes_before = self.conn.total_changes
+            self.cursor.executemany(
                 """
-                INSERT INTO locations 
-                (location_text, latitude, longitude, country, city, is_geocoded)
-                VALUES (?, ?, ?, ?, ?, ?)
+                INSERT OR IGNORE INTO tweets
+                (id, hashtag_id, user_id, content, created_at,
+                retweet_count, like_count, reply_count,
+                is_retweet, is_reply, has_media, sentiment_score, created_epoch)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
-                (
-                    location_text,
-                    latitude,
-                    longitude,
-                    country,
-                    city,
-                    bool(latitude and longitude)
-                )
-            )
-            self.conn.commit()
-            return self.cursor.lastrowid
-        except sqlite3.IntegrityError:
-            # Location already exists, get its ID
-            self.cursor.execute(
-                "SELECT id FROM locations WHERE location_text = ?",
-                (location_text,)
+                tweet_rows
             )
-            location = self.cursor.fetchone()
+            inserted = self.conn.total_changes - changes_before
+            self._add_to_counters(hashtag_id, new_tweets)
+            
+            users_written, profiles = self._save_users(user_rows, fingerprints)
             
-            # If coordinates are provided, update them
-            if latitude and longitude and location:
+            if job_id is not None:
+                newest, oldest = self._crawl_job_range(job_id, tweets)
                 self.cursor.execute(
                     """
-                    UPDATE locations SET
-                    latitude = ?,
-                    longitude = ?,
-                    country = ?,
-                    city = ?,
-                    is_geocoded = TRUE
+                    UPDATE crawl_jobs SET
+                    last_cursor = ?,
+                    fetched_count = fetched_count + ?,
+                    newest_tweet_id = ?,
+                    newest_tweet_at = ?,
+                    oldest_tweet_id = ?,
+                    updated_at = CURRENT_TIMESTAMP
                     WHERE id = ?
                     """,
-                    (latitude, longitude, country, city, location['id'])
+                    (cursor or '', len(tweets), newest[0], newest[1], oldest, job_id)
                 )
-                self.conn.commit()
-                
-            return location['id'] if location else None
+        
+        # A page that rolled back is compared against the database again when retried
+        if fingerprints is not None:
+            fingerprints.update(profiles)
+        
+        return {
+            'inserted': inserted,
+            'duplicates': len(tweet_rows) - inserted,
+            'users': len(user_rows),
+            'users_written': users_written
+        }
     
-    def link_user_location(self, user_id, location_id):
-        """Link a user to a location."""
-        if not user_id or not location_id:
-            return False
+    def _save_users(self, user_rows, fingerprints=None):
+        """
+        Upsert the users whose profile is new or differs from the stored one.
+        
+        Profiles are compared field by field with the stored ones. Users
+        missing from the map of stored profiles are looked up in the
+        database first, so only new and changed users are written, and
+        only their per-hashtag counts are marked for a top contributor
+        refresh. The map itself is left alone, since the transaction may
+        still roll back; callers add the returned profiles after commit.
+        
+        Args:
+            user_rows (list): Rows built by _user_row
+            fingerprints (dict): Stored profiles by user ID
             
-        try:
+        Returns:
+            tuple: Number of users written, and the stored profiles by user
+                ID that were read or written
+        """
+        fingerprints = fingerprints if fingerprints is not None else {}
+        profiles = {}
+        
+        unknown = list({row[0] for row in user_rows if row[0] not in fingerprints})
+        for start in range(0, len(unknown), 500):
+            chunk = unknown[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
             self.cursor.execute(
-                """
-                INSERT INTO user_locations 
-                (user_id, location_id)
-                VALUES (?, ?)
+                f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE id IN ({placeholders})",
+                chunk
+            )
+            for row in self.cursor.fetchall():
+                profiles[row['id']] = _user_profile(row)
+        
+        changed_rows = []
+        for row in user_rows:
+            profile = _user_profile(row)
+            stored = profiles[row[0]] if row[0] in profiles else fingerprints.get(row[0])
+            if stored != profile:
+                profiles[row[0]] = profile
+                changed_rows.append(row)
+        
+        self.cursor.executemany(
+            f"""
+            INSERT INTO users
+            ({', '.join(USER_COLUMNS)})
+            VALUES ({', '.join('?' * len(USER_COLUMNS))})
+            ON CONFLICT(id) DO UPDATE SET
+            {', '.join(f"{column} = excluded.{column}" for column in USER_COLUMNS[1:])}
+            """,
+            changed_rows
+        )
+        
+        # Follower counts feed the influence score, refresh these users' rows; names,
+        # images and follower counts are shown with top contributors, so results
+        # cached for the hashtags they tweeted in are stale
+        user_ids = [row[0] for row in changed_rows]
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            self.cursor.execute(
+                f"UPDATE hashtag_user_counts SET dirty = 1 WHERE dirty = 0 AND user_id IN ({placeholders})",
+                chunk
+            )
+            self.cursor.execute(
+                f"""
+                UPDATE hashtag_counters SET data_version = data_version + 1
+                WHERE hashtag_id IN (SELECT hashtag_id FROM hashtag_user_counts WHERE user_id IN ({placeholders}))
                 """,
-                (user_id, location_id)
+                chunk
             )
-            self.conn.commit()
-            return True
-        except sqlite3.IntegrityError:
-            # Relationship already exists
-            return False
+        
+        return len(changed_rows), profiles
     
-    def update_hashtag_stats(self, hashtag_id):
-        """Update statistics for a hashtag."""
-        # Get total tweets
-        self.cursor.execute(
-            "SELECT COUNT(*) as count FROM tweets WHERE hashtag_id = ?",
-            (hashtag_id,)
-        )
-        total_tweets = self.cursor.fetchone()['count']
+    def _new_tweets(self, tweets):
+        """
+        Find the tweets of a batch that are not stored yet.
+        
+        Args:
+            tweets (list): List of tweet dictionaries
+            
+        Returns:
+            list: Tweets whose ID is not in the database, first occurrence of each ID
+        """
+        ids = list({tweet['id'] for tweet in tweets})
+        stored = set()
+        
+        # Stay well below SQLite's limit on bound parameters
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            self.cursor.execute(f"SELECT id FROM tweets WHERE id IN ({placeholders})", chunk)
+            stored.update(row['id'] for row in self.cursor.fetchall())
         
-        # Get total contributors
+        new_tweets = []
+        for tweet in tweets:
+            if tweet['id'] not in stored:
+                stored.add(tweet['id'])
+                new_tweets.append(tweet)
+        return new_tweets
+    
+    def _crawl_job_range(self, job_id, tweets):
+        """
+        Widen the range of tweet IDs a crawl job has seen with a page's tweets.
+        
+        Args:
+            job_id (int): Crawl job ID
+            tweets (list): Tweets of the page, stored before or not
+            
+        Returns:
+            tuple: (newest ID, its created_at) and the oldest ID seen by the job
+        """
         self.cursor.execute(
-            "SELECT COUNT(DISTINCT user_id) as count FROM tweets WHERE hashtag_id = ?",
-            (hashtag_id,)
+            "SELECT newest_tweet_id, newest_tweet_at, oldest_tweet_id FROM crawl_jobs WHERE id = ?",
+            (job_id,)
         )
-        total_contributors = self.cursor.fetchone()['count']
+        job = self.cursor.fetchone()
+        newest = (job['newest_tweet_id'], job['newest_tweet_at']) if job else (None, None)
+        oldest = job['oldest_tweet_id'] if job else None
+        for tweet in tweets:
+            key = tweet_id_key(tweet['id'])
+            if newest[0] is None or key > tweet_id_key(newest[0]):
+                newest = (str(tweet['id']), tweet['created_at'])
+            if oldest is None or key < tweet_id_key(oldest):
+                oldest = str(tweet['id'])
+        return newest, oldest
+    
+    def _record_crawl_coverage(self, job_id, reached_known):
+        """
+        Advance a hashtag's high-water mark after a completed crawl, or record the gap it left.
+        
+        The mark promises that incremental crawls may stop at it, so it
+        only moves when every tweet between it and the crawl's newest
+        tweet was fetched: the crawl was a Latest search, which pages
+        from newest to oldest, and it reached tweets no newer than the
+        mark. A crawl that ran out of tweets to fetch before that leaves
+        the mark where it was and records the unfetched range instead.
         
-        # Get average sentiment score
+        Args:
+            job_id (int): Completed crawl job
+            reached_known (bool): Whether paging stopped at tweets no newer than the job's since_id
+            
+        Returns:
+            dict: The recorded gap, None if the crawl left none
+        """
         self.cursor.execute(
-            "SELECT AVG(sentiment_score) as avg_score FROM tweets WHERE hashtag_id = ?",
-            (hashtag_id,)
+            """
+            SELECT c.hashtag_id, c.search_type, c.newest_tweet_id, c.newest_tweet_at, c.oldest_tweet_id,
+                h.newest_tweet_id AS mark
+            FROM crawl_jobs c
+            JOIN hashtags h ON h.id = c.hashtag_id
+            WHERE c.id = ?
+            """,
+            (job_id,)
         )
-        sentiment_score = self.cursor.fetchone()['avg_score'] or 0
+        job = self.cursor.fetchone()
+        if job is None or job['search_type'] != 'Latest' or job['newest_tweet_id'] is None:
+            return None
         
-        # Update hashtag record
+        mark = job['mark']
+        if mark is not None and tweet_id_key(job['newest_tweet_id']) <= tweet_id_key(mark):
+            return None
+        
+        if mark is None or reached_known or tweet_id_key(job['oldest_tweet_id']) <= tweet_id_key(mark):
+            self.cursor.execute(
+                "UPDATE hashtags SET newest_tweet_id = ?, newest_tweet_at = ? WHERE id = ?",
+                (job['newest_tweet_id'], job['newest_tweet_at'], job['hashtag_id'])
+            )
+            # Every gap lay between the old mark and tweets this crawl came down from
+            self.cursor.execute("DELETE FROM crawl_gaps WHERE hashtag_id = ?", (job['hashtag_id'],))
+            return None
+        
+        gap = {
+            'hashtag_id': job['hashtag_id'],
+            'job_id': job_id,
+            'after_tweet_id': mark,
+            'before_tweet_id': job['oldest_tweet_id']
+        }
         self.cursor.execute(
             """
-            UPDATE hashtags SET
-            total_tweets = ?,
-            total_contributors = ?,
-            sentiment_score = ?,
-            updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
+            INSERT INTO crawl_gaps (hashtag_id, job_id, after_tweet_id, before_tweet_id)
+            VALUES (:hashtag_id, :job_id, :after_tweet_id, :before_tweet_id)
             """,
-            (total_tweets, total_contributors, sentiment_score, hashtag_id)
+            gap
         )
-        self.conn.commit()
+        return gap
+    
+    @_reads
+    def get_crawl_gaps(self, hashtag_id):
+        """
+        Get the ranges of tweets crawls of a hashtag skipped above its high-water mark.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+            
+        Returns:
+            list: Gaps, oldest first, each between an 'after_tweet_id' and a
+                'before_tweet_id' that are both stored
+        """
+        self.cursor.execute("SELECT * FROM crawl_gaps WHERE hashtag_id = ? ORDER BY id", (hashtag_id,))
+        return [dict(row) for row in self.cursor.fetchall()]
+    
+    def _ensure_counters(self, hashtag_id):
+        """Backfill a hashtag's running counters and rollups from its tweets if it has none yet."""
+        self.cursor.execute("SELECT tweet_count FROM hashtag_counters WHERE hashtag_id = ?", (hashtag_id,))
+        counters = self.cursor.fetchone()
+        if counters is None:
+            self._rebuild_counters(hashtag_id)
+            return
+        
+        if counters['tweet_count']:
+            self.cursor.execute("SELECT 1 FROM tweet_rollups WHERE hashtag_id = ? LIMIT 1", (hashtag_id,))
+            if self.cursor.fetchone() is None:
+                self._rebuild_rollups(hashtag_id)
+    
+    def _add_to_counters(self, hashtag_id, tweets):
+        """
+        Add newly stored tweets to a hashtag's running counters.
+        
+        Runs inside the caller's transaction so counters and tweets
+        are committed together, along with a bump of the hashtag's
+        data version. Users whose counts change are marked dirty for
+        update_top_contributors.
         
-        # Create a new stats record
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+            tweets (list): Tweets that were just inserted
+        """
+        if not tweets:
+            return
         
-        # Get retweet count
+        per_user = {}
+        retweets = replies = media = 0
+        sentiment_sum = 0.0
+        for tweet in tweets:
+            is_retweet = 1 if tweet.get('is_retweet') else 0
+            is_reply = 1 if tweet.get('is_reply') else 0
+            counts = per_user.setdefault(tweet['user_id'], [0, 0, 0])
+            counts[0] += 1
+            counts[1] += is_retweet
+            counts[2] += is_reply
+            retweets += is_retweet
+            replies += is_reply
+            media += 1 if tweet.get('has_media') else 0
+            sentiment_sum += tweet.get('sentiment_score', 0) or 0
+        
+        user_ids = list(per_user)
+        known = set()
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            self.cursor.execute(
+                f"SELECT user_id FROM hashtag_user_counts WHERE hashtag_id = ? AND user_id IN ({placeholders})",
+                [hashtag_id] + chunk
+            )
+            known.update(row['user_id'] for row in self.cursor.fetchall())
+        new_users = [user_id for user_id in user_ids if user_id not in known]
+        
+        self.cursor.executemany(
+            """
+            INSERT INTO hashtag_user_counts (hashtag_id, user_id, tweet_count, retweet_count, reply_count, dirty)
+            VALUES (?, ?, ?, ?, ?, 1)
+            ON CONFLICT(hashtag_id, user_id) DO UPDATE SET
+            tweet_count = tweet_count + excluded.tweet_count,
+            retweet_count = retweet_count + excluded.retweet_count,
+            reply_count = reply_count + excluded.reply_count,
+            dirty = 1
+            """,
+            [(hashtag_id, user_id) + tuple(counts) for user_id, counts in per_user.items()]
+        )
         self.cursor.execute(
-            "SELECT COUNT(*) as count FROM tweets WHERE hashtag_id = ? AND is_retweet = TRUE",
-            (hashtag_id,)
+            """
+            UPDATE hashtag_counters SET
+            tweet_count = tweet_count + ?,
+            contributor_count = contributor_count + ?,
+            retweet_count = retweet_count + ?,
+            reply_count = reply_count + ?,
+            media_count = media_count + ?,
+            sentiment_sum = sentiment_sum + ?,
+            data_version = data_version + 1
+            WHERE hashtag_id = ?
+            """,
+            (len(tweets), len(new_users), retweets, replies, media, sentiment_sum, hashtag_id)
+        )
+        # Users new to the hashtag bring the locations they are already linked to
+        self.cursor.executemany(
+            """
+            INSERT INTO hashtag_locations (hashtag_id, location_id, user_count)
+            SELECT ?, location_id, 1 FROM user_locations WHERE user_id = ?
+            ON CONFLICT(hashtag_id, location_id) DO UPDATE SET user_count = user_count + 1
+            """,
+            [(hashtag_id, user_id) for user_id in new_users]
         )
-        retweet_count = self.cursor.fetchone()['count']
+        self._add_to_rollups(hashtag_id, tweets)
+    
+    def _add_to_rollups(self, hashtag_id, tweets):
+        """
+        Add newly stored tweets to a hashtag's minute, hour and day rollups.
         
-        # Get reply count
-        self.cursor.execute(
-            "SELECT COUNT(*) as count FROM tweets WHERE hashtag_id = ? AND is_reply = TRUE",
-            (hashtag_id,)
+        Each bucket keeps type counts, a sentiment sum, a HyperLogLog
+        sketch of its users and the sketch's distinct user estimate. The
+        new users are added to the stored sketch, which is only written
+        back, and counted again, when one of them changed it.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+            tweets (list): Tweets that were just inserted
+        """
+        buckets = {}
+        for tweet in tweets:
+            created_epoch = tweet.get('created_epoch')
+            if created_epoch is None:
+                created_epoch = to_epoch(tweet.get('created_at'))
+                if created_epoch is None:
+                    # Only counted once its time is known
+                    continue
+            is_retweet = 1 if tweet.get('is_retweet') else 0
+            is_reply = 1 if tweet.get('is_reply') else 0
+            score = tweet.get('sentiment_score', 0) or 0
+            for resolution, bucket in _time_buckets(created_epoch).items():
+                totals = buckets.get((resolution, bucket))
+                if totals is None:
+                    totals = buckets[(resolution, bucket)] = [0, 0, 0, 0, 0, 0, 0, 0.0, set()]
+                totals[0] += 1
+                totals[1] += 1 if not is_retweet and not is_reply else 0
+                totals[2] += is_retweet
+                totals[3] += is_reply
+                totals[4] += 1 if tweet.get('has_media') else 0
+                totals[5] += 1 if score > POSITIVE_THRESHOLD else 0
+                totals[6] += 1 if score < NEGATIVE_THRESHOLD else 0
+                totals[7] += score
+                totals[8].add(tweet['user_id'])
+        
+        stored = {}
+        for resolution in ROLLUP_RESOLUTIONS:
+            keys = [bucket for bucket_resolution, bucket in buckets if bucket_resolution == resolution]
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ', '.join('?' * len(chunk))
+                self.cursor.execute(
+                    f"""
+                    SELECT bucket, users FROM tweet_rollups
+                    WHERE hashtag_id = ? AND resolution = ? AND bucket IN ({placeholders})
+                    """,
+                    [hashtag_id, resolution] + chunk
+                )
+                for row in self.cursor.fetchall():
+                    if row['users'] is not None:
+                        stored[(resolution, row['bucket'])] = row['users']
+        
+        # Each user is hashed once, not once per bucket
+        hashes = {}
+        rows = []
+        for (resolution, bucket), totals in buckets.items():
+            data = stored.get((resolution, bucket))
+            sketch = HyperLogLog.from_bytes(data) if data else HyperLogLog(ROLLUP_PRECISIONS[resolution])
+            changed = data is None
+            for user_id in totals[8]:
+                hashed = hashes.get(user_id)
+                if hashed is None:
+                    hashed = hashes[user_id] = hash_value(user_id)
+                changed = sketch.add_hash(hashed) or changed
+            # An unchanged sketch keeps its stored bytes and estimate
+            sketch_columns = (None, None)
+            if changed:
+                # A new bucket's estimate can't exceed its tweets, stored ones are capped on update
+                user_count = sketch.count() if data else min(sketch.count(), totals[0])
+                sketch_columns = (sketch.to_bytes(), user_count)
+            rows.append((hashtag_id, resolution, bucket) + tuple(totals[:8]) + sketch_columns)
+        
+        self.cursor.executemany(
+            """
+            INSERT INTO tweet_rollups
+            (hashtag_id, resolution, bucket, tweet_count, original_count, retweet_count, reply_count,
+            media_count, positive_count, negative_count, sentiment_sum, users, user_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(hashtag_id, resolution, bucket) DO UPDATE SET
+            tweet_count = tweet_count + excluded.tweet_count,
+            original_count = original_count + excluded.original_count,
+            retweet_count = retweet_count + excluded.retweet_count,
+            reply_count = reply_count + excluded.reply_count,
+            media_count = media_count + excluded.media_count,
+            positive_count = positive_count + excluded.positive_count,
+            negative_count = negative_count + excluded.negative_count,
+            sentiment_sum = sentiment_sum + excluded.sentiment_sum,
+            users = COALESCE(excluded.users, users),
+            user_count = MIN(COALESCE(excluded.user_count, user_count), tweet_count + excluded.tweet_count)
+            """,
+            rows
         )
-        reply_count = self.cursor.fetchone()['count']
+    
+    def _rebuild_counters(self, hashtag_id=None):
+        """Recompute running counters from the tweets table, for one hashtag or all of them."""
+        where = "WHERE hashtag_id = ?" if hashtag_id is not None else ""
+        params = (hashtag_id,) if hashtag_id is not None else ()
+        
+        # Rebuilt data gets a new version, results cached for the old one never match again
+        self.cursor.execute(f"SELECT hashtag_id, data_version FROM hashtag_counters {where}", params)
+        versions = [(row['data_version'] + 1, row['hashtag_id']) for row in self.cursor.fetchall()]
         
-        # Get media count
+        self.cursor.execute(f"DELETE FROM hashtag_user_counts {where}", params)
+        self.cursor.execute(f"DELETE FROM hashtag_counters {where}", params)
+        # Rebuilt counts are all dirty, so the next refresh recomputes the whole table
+        self.cursor.execute(f"DELETE FROM top_contributors {where}", params)
         self.cursor.execute(
-            "SELECT COUNT(*) as count FROM tweets WHERE hashtag_id = ? AND has_media = TRUE",
-            (hashtag_id,)
+            f"""
+            INSERT INTO hashtag_user_counts (hashtag_id, user_id, tweet_count, retweet_count, reply_count)
+            SELECT hashtag_id, user_id,
+                COUNT(*),
+                SUM(CASE WHEN is_retweet = TRUE THEN 1 ELSE 0 END),
+                SUM(CASE WHEN is_reply = TRUE THEN 1 ELSE 0 END)
+            FROM tweets
+            {where}
+            GROUP BY hashtag_id, user_id
+            """,
+            params
         )
-        media_count = self.cursor.fetchone()['count']
-        
         self.cursor.execute(
-            """
-            INSERT INTO hashtag_stats
-            (hashtag_id, timestamp, tweet_count, contributor_count, 
-            retweet_count, reply_count, media_count, sentiment_score)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            f"""
+            INSERT INTO hashtag_counters
+            (hashtag_id, tweet_count, contributor_count, retweet_count, reply_count, media_count, sentiment_sum)
+            SELECT hashtag_id,
+                COUNT(*),
+                -- Contributors were just regrouped above, counting them avoids a DISTINCT sort
+                (SELECT COUNT(*) FROM hashtag_user_counts c WHERE c.hashtag_id = tweets.hashtag_id),
+                SUM(CASE WHEN is_retweet = TRUE THEN 1 ELSE 0 END),
+                SUM(CASE WHEN is_reply = TRUE THEN 1 ELSE 0 END),
+                SUM(CASE WHEN has_media = TRUE THEN 1 ELSE 0 END),
+                TOTAL(sentiment_score)
+            FROM tweets
+            {where}
+            GROUP BY hashtag_id
             """,
-            (
-                hashtag_id,
-                current_time,
-                total_tweets,
-                total_contributors,
-                retweet_count,
-                reply_count,
-                media_count,
-                sentiment_score
-            )
+            params
         )
-        self.conn.commit()
+        # Hashtags without tweets still get a row of zeros
+        if hashtag_id is not None:
+            self.cursor.execute("INSERT OR IGNORE INTO hashtag_counters (hashtag_id) VALUES (?)", params)
+        else:
+            self.cursor.execute("INSERT OR IGNORE INTO hashtag_counters (hashtag_id) SELECT id FROM hashtags")
+        self.cursor.executemany("UPDATE hashtag_counters SET data_version = ? WHERE hashtag_id = ?", versions)
+        
+        self._rebuild_locations(hashtag_id)
+        self._rebuild_rollups(hashtag_id)
     
-    def update_top_contributors(self, hashtag_id):
-        """Update top contributors for a hashtag."""
-        # Clear existing top contributors
+    def _rebuild_locations(self, hashtag_id=None):
+        """Recompute per-location user counts from the regrouped user counts."""
+        where = "WHERE hashtag_id = ?" if hashtag_id is not None else ""
+        params = (hashtag_id,) if hashtag_id is not None else ()
+        
+        self.cursor.execute(f"DELETE FROM hashtag_locations {where}", params)
+        # Counting one row per (user, location) link avoids sorting by location;
+        # the WHERE clause keeps SQLite from reading ON CONFLICT as a join constraint
         self.cursor.execute(
-            "DELETE FROM top_contributors WHERE hashtag_id = ?",
-            (hashtag_id,)
+            f"""
+            INSERT INTO hashtag_locations (hashtag_id, location_id, user_count)
+            SELECT c.hashtag_id, ul.location_id, 1
+            FROM hashtag_user_counts c
+            JOIN user_locations ul ON ul.user_id = c.user_id
+            WHERE {"c.hashtag_id = ?" if hashtag_id is not None else "true"}
+            ON CONFLICT(hashtag_id, location_id) DO UPDATE SET user_count = user_count + 1
+            """,
+            params
         )
+    
+    def _rebuild_rollups(self, hashtag_id=None):
+        """Recompute time bucket rollups from the tweets table, for one hashtag or all of them."""
+        where = "WHERE hashtag_id = ?" if hashtag_id is not None else ""
+        params = (hashtag_id,) if hashtag_id is not None else ()
         
-        # Get top contributors by tweet count
-        self.cursor.execute(
-            """
-            SELECT user_id, 
-                COUNT(*) as tweet_count,
-                SUM(CASE WHEN is_retweet = TRUE THEN 1 ELSE 0 END) as retweet_count,
-                SUM(CASE WHEN is_reply = TRUE THEN 1 ELSE 0 END) as reply_count
-            FROM tweets 
-            WHERE hashtag_id = ?
-            GROUP BY user_id
-            ORDER BY tweet_count DESC
-            LIMIT 50
+        self.cursor.execute(f"DELETE FROM tweet_rollups {where}", params)
+        
+        # A separate cursor streams the tweets while self.cursor writes the rollups
+        rows = self.conn.execute(
+            f"""
+            SELECT hashtag_id, user_id, created_at, created_epoch, is_retweet, is_reply, has_media, sentiment_score
+            FROM tweets
+            {where}
             """,
-            (hashtag_id,)
+            params
         )
+        while True:
+            batch = rows.fetchmany(5000)
+            if not batch:
+                break
+            by_hashtag = {}
+            for row in batch:
+                by_hashtag.setdefault(row['hashtag_id'], []).append(dict(row))
+            for batch_hashtag_id, tweets in by_hashtag.items():
+                self._add_to_rollups(batch_hashtag_id, tweets)
+    
+    @_writes
+    def rebuild_hashtag_counters(self, hashtag_id=None):
+        """
+        Recompute running counters from the stored tweets.
+        
+        Time bucket rollups are rebuilt as well. Only needed when tweets
+        were written without going through save_page or save_tweet, or
+        to repair drifted counters.
         
-        contributors = self.cursor.fetchall()
+        Args:
+            hashtag_id (int): Database ID of the hashtag, None for every hashtag
+        """
+        with self.conn:
+            self._rebuild_counters(hashtag_id)
+    
+    @_reads
+    def get_cached_sentiments(self, content_hashes):
+        """
+        Look up cached sentiment scores.
+        
+        Args:
+            content_hashes (list): Normalized content hashes
+            
+        Returns:
+            dict: Mapping of content hash to score for the hashes that are cached
+        """
+        scores = {}
+        content_hashes = list(content_hashes)
         
-        for contributor in contributors:
-            # Calculate influence score based on followers and engagement
+        # Stay well below SQLite's limit on bound parameters
+        for start in range(0, len(content_hashes), 500):
+            chunk = content_hashes[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
             self.cursor.execute(
-                "SELECT followers_count FROM users WHERE id = ?",
-                (contributor['user_id'],)
+                f"SELECT content_hash, score FROM sentiment_cache WHERE content_hash IN ({placeholders})",
+                chunk
             )
-            user = self.cursor.fetchone()
-            followers_count = user['followers_count'] if user else 0
-            
-            # Simple influence score formula
-            influence_score = (
-                contributor['tweet_count'] * 1 + 
-                contributor['retweet_count'] * 0.5 + 
-                contributor['reply_count'] * 0.7 + 
-                (followers_count / 1000)
+            scores.update((row['content_hash'], row['score']) for row in self.cursor.fetchall())
+        
+        return scores
+    
+    @_writes
+    def save_cached_sentiments(self, scores):
+        """
+        Store sentiment scores in the persistent cache.
+        
+        Args:
+            scores (dict): Mapping of normalized content hash to score
+        """
+        if not scores:
+            return
+        
+        with self.conn:
+            self.cursor.executemany(
+                "INSERT OR REPLACE INTO sentiment_cache (content_hash, score) VALUES (?, ?)",
+                scores.items()
             )
+    
+    @_writes
+    def save_location(self, location_text, latitude=None, longitude=None, country=None, city=None):
+        """Save a location to the database."""
+        if not location_text:
+            return None
             
+        try:
             self.cursor.execute(
                 """
-                INSERT INTO top_contributors
-                (hashtag_id, user_id, tweet_count, retweet_count, reply_count, influence_score)
+                INSERT INTO locations 
+                (location_text, latitude, longitude, country, city, is_geocoded)
                 VALUES (?, ?, ?, ?, ?, ?)
                 """,
+                (
+                    location_text,
+                    latitude,
+                    longitude,
+                    country,
+                    city,
+                    bool(latitude and longitude)
+                )
+            )
+            self.conn.commit()
+            return self.cursor.lastrowid
+        except sqlite3.IntegrityError:
+            # Location already exists, get its ID
+            self.cursor.execute(
+                "SELECT id, latitude, longitude, country, city FROM locations WHERE location_text = ?",
+                (location_text,)
+            )
+            location = self.cursor.fetchone()
+            if location is None:
+                return None
+            
+            # If coordinates are provided and differ, update them
+            changed = tuple(location)[1:] != (latitude, longitude, country, city)
+            if latitude and longitude and changed:
+                with self.conn:
+                    self.cursor.execute(
+                        """
+                        UPDATE locations SET
+                        latitude = ?,
+                        longitude = ?,
+                        country = ?,
+                        city = ?,
+                        is_geocoded = TRUE
+                        WHERE id = ?
+                        """,
+                        (latitude, longitude, country, city, location['id'])
+                    )
+                    # Results cached for hashtags with users there show the old place
+                    self.cursor.execute(
+                        """
+                        UPDATE hashtag_counters SET data_version = data_version + 1
+                        WHERE hashtag_id IN (SELECT hashtag_id FROM hashtag_locations WHERE location_id = ?)
+                        """,
+                        (location['id'],)
+                    )
+            
+            return location['id']
+    
+    @_writes
+    def link_user_location(self, user_id, location_id):
+        """Link a user to a location and count them there for every hashtag they tweeted in."""
+        if not user_id or not location_id:
+            return False
+            
+        try:
+            with self.conn:
+                self.cursor.execute(
+                    """
+                    INSERT INTO user_locations 
+                    (user_id, location_id)
+                    VALUES (?, ?)
+                    """,
+                    (user_id, location_id)
+                )
+                self.cursor.execute(
+                    """
+                    INSERT INTO hashtag_locations (hashtag_id, location_id, user_count)
+                    SELECT hashtag_id, ?, 1 FROM hashtag_user_counts WHERE user_id = ?
+                    ON CONFLICT(hashtag_id, location_id) DO UPDATE SET user_count = user_count + 1
+                    """,
+                    (location_id, user_id)
+                )
+                self.cursor.execute(
+                    """
+                    UPDATE hashtag_counters SET data_version = data_version + 1
+                    WHERE hashtag_id IN (SELECT hashtag_id FROM hashtag_user_counts WHERE user_id = ?)
+                    """,
+                    (user_id,)
+                )
+            return True
+        except sqlite3.IntegrityError:
+            # Relationship already exists
+            return False
+    
+    @_writes
+    def update_hashtag_stats(self, hashtag_id):
+        """
+        Update statistics for a hashtag.
+        
+        Totals come from the running counters kept by save_page, so the
+        cost doesn't grow with the number of stored tweets.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+        """
+        with self.conn:
+            self._ensure_counters(hashtag_id)
+            self.cursor.execute("SELECT * FROM hashtag_counters WHERE hashtag_id = ?", (hashtag_id,))
+            counters = self.cursor.fetchone()
+            
+            total_tweets = counters['tweet_count']
+            total_contributors = counters['contributor_count']
+            sentiment_score = counters['sentiment_sum'] / total_tweets if total_tweets else 0
+            
+            # Summaries show these totals, so changing them is a new data version
+            self.cursor.execute(
+                "SELECT total_tweets, total_contributors, sentiment_score FROM hashtags WHERE id = ?",
+                (hashtag_id,)
+            )
+            previous = self.cursor.fetchone()
+            if previous is None or tuple(previous) != (total_tweets, total_contributors, sentiment_score):
+                self._bump_data_version(hashtag_id)
+            
+            # Update hashtag record
+            self.cursor.execute(
+                """
+                UPDATE hashtags SET
+                total_tweets = ?,
+                total_contributors = ?,
+                sentiment_score = ?,
+                updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                """,
+                (total_tweets, total_contributors, sentiment_score, hashtag_id)
+            )
+            
+            # Create a new stats record
+            current_time = datetime.now()
+            
+            self.cursor.execute(
+                """
+                INSERT INTO hashtag_stats
+                (hashtag_id, timestamp, tweet_count, contributor_count, 
+                retweet_count, reply_count, media_count, sentiment_score, timestamp_epoch)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
                 (
                     hashtag_id,
-                    contributor['user_id'],
-                    contributor['tweet_count'],
-                    contributor['retweet_count'],
-                    contributor['reply_count'],
-                    influence_score
+                    current_time.strftime(TIMESTAMP_FORMAT),
+                    total_tweets,
+                    total_contributors,
+                    counters['retweet_count'],
+                    counters['reply_count'],
+                    counters['media_count'],
+                    sentiment_score,
+                    to_epoch(current_time)
                 )
             )
+    
+    @_writes
+    def update_top_contributors(self, hashtag_id):
+        """
+        Update top contributors for a hashtag.
         
-        self.conn.commit()
+        Counts only grow, so the 50 users with the most tweets are always
+        among the current top rows and the users marked dirty since the
+        last refresh. Only the dirty users are rescored, in one statement
+        joined with their follower counts, and rows that fell out of the
+        top 50 are dropped. The data version changes only if the top rows
+        did.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+        """
+        with self.conn:
+            self._ensure_counters(hashtag_id)
+            before = self._top_contributor_rows(hashtag_id)
+            
+            self.cursor.execute(
+                """
+                INSERT INTO top_contributors
+                (hashtag_id, user_id, tweet_count, retweet_count, reply_count, influence_score)
+                SELECT c.hashtag_id, c.user_id, c.tweet_count, c.retweet_count, c.reply_count,
+                    c.tweet_count * 1 +
+                    c.retweet_count * 0.5 +
+                    c.reply_count * 0.7 +
+                    COALESCE(u.followers_count, 0) / 1000.0
+                FROM hashtag_user_counts c
+                LEFT JOIN users u ON u.id = c.user_id
+                WHERE c.hashtag_id = ? AND c.dirty = 1
+                ON CONFLICT(hashtag_id, user_id) DO UPDATE SET
+                tweet_count = excluded.tweet_count,
+                retweet_count = excluded.retweet_count,
+                reply_count = excluded.reply_count,
+                influence_score = excluded.influence_score
+                """,
+                (hashtag_id,)
+            )
+            
+            self.cursor.execute(
+                """
+                DELETE FROM top_contributors
+                WHERE hashtag_id = ? AND user_id NOT IN (
+                    SELECT user_id FROM top_contributors
+                    WHERE hashtag_id = ?
+                    ORDER BY tweet_count DESC, user_id
+                    LIMIT 50
+                )
+                """,
+                (hashtag_id, hashtag_id)
+            )
+            
+            # Dirty users outside the top 50 are inserted and dropped again, compare the result
+            if self._top_contributor_rows(hashtag_id) != before:
+                self._bump_data_version(hashtag_id)
+            
+            self.cursor.execute(
+                "UPDATE hashtag_user_counts SET dirty = 0 WHERE hashtag_id = ? AND dirty = 1",
+                (hashtag_id,)
+            )
+    
+    def _top_contributor_rows(self, hashtag_id):
+        """Get a hashtag's top contributor rows to tell whether a refresh changed them."""
+        self.cursor.execute(
+            "SELECT user_id, tweet_count, influence_score FROM top_contributors WHERE hashtag_id = ?",
+            (hashtag_id,)
+        )
+        return set(tuple(row) for row in self.cursor.fetchall())
+    
+    def _bump_data_version(self, hashtag_id):
+        """Give a hashtag's data a new version inside the caller's transaction."""
+        self.cursor.execute(
+            "UPDATE hashtag_counters SET data_version = data_version + 1 WHERE hashtag_id = ?",
+            (hashtag_id,)
+        )
     
-    def get_hashtag_summary(self, hashtag_id):
-        """Get summary statistics for a hashtag."""
+    @_reads
+    def get_data_version(self, hashtag_id):
+        """
+        Get the version of a hashtag's stored data.
+        
+        The version changes in the same transaction as any write that
+        changes the hashtag's analysis results, new tweets above all, so
+        results computed for one version stay valid until it changes.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+            
+        Returns:
+            int: Data version, None if the hashtag has no counters yet
+        """
+        self.cursor.execute("SELECT data_version FROM hashtag_counters WHERE hashtag_id = ?", (hashtag_id,))
+        row = self.cursor.fetchone()
+        return row['data_version'] if row else None
+    
+    @_reads
+    def get_hashtag_summary(self, hashtag_id, include_locations=True):
+        """
+        Get summary statistics for a hashtag.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+            include_locations (bool): Also read the geocoded locations, callers
+                that already have get_location_stats can skip them
+                
+        Returns:
+            dict: Hashtag row, tweet types, hourly activity and locations
+        """
         self.cursor.execute(
             "SELECT * FROM hashtags WHERE id = ?",
             (hashtag_id,)
@@ -440,53 +1584,29 @@ class Database:
         if not hashtag:
             return None
         
-        # Get tweet type breakdown
+        # Get tweet type breakdown from the daily rollups
         self.cursor.execute(
             """
             SELECT 
-                SUM(CASE WHEN is_retweet = FALSE AND is_reply = FALSE THEN 1 ELSE 0 END) as original_count,
-                SUM(CASE WHEN is_retweet = TRUE THEN 1 ELSE 0 END) as retweet_count,
-                SUM(CASE WHEN is_reply = TRUE THEN 1 ELSE 0 END) as reply_count,
-                SUM(CASE WHEN has_media = TRUE THEN 1 ELSE 0 END) as media_count
-            FROM tweets 
-            WHERE hashtag_id = ?
+                SUM(original_count) as original_count,
+                SUM(retweet_count) as retweet_count,
+                SUM(reply_count) as reply_count,
+                SUM(media_count) as media_count
+            FROM tweet_rollups 
+            WHERE hashtag_id = ? AND resolution = 'day'
             """,
             (hashtag_id,)
         )
         tweet_types = self.cursor.fetchone()
         
         # Get time-based activity
-        self.cursor.execute(
-            """
-            SELECT 
-                strftime('%Y-%m-%d %H:00:00', created_at) as hour,
-                COUNT(*) as tweet_count,
-                COUNT(DISTINCT user_id) as user_count
-            FROM tweets 
-            WHERE hashtag_id = ?
-            GROUP BY hour
-            ORDER BY hour
-            """,
-            (hashtag_id,)
-        )
-        activity = [dict(row) for row in self.cursor.fetchall()]
+        activity = [
+            {'hour': bucket['bucket'], 'tweet_count': bucket['tweet_count'], 'user_count': bucket['user_count']}
+            for bucket in self.get_activity_timeline(hashtag_id, 'hour')
+        ]
         
         # Get location data
-        self.cursor.execute(
-            """
-            SELECT 
-                l.location_text, l.latitude, l.longitude, l.country, l.city,
-                COUNT(DISTINCT t.user_id) as user_count
-            FROM tweets t
-            JOIN users u ON t.user_id = u.id
-            JOIN user_locations ul ON u.id = ul.user_id
-            JOIN locations l ON ul.location_id = l.id
-            WHERE t.hashtag_id = ? AND l.is_geocoded = TRUE
-            GROUP BY l.id
-            """,
-            (hashtag_id,)
-        )
-        locations = [dict(row) for row in self.cursor.fetchall()]
+        locations = self._hashtag_locations(hashtag_id) if include_locations else []
         
         return {
             'hashtag': dict(hashtag),
@@ -495,6 +1615,7 @@ class Database:
             'locations': locations
         }
     
+    @_reads
     def get_top_contributors(self, hashtag_id, limit=10):
         """Get top contributors for a hashtag."""
         self.cursor.execute(
@@ -510,6 +1631,7 @@ class Database:
         )
         return [dict(row) for row in self.cursor.fetchall()]
     
+    @_reads
     def get_sentiment_analysis(self, hashtag_id):
         """Get sentiment analysis for a hashtag."""
         # Get overall sentiment score
@@ -517,40 +1639,33 @@ class Database:
             "SELECT sentiment_score FROM hashtags WHERE id = ?",
             (hashtag_id,)
         )
-        overall_score = self.cursor.fetchone()['sentiment_score'] if self.cursor.fetchone() else 0
+        row = self.cursor.fetchone()
+        overall_score = row['sentiment_score'] if row else 0
         
-        # Get sentiment distribution
+        # Get sentiment distribution from the daily rollups
         self.cursor.execute(
             """
             SELECT 
-                CASE 
-                    WHEN sentiment_score > 0.5 THEN 'positive'
-                    WHEN sentiment_score < -0.5 THEN 'negative'
-                    ELSE 'neutral'
-                END as sentiment,
-                COUNT(*) as count
-            FROM tweets 
-            WHERE hashtag_id = ?
-            GROUP BY sentiment
+                SUM(positive_count) as positive,
+                SUM(negative_count) as negative,
+                SUM(tweet_count - positive_count - negative_count) as neutral
+            FROM tweet_rollups 
+            WHERE hashtag_id = ? AND resolution = 'day'
             """,
             (hashtag_id,)
         )
-        distribution = {row['sentiment']: row['count'] for row in self.cursor.fetchall()}
+        totals = self.cursor.fetchone()
+        distribution = {
+            sentiment: totals[sentiment]
+            for sentiment in ('positive', 'negative', 'neutral')
+            if totals[sentiment]
+        }
         
         # Get sentiment over time
-        self.cursor.execute(
-            """
-            SELECT 
-                strftime('%Y-%m-%d %H:00:00', created_at) as hour,
-                AVG(sentiment_score) as avg_score
-            FROM tweets 
-            WHERE hashtag_id = ?
-            GROUP BY hour
-            ORDER BY hour
-            """,
-            (hashtag_id,)
-        )
-        timeline = [dict(row) for row in self.cursor.fetchall()]
+        timeline = [
+            {'hour': bucket['bucket'], 'avg_score': bucket['avg_score']}
+            for bucket in self.get_sentiment_timeline(hashtag_id, 'hour')
+        ]
         
         return {
             'overall_score': overall_score,
@@ -558,69 +1673,218 @@ class Database:
             'timeline': timeline
         }
     
-    def get_location_stats(self, hashtag_id):
-        """Get location statistics for a hashtag."""
-        # Get country distribution
+    @_reads
+    def get_activity_timeline(self, hashtag_id, resolution='hour', start=None, end=None):
+        """
+        Get tweet activity per time bucket from the rollups.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+            resolution (str): 'minute', 'hour' or 'day'
+            start: Earliest bucket to include, a datetime, 'YYYY-MM-DD HH:MM:SS' string or epoch seconds
+            end: Bucket to stop before, a datetime, 'YYYY-MM-DD HH:MM:SS' string or epoch seconds
+            
+        Returns:
+            list: Buckets in time order with tweet counts by type and an
+                estimated distinct user count
+        """
+        return [
+            {
+                'bucket': from_epoch(row['bucket']),
+                'tweet_count': row['tweet_count'],
+                'user_count': row['user_count'] or 0,
+                'original_count': row['original_count'],
+                'retweet_count': row['retweet_count'],
+                'reply_count': row['reply_count'],
+                'media_count': row['media_count']
+            }
+            for row in self._rollup_rows(hashtag_id, resolution, start, end)
+        ]
+    
+    @_reads
+    def get_sentiment_timeline(self, hashtag_id, resolution='hour', start=None, end=None):
+        """
+        Get the average sentiment per time bucket from the rollups.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+            resolution (str): 'minute', 'hour' or 'day'
+            start: Earliest bucket to include, a datetime, 'YYYY-MM-DD HH:MM:SS' string or epoch seconds
+            end: Bucket to stop before, a datetime, 'YYYY-MM-DD HH:MM:SS' string or epoch seconds
+            
+        Returns:
+            list: Buckets in time order with average score and positive and negative counts
+        """
+        return [
+            {
+                'bucket': from_epoch(row['bucket']),
+                'avg_score': row['sentiment_sum'] / row['tweet_count'] if row['tweet_count'] else 0,
+                'tweet_count': row['tweet_count'],
+                'positive_count': row['positive_count'],
+                'negative_count': row['negative_count']
+            }
+            for row in self._rollup_rows(hashtag_id, resolution, start, end)
+        ]
+    
+    @_reads
+    def get_recent_velocity(self, hashtag_id, window_minutes=15):
+        """
+        Get how fast a hashtag has been receiving tweets.
+        
+        The new tweet count comes from the last two hashtag_stats
+        snapshots, i.e. what the latest crawl found, and the tweet rate
+        from the minute rollups of the window ending at the newest tweet.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+            window_minutes (int): Minutes of activity to average over
+            
+        Returns:
+            dict: 'new_tweets' found by the latest crawl and 'tweets_per_minute'
+                posted over the window
+        """
         self.cursor.execute(
             """
-            SELECT 
-                l.country,
-                COUNT(DISTINCT t.user_id) as user_count
-            FROM tweets t
-            JOIN users u ON t.user_id = u.id
-            JOIN user_locations ul ON u.id = ul.user_id
-            JOIN locations l ON ul.location_id = l.id
-            WHERE t.hashtag_id = ? AND l.country IS NOT NULL
-            GROUP BY l.country
-            ORDER BY user_count DESC
+            SELECT tweet_count FROM hashtag_stats WHERE hashtag_id = ?
+            ORDER BY timestamp_epoch DESC, id DESC
+            LIMIT 2
             """,
             (hashtag_id,)
         )
-        countries = [dict(row) for row in self.cursor.fetchall()]
+        snapshots = [row['tweet_count'] for row in self.cursor.fetchall()]
+        new_tweets = snapshots[0] - (snapshots[1] if len(snapshots) > 1 else 0) if snapshots else 0
         
-        # Get city distribution
         self.cursor.execute(
             """
-            SELECT 
-                l.city, l.country,
-                COUNT(DISTINCT t.user_id) as user_count
-            FROM tweets t
-            JOIN users u ON t.user_id = u.id
-            JOIN user_locations ul ON u.id = ul.user_id
-            JOIN locations l ON ul.location_id = l.id
-            WHERE t.hashtag_id = ? AND l.city IS NOT NULL
-            GROUP BY l.city, l.country
-            ORDER BY user_count DESC
-            LIMIT 50
+            SELECT bucket FROM tweet_rollups
+            WHERE hashtag_id = ? AND resolution = 'minute'
+            ORDER BY bucket DESC
+            LIMIT 1
             """,
             (hashtag_id,)
         )
-        cities = [dict(row) for row in self.cursor.fetchall()]
+        newest = self.cursor.fetchone()
+        tweets_per_minute = 0.0
+        if newest is not None:
+            self.cursor.execute(
+                """
+                SELECT TOTAL(tweet_count) FROM tweet_rollups
+                WHERE hashtag_id = ? AND resolution = 'minute' AND bucket >= ?
+                """,
+                (hashtag_id, newest['bucket'] - (window_minutes - 1) * ROLLUP_RESOLUTIONS['minute'])
+            )
+            tweets_per_minute = self.cursor.fetchone()[0] / window_minutes
+        
+        return {
+            'new_tweets': new_tweets,
+            'tweets_per_minute': tweets_per_minute
+        }
+    
+    def _rollup_rows(self, hashtag_id, resolution, start, end):
+        """Range scan the rollups of one resolution, optionally bounded in time."""
+        if resolution not in ROLLUP_RESOLUTIONS:
+            raise ValueError(f"Unknown resolution '{resolution}', expected one of {tuple(ROLLUP_RESOLUTIONS)}")
+        
+        # Everything but the sketches, estimates were stored when they changed
+        query = """
+            SELECT bucket, tweet_count, original_count, retweet_count, reply_count, media_count,
+                positive_count, negative_count, sentiment_sum, user_count
+            FROM tweet_rollups WHERE hashtag_id = ? AND resolution = ?
+        """
+        params = [hashtag_id, resolution]
+        if start is not None:
+            query += " AND bucket >= ?"
+            params.append(self._epoch_bound(start))
+        if end is not None:
+            query += " AND bucket < ?"
+            params.append(self._epoch_bound(end))
+        
+        self.cursor.execute(query + " ORDER BY bucket", params)
+        return self.cursor.fetchall()
+    
+    def _epoch_bound(self, value):
+        """Convert a time range bound to epoch seconds, rejecting values that aren't times."""
+        epoch = to_epoch(value)
+        if epoch is None:
+            raise ValueError(f"Invalid time bound {value!r}, expected a datetime or 'YYYY-MM-DD HH:MM:SS'")
+        return epoch
+    
+    @_reads
+    def get_location_stats(self, hashtag_id):
+        """
+        Get location statistics for a hashtag.
+        
+        Users linked to several places in one country or city, such as
+        "Berlin" and "Berlin, DE", are counted there once. The places of
+        the hashtag's users are read in user order, so each user's
+        countries and cities are deduplicated without sorting.
         
-        # Get all geocoded locations
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+            
+        Returns:
+            dict: Country and city distributions and the geocoded locations
+        """
         self.cursor.execute(
             """
-            SELECT 
-                l.location_text, l.latitude, l.longitude, l.country, l.city,
-                COUNT(DISTINCT t.user_id) as user_count
-            FROM tweets t
-            JOIN users u ON t.user_id = u.id
-            JOIN user_locations ul ON u.id = ul.user_id
-            JOIN locations l ON ul.location_id = l.id
-            WHERE t.hashtag_id = ? AND l.is_geocoded = TRUE
-            GROUP BY l.id
+            SELECT c.user_id, l.country, l.city
+            FROM hashtag_user_counts c
+            JOIN user_locations ul ON ul.user_id = c.user_id
+            JOIN locations l ON l.id = ul.location_id
+            WHERE c.hashtag_id = ? AND (l.country IS NOT NULL OR l.city IS NOT NULL)
+            ORDER BY c.user_id
             """,
             (hashtag_id,)
         )
-        locations = [dict(row) for row in self.cursor.fetchall()]
+        
+        countries = {}
+        cities = {}
+        for _, places in itertools.groupby(self.cursor.fetchall(), key=lambda row: row['user_id']):
+            places = list(places)
+            for country in {row['country'] for row in places if row['country'] is not None}:
+                countries[country] = countries.get(country, 0) + 1
+            for key in {(row['city'], row['country']) for row in places if row['city'] is not None}:
+                cities[key] = cities.get(key, 0) + 1
         
         return {
-            'countries': countries,
-            'cities': cities,
-            'locations': locations
+            'countries': [
+                {'country': country, 'user_count': user_count}
+                for country, user_count in sorted(countries.items(), key=lambda item: -item[1])
+            ],
+            'cities': [
+                {'city': city, 'country': country, 'user_count': user_count}
+                for (city, country), user_count in sorted(cities.items(), key=lambda item: -item[1])[:50]
+            ],
+            'locations': self._hashtag_locations(hashtag_id)
         }
     
+    def _hashtag_locations(self, hashtag_id):
+        """
+        Get a hashtag's geocoded locations with their materialized user counts.
+        
+        A hashtag has one row per place its users come from, so one
+        index range read gives the list instead of joining tweets to
+        users to locations.
+        """
+        self.cursor.execute(
+            """
+            SELECT 
+                l.location_text, l.latitude, l.longitude, l.country, l.city, hl.user_count
+            FROM hashtag_locations hl
+            JOIN locations l ON l.id = hl.location_id
+            WHERE hl.hashtag_id = ? AND l.is_geocoded = TRUE
+            """,
+            (hashtag_id,)
+        )
+        return [dict(row) for row in self.cursor.fetchall()]
+    
     def close(self):
         """Close the database connection."""
-        if self.conn:
-            self.conn.close()
+        if self._writer is not None:
+            self._writer.stop()
+            self._writer = None
+        if self._readers is not None:
+            self._readers.close()
+            self._readers = None
+        if self._conn:
+            self._conn.close()
@@ -0,0 +1,326 @@
+import uuid
+
+from models.hyperloglog import HyperLogLog
+
+
+def _add_dirty_flag(cursor):
+    """Track which per-user counts changed since top contributors were refreshed."""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(hashtag_user_counts)")]
+    if 'dirty' not in columns:
+        # Existing counts start out dirty so the next refresh covers them
+        cursor.execute("ALTER TABLE hashtag_user_counts ADD COLUMN dirty INTEGER DEFAULT 1")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hashtag_user_counts_user_id ON hashtag_user_counts(user_id)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_hashtag_user_counts_dirty ON hashtag_user_counts(hashtag_id) WHERE dirty = 1"
+    )
+
+
+def _add_composite_indexes(cursor):
+    """Index the hot queries by hashtag and then by the column they group or sort on."""
+    # Per-hashtag user grouping and distinct counts read only the index
+    cursor.execute("DROP INDEX IF EXISTS idx_tweets_hashtag_id")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tweets_hashtag_user ON tweets(hashtag_id, user_id)")
+    
+    cursor.execute("DROP INDEX IF EXISTS idx_hashtag_stats_hashtag_id")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_hashtag_stats_hashtag_timestamp ON hashtag_stats(hashtag_id, timestamp)"
+    )
+    
+    # get_top_contributors sorts by influence, update_top_contributors trims by tweet count
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_top_contributors_influence "
+        "ON top_contributors(hashtag_id, influence_score DESC)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_top_contributors_tweet_count "
+        "ON top_contributors(hashtag_id, tweet_count DESC, user_id)"
+    )
+
+
+def _add_hashtag_locations(cursor):
+    """Materialize how many of a hashtag's users are linked to each location."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS hashtag_locations (
+            hashtag_id INTEGER NOT NULL,
+            location_id INTEGER NOT NULL,
+            user_count INTEGER DEFAULT 0,
+            PRIMARY KEY (hashtag_id, location_id),
+            FOREIGN KEY (hashtag_id) REFERENCES hashtags(id),
+            FOREIGN KEY (location_id) REFERENCES locations(id)
+        ) WITHOUT ROWID
+        """
+    )
+    # Backfill from the users already counted per hashtag
+    cursor.execute(
+        """
+        INSERT INTO hashtag_locations (hashtag_id, location_id, user_count)
+        SELECT c.hashtag_id, ul.location_id, 1
+        FROM hashtag_user_counts c
+        JOIN user_locations ul ON ul.user_id = c.user_id
+        -- Without a WHERE clause SQLite would read ON CONFLICT as a join constraint
+        WHERE true
+        ON CONFLICT(hashtag_id, location_id) DO UPDATE SET user_count = user_count + 1
+        """
+    )
+
+
+def _add_data_version(cursor):
+    """Version each hashtag's data so derived results can be cached."""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(hashtag_counters)")]
+    if 'data_version' not in columns:
+        cursor.execute("ALTER TABLE hashtag_counters ADD COLUMN data_version INTEGER DEFAULT 0")
+
+
+def _add_high_water_marks(cursor):
+    """Remember the newest stored tweet of each hashtag for incremental crawls."""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(hashtags)")]
+    if 'newest_tweet_id' not in columns:
+        cursor.execute("ALTER TABLE hashtags ADD COLUMN newest_tweet_id TEXT")
+    if 'newest_tweet_at' not in columns:
+        cursor.execute("ALTER TABLE hashtags ADD COLUMN newest_tweet_at TIMESTAMP")
+    
+    hashtag_ids = [row[0] for row in cursor.execute("SELECT id FROM hashtags").fetchall()]
+    for hashtag_id in hashtag_ids:
+        # Tweet IDs are numeric strings, longer ones are larger
+        newest = cursor.execute(
+            """
+            SELECT id, created_at FROM tweets WHERE hashtag_id = ?
+            ORDER BY length(id) DESC, id DESC
+            LIMIT 1
+            """,
+            (hashtag_id,)
+        ).fetchone()
+        if newest is not None:
+            cursor.execute(
+                "UPDATE hashtags SET newest_tweet_id = ?, newest_tweet_at = ? WHERE id = ?",
+                (newest[0], newest[1], hashtag_id)
+            )
+
+
+def _add_crawl_jobs(cursor):
+    """Persist crawl progress so interrupted crawls can resume."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS crawl_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hashtag_id INTEGER NOT NULL,
+            search_type TEXT NOT NULL,
+            target_count INTEGER NOT NULL,
+            since_id TEXT,
+            last_cursor TEXT,
+            fetched_count INTEGER DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'running',
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (hashtag_id) REFERENCES hashtags(id)
+        )
+        """
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_crawl_jobs_hashtag_id ON crawl_jobs(hashtag_id)")
+
+
+def _backfill_epochs(cursor, table, text_column, epoch_column, batch_size=10000):
+    """Fill an epoch column from its text timestamp column, one rowid range at a time."""
+    last_rowid = cursor.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+    for start in range(0, last_rowid, batch_size):
+        # Each batch is a rowid range lookup, not another scan for unfilled rows
+        cursor.execute(
+            f"""
+            UPDATE {table} SET {epoch_column} = CAST(strftime('%s', {text_column}) AS INTEGER)
+            WHERE rowid > ? AND rowid <= ? AND {epoch_column} IS NULL
+            """,
+            (start, start + batch_size)
+        )
+
+
+def _add_epoch_timestamps(cursor):
+    """Store tweet and stats times as epoch seconds and bucket rollups by them."""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(tweets)")]
+    if 'created_epoch' not in columns:
+        cursor.execute("ALTER TABLE tweets ADD COLUMN created_epoch INTEGER")
+    _backfill_epochs(cursor, 'tweets', 'created_at', 'created_epoch')
+    
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(hashtag_stats)")]
+    if 'timestamp_epoch' not in columns:
+        cursor.execute("ALTER TABLE hashtag_stats ADD COLUMN timestamp_epoch INTEGER")
+    _backfill_epochs(cursor, 'hashtag_stats', 'timestamp', 'timestamp_epoch')
+    
+    # The text columns stay for compatibility, nothing queries them by time anymore
+    cursor.execute("DROP INDEX IF EXISTS idx_tweets_created_at")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tweets_hashtag_epoch ON tweets(hashtag_id, created_epoch)")
+    cursor.execute("DROP INDEX IF EXISTS idx_hashtag_stats_timestamp")
+    cursor.execute("DROP INDEX IF EXISTS idx_hashtag_stats_hashtag_timestamp")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_hashtag_stats_hashtag_epoch ON hashtag_stats(hashtag_id, timestamp_epoch)"
+    )
+    
+    # Rollup buckets become epoch seconds; the key column's type can only change by copying the table
+    bucket_type = [row[2] for row in cursor.execute("PRAGMA table_info(tweet_rollups)") if row[1] == 'bucket']
+    if bucket_type == ['TEXT']:
+        cursor.execute("ALTER TABLE tweet_rollups RENAME TO tweet_rollups_text")
+        cursor.execute(
+            """
+            CREATE TABLE tweet_rollups (
+                hashtag_id INTEGER NOT NULL,
+                resolution TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                tweet_count INTEGER DEFAULT 0,
+                original_count INTEGER DEFAULT 0,
+                retweet_count INTEGER DEFAULT 0,
+                reply_count INTEGER DEFAULT 0,
+                media_count INTEGER DEFAULT 0,
+                positive_count INTEGER DEFAULT 0,
+                negative_count INTEGER DEFAULT 0,
+                sentiment_sum REAL DEFAULT 0,
+                users BLOB,
+                PRIMARY KEY (hashtag_id, resolution, bucket),
+                FOREIGN KEY (hashtag_id) REFERENCES hashtags(id)
+            ) WITHOUT ROWID
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO tweet_rollups
+            SELECT hashtag_id, resolution, CAST(strftime('%s', bucket) AS INTEGER), tweet_count,
+                original_count, retweet_count, reply_count, media_count, positive_count,
+                negative_count, sentiment_sum, users
+            FROM tweet_rollups_text
+            WHERE strftime('%s', bucket) IS NOT NULL
+            """
+        )
+        cursor.execute("DROP TABLE tweet_rollups_text")
+
+
+def _add_rollup_user_counts(cursor):
+    """Store each rollup bucket's distinct user estimate so reads never decode sketches."""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(tweet_rollups)")]
+    if 'user_count' not in columns:
+        cursor.execute("ALTER TABLE tweet_rollups ADD COLUMN user_count INTEGER DEFAULT 0")
+    
+    # A separate cursor streams the sketches while this one writes the estimates
+    rows = cursor.connection.execute(
+        "SELECT hashtag_id, resolution, bucket, users FROM tweet_rollups WHERE users IS NOT NULL"
+    )
+    while True:
+        batch = rows.fetchmany(5000)
+        if not batch:
+            break
+        cursor.executemany(
+            "UPDATE tweet_rollups SET user_count = MIN(?, tweet_count) WHERE hashtag_id = ? AND resolution = ? AND bucket = ?",
+            [(HyperLogLog.from_bytes(row[3]).count(), row[0], row[1], row[2]) for row in batch]
+        )
+
+
+def _add_hashtag_locations_location_index(cursor):
+    """Find the hashtags counting users at a location when its coordinates change."""
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_hashtag_locations_location_id ON hashtag_locations(location_id)"
+    )
+
+
+def _clear_case_folded_sentiments(cursor):
+    """Drop cached sentiment scores keyed by lowercased text, which mixed up case-sensitive emoticons."""
+    cursor.execute("DELETE FROM sentiment_cache")
+
+
+def _add_database_identity(cursor):
+    """Give the database a random id, so caches kept outside it never mix it up with another one."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS database_info (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    cursor.execute("INSERT OR IGNORE INTO database_info (key, value) VALUES ('uuid', ?)", (uuid.uuid4().hex,))
+
+
+def _add_crawl_coverage(cursor):
+    """Track the tweets each crawl saw, and the gaps crawls left below them."""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(crawl_jobs)")]
+    for column, column_type in (('newest_tweet_id', 'TEXT'), ('newest_tweet_at', 'TIMESTAMP'),
+                                ('oldest_tweet_id', 'TEXT')):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE crawl_jobs ADD COLUMN {column} {column_type}")
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS crawl_gaps (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hashtag_id INTEGER NOT NULL,
+            job_id INTEGER NOT NULL,
+            after_tweet_id TEXT NOT NULL,
+            before_tweet_id TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (hashtag_id) REFERENCES hashtags(id),
+            FOREIGN KEY (job_id) REFERENCES crawl_jobs(id)
+        )
+        """
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_crawl_gaps_hashtag_id ON crawl_gaps(hashtag_id)")
+
+
+# Applied in order; a database's PRAGMA user_version is the last one it has.
+# Append new migrations, never edit or reorder released ones.
+MIGRATIONS = [
+    (1, "hashtag_user_counts dirty flag", _add_dirty_flag),
+    (2, "composite indexes for hot queries", _add_composite_indexes),
+    (3, "hashtag_locations aggregate", _add_hashtag_locations),
+    (4, "hashtag_counters data version", _add_data_version),
+    (5, "hashtag high-water marks", _add_high_water_marks),
+    (6, "crawl_jobs checkpoints", _add_crawl_jobs),
+    (7, "epoch timestamps", _add_epoch_timestamps),
+    (8, "rollup user count estimates", _add_rollup_user_counts),
+    (9, "hashtag_locations location index", _add_hashtag_locations_location_index),
+    (10, "case-sensitive sentiment cache keys", _clear_case_folded_sentiments),
+    (11, "database identity", _add_database_identity),
+    (12, "crawl coverage and gaps", _add_crawl_coverage),
+]
+
+
+def schema_version(conn):
+    """
+    Get the schema version of a database.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection
+        
+    Returns:
+        int: Version of the last applied migration, 0 for none
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Apply the migrations a database doesn't have yet.
+    
+    Each migration runs in its own transaction together with the
+    version bump, so an interrupted upgrade resumes where it stopped.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection
+        
+    Returns:
+        list: Versions that were applied
+    """
+    applied = []
+    current = schema_version(conn)
+    
+    for version, description, upgrade in MIGRATIONS:
+        if version <= current:
+            continue
+        
+        with conn:
+            cursor = conn.cursor()
+            # sqlite3 doesn't open a transaction by itself before DDL
+            cursor.execute("BEGIN")
+            upgrade(cursor)
+            # PRAGMA doesn't take bound parameters
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+        
+        applied.append(version)
+    
+    return applied
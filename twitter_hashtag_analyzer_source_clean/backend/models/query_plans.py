@@ -0,0 +1,99 @@
+import re
+
+# Statement kinds whose plans are checked
+PLANNED_STATEMENT = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b', re.IGNORECASE)
+
+# Plan steps that read a whole table or index, or sort into a temporary B-tree
+FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)')
+TEMP_BTREE = 'USE TEMP B-TREE'
+AUTOMATIC_INDEX = 'AUTOMATIC'
+
+# (SQL fragment, plan steps allowed for statements containing it, reason)
+PLAN_ALLOWANCES = []
+
+
+class QueryPlanRecorder:
+    def __init__(self, conn):
+        """
+        Initialize a recorder of the statements run on a connection.
+        
+        Used as a context manager around a workload; statements are
+        recorded with their parameters bound, so they can be explained
+        as they actually ran.
+        
+        Args:
+            conn (sqlite3.Connection): Connection to record
+        """
+        self.conn = conn
+        self.statements = []
+        self._seen = set()
+    
+    def _record(self, sql):
+        """Keep each distinct plannable statement once."""
+        if PLANNED_STATEMENT.match(sql) and sql not in self._seen:
+            self._seen.add(sql)
+            self.statements.append(sql)
+    
+    def __enter__(self):
+        self.conn.set_trace_callback(self._record)
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.conn.set_trace_callback(None)
+
+
+def explain(conn, sql):
+    """
+    Get the query plan of a statement.
+    
+    Args:
+        conn (sqlite3.Connection): Connection to the database
+        sql (str): Statement with literal parameters
+        
+    Returns:
+        list: Plan step descriptions in order
+    """
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+
+
+def plan_problems(sql, plan):
+    """
+    Find the plan steps of a statement that don't scale with the data it needs.
+    
+    Args:
+        sql (str): The statement
+        plan (list): Its plan steps as returned by explain
+        
+    Returns:
+        list: Full scans, temporary sorts and automatic indexes not allowed for the statement
+    """
+    allowed = set()
+    for fragment, steps, reason in PLAN_ALLOWANCES:
+        if fragment in sql:
+            allowed.update(steps)
+    
+    problems = []
+    for step in plan:
+        if step in allowed:
+            continue
+        if FULL_SCAN.match(step) or TEMP_BTREE in step or AUTOMATIC_INDEX in step:
+            problems.append(step)
+    return problems
+
+
+def check_query_plans(conn, statements):
+    """
+    Explain recorded statements and report the ones with bad plans.
+    
+    Args:
+        conn (sqlite3.Connection): Connection to the database they ran on
+        statements (list): Statements recorded by QueryPlanRecorder
+        
+    Returns:
+        list: (statement, plan, problems) for every statement, problems empty when the plan is fine
+    """
+    report = []
+    for sql in statements:
+        plan = explain(conn, sql)
+        report.append((sql, plan, plan_problems(sql, plan)))
+    return report
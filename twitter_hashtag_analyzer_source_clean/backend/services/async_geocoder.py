@@ -0,0 +1,302 @@
+import time
+import weakref
+import asyncio
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+USER_AGENT = "TwitterHashtagAnalyzer/1.0"
+
+# Requests per second and burst size per endpoint host; the public
+# Nominatim server allows at most one request per second
+DEFAULT_RATE_LIMITS = {
+    'nominatim.openstreetmap.org': (1.0, 1)
+}
+
+
+def parse_nominatim_result(result):
+    """
+    Convert one Nominatim search result to location data.
+    
+    Args:
+        result (dict): Search result with 'lat', 'lon' and 'address'
+        
+    Returns:
+        dict: Location data with coordinates, country and city
+    """
+    address = result.get("address", {})
+    return {
+        "latitude": float(result["lat"]),
+        "longitude": float(result["lon"]),
+        "country": address.get("country", ""),
+        "city": address.get("city", "") or address.get("town", "") or address.get("village", "")
+    }
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1, clock=time.monotonic):
+        """
+        Initialize a token bucket rate limiter.
+        
+        Callers reserve a token and are told how long to wait for it, so
+        waiting callers are served in order and the limiter works both
+        from threads and from any event loop.
+        
+        Args:
+            rate (float): Tokens added per second, None for no limit
+            capacity (int): Largest burst of requests let through at once
+            clock (callable): Returns the current time in seconds
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+    
+    def reserve(self, tokens=1):
+        """
+        Take tokens, borrowing against future refills if not enough are left.
+        
+        Args:
+            tokens (float): Number of tokens to take
+            
+        Returns:
+            float: Seconds to wait before using the tokens
+        """
+        if not self.rate:
+            return 0.0
+        
+        with self._lock:
+            self._refill()
+            self.tokens -= tokens
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+    
+    def available(self):
+        """Get the number of tokens that can be taken without waiting."""
+        if not self.rate:
+            return float('inf')
+        
+        with self._lock:
+            self._refill()
+            return self.tokens
+    
+    def _refill(self):
+        """Add the tokens accumulated since the last update."""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    def wait(self):
+        """Block the calling thread until a token is available."""
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+    
+    async def acquire(self):
+        """Wait in the event loop until a token is available."""
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class AsyncGeocoder:
+    def __init__(self, endpoint=NOMINATIM_URL, concurrency=4, rate_limits=None, default_rate=None,
+                 timeout=10):
+        """
+        Initialize the concurrent Nominatim client.
+        
+        Lookups run on an event loop, at most `concurrency` at a time,
+        each first taking a token from its endpoint host's bucket. The
+        blocking HTTP calls go through one requests session whose
+        connection pool keeps that many connections alive, and lookups
+        for a key that is already in flight wait for the same request.
+        
+        Args:
+            endpoint (str): Nominatim-compatible search URL
+            concurrency (int): Maximum number of requests in flight
+            rate_limits (dict): Host to (requests per second, burst) overrides
+            default_rate (float): Requests per second for hosts without a limit,
+                None for unlimited
+            timeout (float): Seconds to wait for a response
+        """
+        self.endpoint = endpoint
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.rate_limits = dict(DEFAULT_RATE_LIMITS)
+        self.rate_limits.update(rate_limits or {})
+        self.default_rate = default_rate
+        self.requests_sent = 0
+        self.coalesced = 0
+        
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+        self._inflight = {}
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._semaphores_lock = threading.Lock()
+        self._executor = None
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = USER_AGENT
+    
+    def bucket(self, endpoint=None):
+        """
+        Get the rate limiter shared by all requests to an endpoint's host.
+        
+        Args:
+            endpoint (str): Endpoint URL, defaults to the configured one
+            
+        Returns:
+            TokenBucket: The host's bucket
+        """
+        host = urlsplit(endpoint or self.endpoint).netloc
+        with self._buckets_lock:
+            if host not in self._buckets:
+                rate, capacity = self.rate_limits.get(host, (self.default_rate, 1))
+                self._buckets[host] = TokenBucket(rate, capacity)
+            return self._buckets[host]
+    
+    def semaphore(self):
+        """
+        Get the semaphore shared by all lookups on the running event loop.
+        
+        Semaphores belong to one loop, so each loop gets its own, dropped
+        along with the loop.
+        
+        Returns:
+            asyncio.Semaphore: The loop's semaphore, allowing `concurrency` requests
+        """
+        loop = asyncio.get_running_loop()
+        with self._semaphores_lock:
+            if loop not in self._semaphores:
+                self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+            return self._semaphores[loop]
+    
+    def fetch(self, location_text):
+        """
+        Look up a location on the endpoint, waiting for the rate limiter.
+        
+        Args:
+            location_text (str): Location text to send
+            
+        Returns:
+            tuple: (location data or None, 'found', 'not_found' or 'error')
+        """
+        self.bucket().wait()
+        self.requests_sent += 1
+        return self._get(location_text)
+    
+    def _get(self, location_text):
+        """Send one search request on the pooled session."""
+        try:
+            response = self.session.get(
+                self.endpoint,
+                params={
+                    "q": location_text,
+                    "format": "json",
+                    "limit": 1,
+                    "addressdetails": 1
+                },
+                timeout=self.timeout
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                if not data:
+                    return None, 'not_found'
+                return parse_nominatim_result(data[0]), 'found'
+            
+            print(f"Error geocoding location '{location_text}': HTTP {response.status_code}")
+        except Exception as e:
+            print(f"Error geocoding location '{location_text}': {str(e)}")
+        
+        return None, 'error'
+    
+    async def lookup(self, location_text, key=None, semaphore=None):
+        """
+        Look up a location, sharing the request with identical lookups in flight.
+        
+        Args:
+            location_text (str): Location text to send
+            key (str): Key identifying duplicate lookups, defaults to the text
+            semaphore (asyncio.Semaphore): Limits concurrent requests, defaults to
+                the one shared by all lookups on the running loop
+            
+        Returns:
+            tuple: (location data or None, 'found', 'not_found' or 'error')
+        """
+        key = key or location_text
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+        
+        loop = asyncio.get_running_loop()
+        pending = loop.create_future()
+        self._inflight[key] = pending
+        try:
+            async with semaphore or self.semaphore():
+                await self.bucket().acquire()
+                self.requests_sent += 1
+                result = await loop.run_in_executor(self._get_executor(), self._get, location_text)
+            pending.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            # Waiters see the error, nobody else has to retrieve it
+            pending.exception()
+            raise
+        finally:
+            del self._inflight[key]
+    
+    async def geocode_many(self, locations):
+        """
+        Look up many locations concurrently.
+        
+        Args:
+            locations (dict): Key to location text
+            
+        Returns:
+            dict: Key to (location data or None, outcome) as returned by lookup
+        """
+        keys = list(locations)
+        results = await asyncio.gather(*(self.lookup(locations[key], key) for key in keys))
+        return dict(zip(keys, results))
+    
+    def geocode_batch(self, locations):
+        """
+        Look up many locations concurrently from synchronous code.
+        
+        Args:
+            locations (dict): Key to location text
+            
+        Returns:
+            dict: Key to (location data or None, outcome) as returned by lookup
+        """
+        if not locations:
+            return {}
+        return asyncio.run(self.geocode_many(locations))
+    
+    def _get_executor(self):
+        """Start the threads running the blocking HTTP calls on first use."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                thread_name_prefix='geocoder')
+        return self._executor
+    
+    def close(self):
+        """Stop the request threads and close pooled connections."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.session.close()
@@ -0,0 +1,150 @@
+import queue
+import threading
+import time
+
+
+class _StageStats:
+    def __init__(self, name):
+        """
+        Initialize throughput counters for one pipeline stage.
+        
+        Args:
+            name (str): Stage name
+        """
+        self.name = name
+        self.pages = 0
+        self.tweets = 0
+        self.busy_seconds = 0.0
+    
+    def record(self, page, seconds):
+        """Record one page handled by the stage."""
+        self.pages += 1
+        self.tweets += len(page.get('tweets', []))
+        self.busy_seconds += seconds
+    
+    def to_dict(self):
+        """Convert the counters to a dictionary."""
+        return {
+            'pages': self.pages,
+            'tweets': self.tweets,
+            'busy_seconds': self.busy_seconds,
+            'tweets_per_second': self.tweets / self.busy_seconds if self.busy_seconds else 0
+        }
+
+
+class _Done:
+    """Queue marker for the end of a stage's output, optionally carrying its error."""
+    
+    def __init__(self, error=None):
+        self.error = error
+
+
+class CollectionPipeline:
+    def __init__(self, queue_size=2):
+        """
+        Initialize a three-stage fetch/process/persist pipeline.
+        
+        Args:
+            queue_size (int): Maximum number of pages waiting between two stages
+        """
+        self.queue_size = queue_size
+    
+    def run(self, source, process, persist):
+        """
+        Run the pipeline until the source is exhausted.
+        
+        The source is iterated on a producer thread, so the next page is
+        requested as soon as the previous one has arrived. Pages then go
+        through bounded queues to a processing thread and finally to
+        persist, which runs on the calling thread so it can use the
+        caller's database connection.
+        
+        Args:
+            source (iterable): Yields raw search result pages
+            process (callable): Takes a page and returns the processed page
+            persist (callable): Takes a processed page and stores it
+            
+        Returns:
+            dict: Per-stage throughput and total wall time
+        """
+        stats = {
+            'fetch': _StageStats('fetch'),
+            'process': _StageStats('process'),
+            'persist': _StageStats('persist')
+        }
+        fetched = queue.Queue(maxsize=self.queue_size)
+        processed = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        
+        def put(target, item):
+            # Give up waiting once the consumer side has stopped
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def fetch_stage():
+            try:
+                pages = iter(source)
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        page = next(pages)
+                    except StopIteration:
+                        break
+                    stats['fetch'].record(page, time.perf_counter() - started)
+                    if not put(fetched, page):
+                        return
+                put(fetched, _Done())
+            except Exception as e:
+                put(fetched, _Done(e))
+        
+        def process_stage():
+            try:
+                while True:
+                    page = fetched.get()
+                    if isinstance(page, _Done):
+                        put(processed, page)
+                        return
+                    started = time.perf_counter()
+                    page = process(page)
+                    stats['process'].record(page, time.perf_counter() - started)
+                    if not put(processed, page):
+                        return
+            except Exception as e:
+                put(processed, _Done(e))
+        
+        workers = [
+            threading.Thread(target=fetch_stage, name='pipeline-fetch', daemon=True),
+            threading.Thread(target=process_stage, name='pipeline-process', daemon=True)
+        ]
+        started_at = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        
+        try:
+            while True:
+                page = processed.get()
+                if isinstance(page, _Done):
+                    if page.error:
+                        raise page.error
+                    break
+                started = time.perf_counter()
+                persist(page)
+                stats['persist'].record(page, time.perf_counter() - started)
+        finally:
+            stop.set()
+            # Unblock a processing thread waiting for input after an early stop
+            try:
+                fetched.put_nowait(_Done())
+            except queue.Full:
+                pass
+            for worker in workers:
+                worker.join()
+        
+        result = {name: stage.to_dict() for name, stage in stats.items()}
+        result['wall_seconds'] = time.perf_counter() - started_at
+        return result
@@ -0,0 +1,488 @@
+import time
+import bisect
+import random
+import itertools
+from datetime import datetime, timedelta
+
+TWITTER_DATE_FORMAT = '%a %b %d %H:%M:%S +0000 %Y'
+
+SAMPLE_TEXTS = [
+    "Great news for everyone following {tag} today!",
+    "This is terrible, {tag} keeps getting worse.",
+    "Not sure what to think about {tag} yet.",
+    "Loving the energy around {tag}, amazing people.",
+    "Sad to see how {tag} turned out.",
+    "Anyone else reading about {tag}?",
+]
+
+SAMPLE_LOCATIONS = [
+    "İstanbul, Türkiye", "Ankara", "izmir", "Berlin, Germany", "London",
+    "New York, NY", "Earth", "", "",
+]
+
+
+# Real place names first, then spelling variants of them, like users type them
+SYNTHETIC_CITIES = [
+    "İstanbul, Türkiye", "London", "New York, NY", "Ankara", "Berlin, Germany", "Paris, France",
+    "Los Angeles, CA", "izmir", "Madrid", "Tokyo", "istanbul", "London, UK", "Earth",
+    "NYC", "Ankara, Türkiye", "berlin", "İzmir, Türkiye", "Worldwide",
+]
+
+SYNTHETIC_WORDS = [
+    "today", "again", "finally", "honestly", "tonight", "live", "update", "thread",
+    "breaking", "wow", "really", "everyone", "watch", "news", "now", "big",
+    "week", "team", "fans", "story", "vote", "moment", "city", "world",
+    "game", "music", "match", "happy", "late", "early", "first", "last",
+]
+
+
+def build_user_result(user):
+    """
+    Build a raw API user object from a processed user dictionary.
+    
+    Args:
+        user (dict): User data in the shape produced by TwitterService
+        
+    Returns:
+        dict: User object as returned inside 'user_results'
+    """
+    return {
+        '__typename': 'User',
+        'rest_id': user['id'],
+        'is_blue_verified': False,
+        'legacy': {
+            'screen_name': user['username'],
+            'name': user.get('display_name', ''),
+            'profile_image_url_https': user.get('profile_image_url', ''),
+            'followers_count': user.get('followers_count', 0),
+            'friends_count': user.get('following_count', 0),
+            'statuses_count': user.get('tweet_count', 0),
+            'location': user.get('location', ''),
+            'created_at': user['account_created_at'].strftime(TWITTER_DATE_FORMAT),
+            'verified': user.get('is_verified', False)
+        }
+    }
+
+
+def build_tweet_result(tweet):
+    """
+    Build a raw API tweet object from a processed tweet dictionary.
+    
+    Args:
+        tweet (dict): Tweet data in the shape produced by TwitterService
+        
+    Returns:
+        dict: Tweet object as returned inside 'tweet_results'
+    """
+    legacy = {
+        'full_text': tweet['content'],
+        'retweet_count': tweet.get('retweet_count', 0),
+        'favorite_count': tweet.get('like_count', 0),
+        'reply_count': tweet.get('reply_count', 0),
+        'created_at': tweet['created_at'].strftime(TWITTER_DATE_FORMAT),
+        'user_id_str': tweet['user_id'],
+        'in_reply_to_status_id_str': tweet.get('in_reply_to', ''),
+        'entities': {}
+    }
+    if tweet.get('is_retweet'):
+        legacy['retweeted_status_result'] = {}
+    if tweet.get('has_media'):
+        legacy['entities']['media'] = [{'type': 'photo'}]
+    
+    return {
+        '__typename': 'Tweet',
+        'rest_id': tweet['id'],
+        'legacy': legacy
+    }
+
+
+def build_search_response(items, top_cursor='', bottom_cursor=''):
+    """
+    Build a raw 'Twitter/search_twitter' response.
+    
+    Args:
+        items (list): List of (tweet, user) dictionary pairs
+        top_cursor (str): Cursor for newer results
+        bottom_cursor (str): Cursor for older results, empty on the last page
+        
+    Returns:
+        dict: Response in the shape TwitterService._process_search_results expects
+    """
+    entries = []
+    for tweet, user in items:
+        entries.append({
+            'entryId': f"tweet-{tweet['id']}",
+            'content': {
+                'entryType': 'TimelineTimelineItem',
+                'items': [{
+                    'item': {
+                        'itemContent': {
+                            'itemType': 'TimelineTweet',
+                            'user_results': {'result': build_user_result(user)},
+                            'tweet_results': {'result': build_tweet_result(tweet)}
+                        }
+                    }
+                }]
+            }
+        })
+    
+    return {
+        'cursor': {'top': top_cursor, 'bottom': bottom_cursor},
+        'result': {
+            'timeline': {
+                'instructions': [{'type': 'TimelineAddEntries', 'entries': entries}]
+            }
+        }
+    }
+
+
+class SimpleDataset:
+    def __init__(self, total_tweets=1000, user_count=100, seed=0):
+        """
+        Initialize a small deterministic dataset of tweets and users.
+        
+        Args:
+            total_tweets (int): Number of tweets in the dataset
+            user_count (int): Number of distinct users
+            seed (int): Seed for the random generator
+        """
+        self.total_tweets = total_tweets
+        self.user_count = user_count
+        self.seed = seed
+        self.start_time = datetime(2025, 4, 1, 12, 0, 0)
+    
+    def __len__(self):
+        return self.total_tweets
+    
+    def item(self, index, hashtag):
+        """
+        Get the tweet at a position in the timeline and its author.
+        
+        Args:
+            index (int): Position in the timeline, 0 being the newest tweet
+            hashtag (str): Hashtag that was searched
+            
+        Returns:
+            tuple: (tweet, user) dictionaries
+        """
+        rng = random.Random(self.seed * 1000003 + index)
+        user_index = index % self.user_count
+        user_rng = random.Random(self.seed * 1000003 - user_index - 1)
+        
+        user = {
+            'id': str(1000 + user_index),
+            'username': f"user{user_index}",
+            'display_name': f"User {user_index}",
+            'followers_count': user_rng.randint(0, 50000),
+            'following_count': user_rng.randint(0, 2000),
+            'tweet_count': user_rng.randint(1, 20000),
+            'location': user_rng.choice(SAMPLE_LOCATIONS),
+            'account_created_at': datetime(2015, 1, 1) + timedelta(days=user_rng.randint(0, 3000))
+        }
+        tweet = {
+            'id': str(1900000000000000000 - index),
+            'user_id': user['id'],
+            'content': rng.choice(SAMPLE_TEXTS).format(tag=hashtag),
+            'created_at': self.start_time - timedelta(seconds=index * 30),
+            'retweet_count': rng.randint(0, 100),
+            'like_count': rng.randint(0, 500),
+            'reply_count': rng.randint(0, 20),
+            'is_retweet': rng.random() < 0.4,
+            'has_media': rng.random() < 0.1,
+            'in_reply_to': '1' if rng.random() < 0.1 else ''
+        }
+        return tweet, user
+
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix(seed, index, stream):
+    """
+    Hash a seed, an index and a stream number to 64 random-looking bits.
+    
+    A splitmix64 finalizer, so any index can be generated on its own
+    without replaying a random generator up to it.
+    """
+    x = (seed * 0x9E3779B97F4A7C15 + index * 0xBF58476D1CE4E5B9 + stream * 0x94D049BB133111EB) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def _uniform(seed, index, stream):
+    """Deterministic uniform number in [0, 1) for an index and stream."""
+    return _mix(seed, index, stream) / 18446744073709551616.0
+
+
+class ZipfTable:
+    def __init__(self, size, exponent):
+        """
+        Initialize a sampler of ranks with Zipfian probabilities.
+        
+        Rank k (0 based) is drawn with probability proportional to
+        1 / (k + 1) ** exponent.
+        
+        Args:
+            size (int): Number of ranks
+            exponent (float): Skew, larger values favor the first ranks more
+        """
+        self.size = size
+        self.cumulative = list(itertools.accumulate((rank + 1) ** -exponent for rank in range(size)))
+        self.total = self.cumulative[-1]
+    
+    def sample(self, u):
+        """Map a uniform number in [0, 1) to a rank."""
+        return min(bisect.bisect_right(self.cumulative, u * self.total), self.size - 1)
+    
+    def share(self, ranks):
+        """Get the probability of drawing one of the first ranks."""
+        return self.cumulative[min(ranks, self.size) - 1] / self.total
+
+
+class SyntheticDataset:
+    def __init__(self, total_tweets=1000000, user_count=50000, seed=0, user_skew=0.9, retweet_ratio=0.3,
+                 viral_texts=2000, location_count=20000, unlocated_ratio=0.3, tweets_per_minute=60.0,
+                 burst_chance=0.05, burst_factor=20.0, block_size=100):
+        """
+        Initialize a large synthetic timeline with realistic distributions.
+        
+        Authors are drawn from a Zipfian distribution, so a few users post
+        most tweets and follower counts fall with the rank. A share of
+        the tweets are retweets of a Zipfian pool of viral texts and
+        repeat them word for word. User locations have a head of real
+        cities and spelling variants and a long tail of places the fake
+        Nominatim server resolves, and some users have none. Posting
+        alternates between calm stretches and bursts.
+        
+        Every tweet is computed from the seed and its index alone, so
+        pages can be served in any order and a million tweets never
+        have to be held in memory.
+        
+        Args:
+            total_tweets (int): Number of tweets in the dataset
+            user_count (int): Number of distinct users
+            seed (int): Seed for every random choice
+            user_skew (float): Zipf exponent of tweets per user
+            retweet_ratio (float): Share of tweets that are retweets of viral texts
+            viral_texts (int): Number of distinct texts that get retweeted
+            location_count (int): Number of distinct locations
+            unlocated_ratio (float): Share of users without a location
+            tweets_per_minute (float): Average posting rate outside of bursts
+            burst_chance (float): Chance that a calm stretch of tweets turns into a burst
+            burst_factor (float): How many times faster tweets are posted during a burst
+            block_size (int): Tweets posted at one rate before it can change
+        """
+        self.total_tweets = total_tweets
+        self.user_count = user_count
+        self.seed = seed
+        self.retweet_ratio = retweet_ratio
+        self.location_count = location_count
+        self.unlocated_ratio = unlocated_ratio
+        self.block_size = block_size
+        self.start_time = datetime(2025, 4, 1, 12, 0, 0)
+        
+        self.users = ZipfTable(user_count, user_skew)
+        self.viral = ZipfTable(viral_texts, 1.0)
+        self.locations = ZipfTable(location_count, 1.2)
+        self._user_cache = {}
+        
+        # Seconds from the newest tweet back to the start of each block of
+        # the timeline, and whether the block is a burst
+        self.block_offsets = [0.0]
+        self.block_bursts = []
+        calm_seconds = block_size * 60.0 / tweets_per_minute
+        burst = False
+        for block in range((total_tweets + block_size - 1) // block_size):
+            chance = 0.6 if burst else burst_chance
+            burst = _uniform(seed, block, 20) < chance
+            seconds = calm_seconds / (burst_factor if burst else 1.0) * (0.5 + _uniform(seed, block, 21))
+            self.block_bursts.append(burst)
+            self.block_offsets.append(self.block_offsets[-1] + seconds)
+    
+    def __len__(self):
+        return self.total_tweets
+    
+    def user(self, rank):
+        """
+        Get the user at a popularity rank.
+        
+        Args:
+            rank (int): 0 for the user posting the most tweets
+            
+        Returns:
+            dict: User dictionary
+        """
+        user = self._user_cache.get(rank)
+        if user is not None:
+            return user
+        
+        seed = self.seed
+        if _uniform(seed, rank, 32) < self.unlocated_ratio:
+            location = ''
+        else:
+            location = self.location(self.locations.sample(_uniform(seed, rank, 33)))
+        
+        # Prolific users tend to be the widely followed ones
+        reach = (rank + 1) ** -0.8
+        user = {
+            'id': str(1000 + rank),
+            'username': f"user{rank}",
+            'display_name': f"User {rank}",
+            'followers_count': int(1000000 * reach * (0.2 + _uniform(seed, rank, 34))),
+            'following_count': int(2000 * _uniform(seed, rank, 35)),
+            'tweet_count': 1 + int(50000 * reach ** 0.5 * _uniform(seed, rank, 36)),
+            'location': location,
+            'account_created_at': datetime(2010, 1, 1) + timedelta(days=int(5000 * _uniform(seed, rank, 37))),
+            'is_verified': rank < 20
+        }
+        self._user_cache[rank] = user
+        return user
+    
+    def location(self, rank):
+        """Get the location text at a popularity rank."""
+        if rank < len(SYNTHETIC_CITIES):
+            return SYNTHETIC_CITIES[rank]
+        return f"Place {rank}, Region {rank % 97}"
+    
+    def _text(self, number, stream, hashtag):
+        """Compose a tweet text from a template and a few words."""
+        seed = self.seed
+        template = SAMPLE_TEXTS[_mix(seed, number, stream) % len(SAMPLE_TEXTS)]
+        words = ' '.join(
+            SYNTHETIC_WORDS[_mix(seed, number, stream + offset) % len(SYNTHETIC_WORDS)]
+            for offset in range(1, 6)
+        )
+        return f"{template.format(tag=hashtag)} {words}"
+    
+    def viral_text(self, number, hashtag):
+        """
+        Get a text of the viral pool as it appears in its retweets.
+        
+        Args:
+            number (int): Position in the pool, 0 being the most retweeted
+            hashtag (str): Hashtag that was searched
+            
+        Returns:
+            str: Retweet text, the same for every retweet of it
+        """
+        author = self.user(self.users.sample(_uniform(self.seed, number, 40)))
+        return f"RT @{author['username']}: {self._text(number, 41, hashtag)}"
+    
+    def created_at(self, index):
+        """Get when the tweet at a position in the timeline was posted."""
+        block, position = divmod(index, self.block_size)
+        start = self.block_offsets[block]
+        seconds = start + (self.block_offsets[block + 1] - start) * position / self.block_size
+        return self.start_time - timedelta(seconds=int(seconds))
+    
+    def item(self, index, hashtag):
+        """
+        Get the tweet at a position in the timeline and its author.
+        
+        Args:
+            index (int): Position in the timeline, 0 being the newest tweet
+            hashtag (str): Hashtag that was searched
+            
+        Returns:
+            tuple: (tweet, user) dictionaries
+        """
+        seed = self.seed
+        user = self.user(self.users.sample(_uniform(seed, index, 1)))
+        is_retweet = _uniform(seed, index, 2) < self.retweet_ratio
+        if is_retweet:
+            viral = self.viral.sample(_uniform(seed, index, 3))
+            content = self.viral_text(viral, hashtag)
+            retweet_count = int(5000 / (viral + 1)) + 1
+        else:
+            content = self._text(index, 10, hashtag)
+            retweet_count = int(user['followers_count'] * 0.001 * _uniform(seed, index, 4))
+        
+        replied = _uniform(seed, index, 6)
+        tweet = {
+            'id': str(1900000000000000000 - index),
+            'user_id': user['id'],
+            'content': content,
+            'created_at': self.created_at(index),
+            'retweet_count': retweet_count,
+            'like_count': int(retweet_count * 3 * _uniform(seed, index, 5)),
+            'reply_count': int(replied * 20),
+            'is_retweet': is_retweet,
+            'has_media': _uniform(seed, index, 7) < 0.15,
+            'in_reply_to': str(1900000000000000000 - index - 1 - int(replied * 1000)) if replied < 0.1 else ''
+        }
+        return tweet, user
+    
+    def describe(self):
+        """
+        Get the shape of the generated distributions.
+        
+        Returns:
+            dict: Expected share of tweets by the top 1% of users, retweet
+                ratio, number of bursty blocks and the time span in seconds
+        """
+        return {
+            'tweets': self.total_tweets,
+            'users': self.user_count,
+            'top_1pct_user_share': self.users.share(max(1, self.user_count // 100)),
+            'retweet_ratio': self.retweet_ratio,
+            'burst_blocks': sum(self.block_bursts),
+            'blocks': len(self.block_bursts),
+            'span_seconds': self.block_offsets[-1]
+        }
+
+
+class FakeApiClient:
+    def __init__(self, dataset=None, latency=0.0, jitter=0.0, seed=0):
+        """
+        Initialize an offline stand-in for the data API client.
+        
+        Pages are served from a dataset by offset, so any cursor can be
+        requested at any time, and each call sleeps to simulate the
+        network round trip.
+        
+        Args:
+            dataset: Object with __len__ and item(index, hashtag), defaults to SimpleDataset
+            latency (float): Seconds each call waits before answering
+            jitter (float): Maximum extra random seconds added to the latency
+            seed (int): Seed for the jitter
+        """
+        self.dataset = dataset if dataset is not None else SimpleDataset(seed=seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.calls = 0
+    
+    def call_api(self, api, query=None):
+        """
+        Answer an API call like ApiClient.call_api.
+        
+        Args:
+            api (str): API name, e.g. 'Twitter/search_twitter'
+            query (dict): Query parameters
+            
+        Returns:
+            dict: Raw API response
+        """
+        self.calls += 1
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        
+        query = query or {}
+        if api == 'Twitter/search_twitter':
+            return self._search(query)
+        return {}
+    
+    def _search(self, query):
+        """Serve one page of search results starting at the cursor's offset."""
+        hashtag = query.get('query', '')
+        count = int(query.get('count') or 20)
+        cursor = query.get('cursor') or ''
+        offset = int(cursor.split(':', 1)[1]) if cursor.startswith('offset:') else 0
+        
+        end = min(offset + count, len(self.dataset))
+        items = [self.dataset.item(index, hashtag) for index in range(offset, end)]
+        bottom_cursor = f"offset:{end}" if end < len(self.dataset) else ''
+        
+        return build_search_response(items, top_cursor='offset:0', bottom_cursor=bottom_cursor)
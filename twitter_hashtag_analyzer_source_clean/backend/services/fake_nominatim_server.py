@@ -0,0 +1,125 @@
+import re
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+PLACE_PATTERN = re.compile(r'place\s+(\d+)', re.IGNORECASE)
+
+
+def fake_place(query):
+    """
+    Answer a search query like Nominatim would, deterministically.
+    
+    Queries containing "place <number>" resolve to made-up coordinates
+    derived from the number; everything else is unknown.
+    
+    Args:
+        query (str): Search text
+        
+    Returns:
+        list: Nominatim search results, empty for unknown places
+    """
+    match = PLACE_PATTERN.search(query)
+    if not match:
+        return []
+    
+    number = int(match.group(1))
+    return [{
+        "lat": str(-60 + (number * 7919) % 12000 / 100),
+        "lon": str(-180 + (number * 104729) % 36000 / 100),
+        "display_name": f"Place {number}",
+        "address": {"city": f"Place {number}", "country": "Fakeland"}
+    }]
+
+
+class FakeNominatimServer:
+    def __init__(self, latency=0.0, resolve=fake_place):
+        """
+        Initialize a local stand-in for the Nominatim search endpoint.
+        
+        The server listens on a free localhost port, answers /search
+        with the resolve function and records how many requests it got,
+        when they arrived and how many were handled at the same time.
+        
+        Args:
+            latency (float): Seconds each request waits before answering
+            resolve (callable): Takes the query text and returns search results
+        """
+        self.latency = latency
+        self.resolve = resolve
+        self.requests = 0
+        self.queries = []
+        self.request_times = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+    
+    @property
+    def url(self):
+        """Search endpoint URL of the running server."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/search"
+    
+    def _handler_class(self):
+        """Build the request handler bound to this server's state."""
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                if parts.path != '/search':
+                    self.send_error(404)
+                    return
+                
+                query = parse_qs(parts.query).get('q', [''])[0]
+                with server._lock:
+                    server.requests += 1
+                    server.queries.append(query)
+                    server.request_times.append(time.monotonic())
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                try:
+                    if server.latency:
+                        time.sleep(server.latency)
+                    body = json.dumps(server.resolve(query)).encode('utf-8')
+                finally:
+                    with server._lock:
+                        server.active -= 1
+                
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    def start(self):
+        """Start serving on a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-nominatim', daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """Stop the server and release its port."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,464 @@
+import os
+import mmap
+import bisect
+import struct
+import tempfile
+import threading
+
+from services.location_text import normalize_location
+
+DEFAULT_GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                      'data', 'gazetteer.tsv')
+
+# GeoNames dump columns, see https://download.geonames.org/export/dump/readme.txt
+NAME, ASCIINAME, ALTERNATENAMES, LATITUDE, LONGITUDE = 1, 2, 3, 4, 5
+FEATURE_CLASS, FEATURE_CODE, COUNTRY_CODE, POPULATION = 6, 7, 8, 14
+
+COUNTRY_FEATURE_CODES = (b'PCLI', b'PCLD', b'PCLF', b'PCLS', b'PCLIX', b'PCL')
+
+# Name index file: header, country names, then the positions of the sorted
+# 'name\toffset' records followed by the records themselves
+INDEX_MAGIC = b'GZINDEX1'
+# Magic, size and modification time of the indexed gazetteer, number of records,
+# number of distinct names and length of the country names
+INDEX_HEADER = struct.Struct('<8sQqQQQ')
+INDEX_POSITION = struct.Struct('<Q')
+
+
+def _trigrams(key):
+    """Get the character trigrams of a key, padded so word edges count."""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _similarity(first, second):
+    """Dice coefficient of two keys' trigrams, 1 for the same key."""
+    first, second = _trigrams(first), _trigrams(second)
+    return 2 * len(first & second) / (len(first) + len(second))
+
+
+class _IndexRecords:
+    def __init__(self, data, positions_start, count):
+        """
+        Initialize a view of the sorted records of a name index.
+        
+        Indexing yields the encoded name of a record, so the bisect
+        module can search the records where they are mapped.
+        
+        Args:
+            data (mmap.mmap): Index file contents
+            positions_start (int): Offset of the record positions
+            count (int): Number of records
+        """
+        self.data = data
+        self.positions_start = positions_start
+        self.count = count
+    
+    def __len__(self):
+        return self.count
+    
+    def __getitem__(self, i):
+        start = INDEX_POSITION.unpack_from(self.data, self.positions_start + i * INDEX_POSITION.size)[0]
+        return self.data[start:self.data.find(b'\t', start)]
+    
+    def record(self, i):
+        """Get the encoded name and row offset of a record."""
+        start = INDEX_POSITION.unpack_from(self.data, self.positions_start + i * INDEX_POSITION.size)[0]
+        tab = self.data.find(b'\t', start)
+        end = self.data.find(b'\n', tab)
+        return self.data[start:tab], int(self.data[tab + 1:end])
+
+
+class Gazetteer:
+    def __init__(self, path=DEFAULT_GAZETTEER_FILE, fuzzy_threshold=0.6, min_fuzzy_length=4, index_path=None):
+        """
+        Initialize an offline geocoder over a GeoNames-style file.
+        
+        Names are found in a sorted index of the normalized names, ASCII
+        names and alternate names of every row with the row's line
+        offset. The gazetteer and its index are memory-mapped and the
+        index is bisected, so a lookup only reads the records and rows
+        it returns. The index is saved next to the gazetteer; the first
+        lookup builds it in one pass over the file if it is missing or
+        was built from another version of the file, and keeps it in
+        memory if it can't be saved. Fuzzy matching still holds a
+        trigram index of every name in memory, built on its first use.
+        Lines starting with '#' are skipped.
+        
+        Args:
+            path (str): Path to a tab separated GeoNames dump file
+            fuzzy_threshold (float): Smallest trigram similarity accepted for a misspelled name
+            min_fuzzy_length (int): Shortest text that is matched fuzzily
+            index_path (str): Path of the name index, the gazetteer's path with '.idx' appended by default
+        """
+        self.path = path
+        self.index_path = index_path or f"{path}.idx"
+        self.fuzzy_threshold = fuzzy_threshold
+        self.min_fuzzy_length = min_fuzzy_length
+        
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        
+        self._lock = threading.Lock()
+        self._index = None
+        self._records = None
+        self._name_count = 0
+        self._countries = None
+        self._trigram_index = None
+        self._trigram_counts = None
+    
+    def _ensure_index(self):
+        """Open the name index on first use, building it if needed."""
+        if self._records is not None:
+            return
+        
+        with self._lock:
+            if self._records is not None:
+                return
+            
+            index = self._open_index()
+            if index is None:
+                index = self._save_index(self._build_index())
+            
+            _, _, _, record_count, name_count, countries_length = INDEX_HEADER.unpack_from(index)
+            countries_start = INDEX_HEADER.size
+            countries = {}
+            for line in index[countries_start:countries_start + countries_length].decode('utf-8').splitlines():
+                code, name = line.split('\t', 1)
+                countries[code] = name
+            
+            self._index = index
+            self._countries = countries
+            self._name_count = name_count
+            self._records = _IndexRecords(index, countries_start + countries_length, record_count)
+    
+    def _open_index(self):
+        """Map the saved name index, None if it is missing or not built from the current file."""
+        try:
+            source = os.stat(self.path)
+            with open(self.index_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < INDEX_HEADER.size:
+                    return None
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            return None
+        
+        magic, size, mtime, record_count, _, countries_length = INDEX_HEADER.unpack_from(index)
+        positions_end = INDEX_HEADER.size + countries_length + record_count * INDEX_POSITION.size
+        if magic != INDEX_MAGIC or (size, mtime) != (source.st_size, source.st_mtime_ns) or len(index) < positions_end:
+            index.close()
+            return None
+        return index
+    
+    def _build_index(self):
+        """
+        Index the names of every row in one pass over the gazetteer.
+        
+        Returns:
+            bytes: Contents of the index file
+        """
+        source = os.stat(self.path)
+        entries = set()
+        countries = {}
+        data = self._data
+        offset = 0
+        while offset < len(data):
+            end = data.find(b'\n', offset)
+            if end == -1:
+                end = len(data)
+            line = data[offset:end]
+            
+            if line and not line.startswith(b'#'):
+                fields = line.split(b'\t', COUNTRY_CODE + 1)
+                if len(fields) > COUNTRY_CODE:
+                    spellings = {fields[NAME], fields[ASCIINAME]}
+                    spellings.update(fields[ALTERNATENAMES].split(b','))
+                    for spelling in spellings:
+                        key = normalize_location(spelling.decode('utf-8'))
+                        if key:
+                            entries.add((key.encode('utf-8'), offset))
+                    
+                    if fields[FEATURE_CODE] in COUNTRY_FEATURE_CODES:
+                        countries[fields[COUNTRY_CODE].decode('ascii')] = fields[NAME].decode('utf-8')
+            
+            offset = end + 1
+        
+        # UTF-8 keeps the code point order of names, so sorted bytes bisect like sorted strings
+        entries = sorted(entries)
+        country_names = ''.join(f"{code}\t{name}\n" for code, name in sorted(countries.items())).encode('utf-8')
+        records = [key + b'\t' + str(offset).encode('ascii') + b'\n' for key, offset in entries]
+        
+        position = INDEX_HEADER.size + len(country_names) + len(records) * INDEX_POSITION.size
+        positions = []
+        for record in records:
+            positions.append(position)
+            position += len(record)
+        
+        header = INDEX_HEADER.pack(INDEX_MAGIC, source.st_size, source.st_mtime_ns, len(records),
+                                   len({key for key, _ in entries}), len(country_names))
+        return b''.join([header, country_names, struct.pack(f'<{len(positions)}Q', *positions)] + records)
+    
+    def _save_index(self, index):
+        """Save a built name index and map it, or keep it in memory if it can't be saved."""
+        try:
+            # Readers see either no index or the complete one
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.index_path)), suffix='.tmp')
+        except OSError as e:
+            print(f"Error writing gazetteer index {self.index_path}: {str(e)}")
+            return index
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(index)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            print(f"Error writing gazetteer index {self.index_path}: {str(e)}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return index
+        return self._open_index() or index
+    
+    def _names(self):
+        """Iterate over the distinct normalized names in sorted order."""
+        previous = None
+        for i in range(len(self._records)):
+            name = self._records[i]
+            if name != previous:
+                previous = name
+                yield name.decode('utf-8')
+    
+    def _offsets(self, key):
+        """Get the line offsets of the rows with a normalized name."""
+        self._ensure_index()
+        records = self._records
+        encoded = key.encode('utf-8')
+        offsets = []
+        i = bisect.bisect_left(records, encoded)
+        while i < len(records):
+            name, offset = records.record(i)
+            if name != encoded:
+                break
+            offsets.append(offset)
+            i += 1
+        return offsets
+    
+    def _ensure_trigram_index(self):
+        """Build the trigram index used for fuzzy matching on first use."""
+        self._ensure_index()
+        if self._trigram_index is not None:
+            return
+        
+        with self._lock:
+            if self._trigram_index is None:
+                index = {}
+                counts = {}
+                for key in self._names():
+                    trigrams = _trigrams(key)
+                    counts[key] = len(trigrams)
+                    for trigram in trigrams:
+                        index.setdefault(trigram, []).append(key)
+                self._trigram_counts = counts
+                self._trigram_index = index
+    
+    def __len__(self):
+        self._ensure_index()
+        return self._name_count
+    
+    def _row(self, offset):
+        """Parse the row starting at a line offset."""
+        end = self._data.find(b'\n', offset)
+        line = self._data[offset:end if end != -1 else len(self._data)]
+        fields = line.decode('utf-8').rstrip('\r').split('\t')
+        
+        try:
+            population = int(fields[POPULATION] or 0) if len(fields) > POPULATION else 0
+        except ValueError:
+            population = 0
+        
+        return {
+            'name': fields[NAME],
+            'latitude': float(fields[LATITUDE]),
+            'longitude': float(fields[LONGITUDE]),
+            'feature_class': fields[FEATURE_CLASS],
+            'feature_code': fields[FEATURE_CODE],
+            'country_code': fields[COUNTRY_CODE],
+            'population': population
+        }
+    
+    def exact(self, key):
+        """
+        Find the rows with a normalized name.
+        
+        Args:
+            key (str): Normalized location text
+            
+        Returns:
+            list: Matching rows
+        """
+        return [self._row(offset) for offset in self._offsets(key)]
+    
+    def prefix(self, key, limit=20, min_similarity=0.0):
+        """
+        Find the rows whose normalized name starts with a text.
+        
+        Args:
+            key (str): Normalized start of a name
+            limit (int): Maximum number of names returned
+            min_similarity (float): Smallest trigram similarity between the text
+                and a name, so a short text doesn't match much longer names
+            
+        Returns:
+            list: Matching rows
+        """
+        self._ensure_index()
+        records = self._records
+        encoded = key.encode('utf-8')
+        rows = []
+        names = 0
+        previous = None
+        i = bisect.bisect_left(records, encoded)
+        while i < len(records):
+            name, offset = records.record(i)
+            i += 1
+            if not name.startswith(encoded):
+                break
+            if name != previous:
+                previous = name
+                names += 1
+                if names > limit:
+                    break
+                similar = not min_similarity or _similarity(key, name.decode('utf-8')) >= min_similarity
+            if similar:
+                rows.append(self._row(offset))
+        return rows
+    
+    def fuzzy(self, key):
+        """
+        Find the rows whose normalized name is most similar to a text.
+        
+        Similarity is the Dice coefficient of the two names' character
+        trigrams, so small misspellings like "istambul" still match.
+        
+        Args:
+            key (str): Normalized location text
+            
+        Returns:
+            list: Rows of the most similar name, empty if none reaches the threshold
+        """
+        if len(key) < self.min_fuzzy_length:
+            return []
+        
+        self._ensure_trigram_index()
+        query = _trigrams(key)
+        shared = {}
+        for trigram in query:
+            for name in self._trigram_index.get(trigram, ()):
+                shared[name] = shared.get(name, 0) + 1
+        
+        best_name = None
+        best_score = self.fuzzy_threshold
+        for name, count in shared.items():
+            score = 2 * count / (len(query) + self._trigram_counts[name])
+            if score >= best_score and (best_name is None or score > best_score):
+                best_name, best_score = name, score
+        
+        return self.exact(best_name) if best_name else []
+    
+    def lookup(self, location_text):
+        """
+        Geocode a location text offline.
+        
+        The text before the first comma is looked up as a whole name,
+        then as the longest known run of its words. Countries named after
+        a comma or next to the place ("Berlin, Germany", "Ankara Turkey")
+        pick between same-named places and rule out matches in other
+        countries; the most populous candidate wins otherwise. Any other
+        qualifier ("Paris, TX") can't be checked offline, so the text is
+        left to Nominatim rather than matched to a homonym. Only bare
+        names are matched by prefix or fuzzily.
+        
+        Args:
+            location_text (str): Location text as written by the user
+            
+        Returns:
+            dict: Location data in GeocodingService's format or None if not found
+        """
+        parts = [normalize_location(part) for part in location_text.split(',')]
+        parts = [part for part in parts if part]
+        if not parts:
+            return None
+        
+        self._ensure_index()
+        place = parts[0]
+        qualifiers = parts[1:]
+        candidates = self.exact(place)
+        if not candidates:
+            candidates, rest = self._longest_span(place)
+            if rest:
+                qualifiers.append(rest)
+        
+        context = set()
+        for qualifier in qualifiers:
+            codes = self._country_codes(qualifier)
+            if not codes:
+                return None
+            context.update(codes)
+        
+        if not candidates and not qualifiers:
+            if len(place) >= self.min_fuzzy_length:
+                candidates = self.prefix(place, min_similarity=self.fuzzy_threshold)
+            if not candidates:
+                candidates = self.fuzzy(place)
+        
+        if context:
+            candidates = [row for row in candidates if row['country_code'] in context]
+        if not candidates:
+            return None
+        
+        best = max(candidates, key=lambda row: (row['feature_class'] == 'P', row['population']))
+        return {
+            "latitude": best['latitude'],
+            "longitude": best['longitude'],
+            "country": self._countries.get(best['country_code'], best['country_code']),
+            "city": best['name'] if best['feature_class'] == 'P' else ""
+        }
+    
+    def _longest_span(self, key):
+        """
+        Find the longest run of words in a text that is a known name.
+        
+        Args:
+            key (str): Normalized location text
+            
+        Returns:
+            tuple: (matching rows, the remaining words), or ([], '') if no run matches
+        """
+        words = key.split()
+        for length in range(len(words) - 1, 0, -1):
+            for start in range(len(words) - length + 1):
+                span = ' '.join(words[start:start + length])
+                # Two letter codes are too ambiguous inside longer text
+                offsets = self._offsets(span) if len(span) >= 3 else []
+                if not offsets:
+                    continue
+                rest = ' '.join(words[:start] + words[start + length:])
+                return [self._row(offset) for offset in offsets], rest
+        return [], ''
+    
+    def _country_codes(self, key):
+        """Get the codes of the countries a normalized text names."""
+        if not key:
+            return set()
+        return {
+            row['country_code']
+            for row in self.exact(key)
+            if row['feature_code'].encode('ascii') in COUNTRY_FEATURE_CODES
+        }
+    
+    def close(self):
+        """Unmap the file and its index."""
+        for data in (self._data, self._index):
+            if isinstance(data, mmap.mmap):
+                data.close()
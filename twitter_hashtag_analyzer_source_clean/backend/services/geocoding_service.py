@@ -1,30 +1,37 @@
-import requests
-import json
-import time
+import os
+from collections import Counter
+
+from services.async_geocoder import AsyncGeocoder, NOMINATIM_URL
+from services.location_cache import LocationCache
+from services.location_text import normalize_location
+from services.gazetteer import Gazetteer, DEFAULT_GAZETTEER_FILE
 
 class GeocodingService:
-    def __init__(self, cache_file='location_cache.json'):
+    def __init__(self, cache_file='location_cache.db', legacy_cache_file='location_cache.json',
+                 negative_ttl=7 * 24 * 3600, gazetteer_file=DEFAULT_GAZETTEER_FILE,
+                 endpoint=NOMINATIM_URL, concurrency=4, rate_limits=None):
         """
         Initialize the geocoding service.
         
         Args:
-            cache_file (str): Path to the location cache file
+            cache_file (str): Path to the SQLite location cache file
+            legacy_cache_file (str): Path to the old JSON cache, imported once if present
+            negative_ttl (float): Seconds to remember that a location could not be geocoded
+            gazetteer_file (str): GeoNames-style file tried before Nominatim, None to always
+                use the network
+            endpoint (str): Nominatim-compatible search URL
+            concurrency (int): Maximum number of network lookups in flight
+            rate_limits (dict): Host to (requests per second, burst) overrides for
+                the endpoint's rate limiter
         """
         self.cache_file = cache_file
-        self.cache = self._load_cache()
-    
-    def _load_cache(self):
-        """Load the location cache from file."""
-        try:
-            with open(self.cache_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
-    
-    def _save_cache(self):
-        """Save the location cache to file."""
-        with open(self.cache_file, 'w') as f:
-            json.dump(self.cache, f)
+        self.cache = LocationCache(cache_file, legacy_json=legacy_cache_file, key_func=normalize_location)
+        self.negative_ttl = negative_ttl
+        self.gazetteer = None
+        if gazetteer_file and os.path.exists(gazetteer_file):
+            self.gazetteer = Gazetteer(gazetteer_file)
+        self.remote = AsyncGeocoder(endpoint, concurrency=concurrency, rate_limits=rate_limits)
+        self.last_batch_stats = None
     
     def geocode(self, location_text):
         """
@@ -36,63 +43,86 @@ class GeocodingService:
         Returns:
             dict: Location data with coordinates or None if geocoding failed
         """
+        return self._geocode(location_text)[0]
+    
+    def _geocode(self, location_text):
+        """
+        Geocode a location text, reporting where the answer came from.
+        
+        Args:
+            location_text (str): Location text to geocode
+            
+        Returns:
+            tuple: (location data or None, 'hit', 'negative_hit', 'gazetteer', 'miss' or 'skipped')
+        """
         if not location_text or location_text.strip() == '':
-            return None
+            return None, 'skipped'
         
-        # Check cache first
-        if location_text in self.cache:
-            return self.cache[location_text]
+        key = normalize_location(location_text)
+        if not key:
+            # Nothing but emoji or punctuation
+            return None, 'skipped'
         
-        # Use OpenStreetMap Nominatim API for geocoding
-        try:
-            # Add a small delay to respect rate limits
-            time.sleep(1)
-            
-            url = "https://nominatim.openstreetmap.org/search"
-            params = {
-                "q": location_text,
-                "format": "json",
-                "limit": 1,
-                "addressdetails": 1
-            }
-            headers = {
-                "User-Agent": "TwitterHashtagAnalyzer/1.0"
-            }
-            
-            response = requests.get(url, params=params, headers=headers)
+        offline = self._geocode_offline(location_text, key)
+        if offline is not None:
+            return offline
+        
+        return self._store(key, *self.remote.fetch(location_text)), 'miss'
+    
+    def _geocode_offline(self, location_text, key):
+        """
+        Answer a location from the cache or the gazetteer.
+        
+        Args:
+            location_text (str): Location text as written by the user
+            key (str): Normalized cache key
             
-            if response.status_code == 200:
-                data = response.json()
-                
-                if data and len(data) > 0:
-                    result = data[0]
-                    
-                    # Extract location data
-                    location_data = {
-                        "latitude": float(result["lat"]),
-                        "longitude": float(result["lon"]),
-                        "country": result.get("address", {}).get("country", ""),
-                        "city": result.get("address", {}).get("city", "") or 
-                               result.get("address", {}).get("town", "") or 
-                               result.get("address", {}).get("village", "")
-                    }
-                    
-                    # Cache the result
-                    self.cache[location_text] = location_data
-                    self._save_cache()
-                    
-                    return location_data
-        
-        except Exception as e:
-            print(f"Error geocoding location '{location_text}': {str(e)}")
-        
-        # Return None if geocoding failed
+        Returns:
+            tuple: (location data or None, 'hit', 'negative_hit' or 'gazetteer'),
+                None if the network has to be asked
+        """
+        # Check cache first
+        found, cached = self.cache.lookup(key)
+        if found:
+            return cached, 'hit' if cached is not None else 'negative_hit'
+        
+        # Plain city and country names are answered offline, without the rate limited API
+        if self.gazetteer is not None:
+            location_data = self.gazetteer.lookup(location_text)
+            if location_data:
+                return location_data, 'gazetteer'
+        
         return None
     
+    def _store(self, key, location_data, status):
+        """
+        Cache a network answer.
+        
+        Args:
+            key (str): Normalized cache key
+            location_data (dict): Location data or None
+            status (str): 'found', 'not_found' or 'error' as returned by AsyncGeocoder
+            
+        Returns:
+            dict: The location data, None if geocoding failed
+        """
+        if status == 'found':
+            self.cache.set(key, location_data)
+        elif status == 'not_found':
+            # Nominatim knows no such place, don't ask again for a while
+            self.cache.set_negative(key, self.negative_ttl)
+        return location_data
+    
     def batch_geocode(self, locations):
         """
         Geocode multiple locations.
         
+        Locations sharing a normalized key are looked up once. Those the
+        cache and gazetteer can't answer are sent to the endpoint
+        concurrently. Cache hit, gazetteer and network counts for the
+        batch are kept in last_batch_stats; repeats of a key already seen
+        in the batch are counted as duplicates, not as cache hits.
+        
         Args:
             locations (list): List of location texts to geocode
             
@@ -100,11 +130,55 @@ class GeocodingService:
             dict: Dictionary mapping location texts to geocoded data
         """
         results = {}
+        by_key = {}
+        pending = {}
+        outcomes = Counter()
         
         for location in locations:
             if not location or location.strip() == '':
                 continue
-                
-            results[location] = self.geocode(location)
+            
+            key = normalize_location(location)
+            if not key:
+                results[location] = None
+                outcomes['skipped'] += 1
+                continue
+            if key in by_key or key in pending:
+                # Same place written differently, answered by its first lookup
+                outcomes['duplicate'] += 1
+                continue
+            
+            offline = self._geocode_offline(location, key)
+            if offline is None:
+                pending[key] = location
+            else:
+                by_key[key] = offline[0]
+                outcomes[offline[1]] += 1
+        
+        # Everything left goes to the network concurrently, within the endpoint's rate limit
+        for key, (location_data, status) in self.remote.geocode_batch(pending).items():
+            by_key[key] = self._store(key, location_data, status)
+            outcomes['miss'] += 1
+        
+        for location in locations:
+            if location and location.strip() and location not in results:
+                results[location] = by_key[normalize_location(location)]
+        
+        lookups = outcomes['hit'] + outcomes['negative_hit'] + outcomes['gazetteer'] + outcomes['miss']
+        self.last_batch_stats = {
+            'locations': sum(outcomes.values()),
+            'hits': outcomes['hit'],
+            'negative_hits': outcomes['negative_hit'],
+            'gazetteer': outcomes['gazetteer'],
+            'misses': outcomes['miss'],
+            'skipped': outcomes['skipped'],
+            'duplicates': outcomes['duplicate'],
+            'hit_rate': (outcomes['hit'] + outcomes['negative_hit']) / lookups if lookups else 0
+        }
         
         return results
+    
+    def close(self):
+        """Close the network client and the cache connection."""
+        self.remote.close()
+        self.cache.close()
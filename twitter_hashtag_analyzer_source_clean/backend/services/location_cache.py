@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+
+class LocationCache:
+    def __init__(self, path='location_cache.db', legacy_json=None, key_func=None):
+        """
+        Initialize the persistent geocoding cache.
+        
+        Entries live in an indexed SQLite table, so each insert is a single
+        row write, lookups only read the rows they need, and several
+        processes can share the file safely. Locations that could not be
+        geocoded are stored as negative entries with an expiry time.
+        
+        Args:
+            path (str): Path to the SQLite cache file
+            legacy_json (str): Path to an old JSON cache to import once
+            key_func (callable): Turns legacy JSON keys into cache keys
+        """
+        self.path = path
+        self._local = threading.local()
+        
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS location_cache (
+                    location_text TEXT PRIMARY KEY,
+                    data TEXT,
+                    expires_at REAL
+                ) WITHOUT ROWID
+                """
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(location_cache)")]
+            if 'expires_at' not in columns:
+                conn.execute("ALTER TABLE location_cache ADD COLUMN expires_at REAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache_migrations (
+                    source TEXT PRIMARY KEY,
+                    migrated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    entry_count INTEGER DEFAULT 0
+                )
+                """
+            )
+        
+        if legacy_json:
+            self.migrate_json(legacy_json, key_func)
+    
+    def _connection(self):
+        """Get this thread's connection to the cache file."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Wait for other processes' writes instead of failing
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+    
+    def lookup(self, location_text):
+        """
+        Look up a cached location, including unexpired negative entries.
+        
+        Args:
+            location_text (str): Location text
+            
+        Returns:
+            tuple: (found, location data), the data being None for a negative entry
+        """
+        row = self._connection().execute(
+            "SELECT data, expires_at FROM location_cache WHERE location_text = ?",
+            (location_text,)
+        ).fetchone()
+        
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return False, None
+        return True, json.loads(row[0]) if row[0] is not None else None
+    
+    def get(self, location_text, default=None):
+        """
+        Look up a cached location.
+        
+        Args:
+            location_text (str): Location text
+            default: Value returned when the location is not cached
+            
+        Returns:
+            dict: Cached location data, None for a negative entry, or the default
+        """
+        found, location_data = self.lookup(location_text)
+        return location_data if found else default
+    
+    def set(self, location_text, location_data):
+        """
+        Store a location in the cache.
+        
+        Args:
+            location_text (str): Location text
+            location_data (dict): Geocoded location data
+        """
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO location_cache (location_text, data, expires_at) VALUES (?, ?, NULL)",
+                (location_text, json.dumps(location_data))
+            )
+    
+    def set_negative(self, location_text, ttl):
+        """
+        Remember that a location could not be geocoded.
+        
+        Args:
+            location_text (str): Location text
+            ttl (float): Seconds before the location is looked up again
+        """
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO location_cache (location_text, data, expires_at) VALUES (?, NULL, ?)",
+                (location_text, time.time() + ttl)
+            )
+    
+    def __contains__(self, location_text):
+        return self.lookup(location_text)[0]
+    
+    def __getitem__(self, location_text):
+        found, location_data = self.lookup(location_text)
+        if not found:
+            raise KeyError(location_text)
+        return location_data
+    
+    def __setitem__(self, location_text, location_data):
+        self.set(location_text, location_data)
+    
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM location_cache").fetchone()[0]
+    
+    def migrate_json(self, json_path, key_func=None):
+        """
+        Import entries from an old JSON cache file once.
+        
+        The JSON file is left in place; its path is recorded so later runs
+        skip it. Entries already in the cache are kept.
+        
+        Args:
+            json_path (str): Path to the JSON cache file
+            key_func (callable): Turns JSON keys into cache keys
+            
+        Returns:
+            int: Number of imported entries, 0 if already migrated or missing
+        """
+        source = os.path.abspath(json_path)
+        conn = self._connection()
+        
+        if conn.execute("SELECT 1 FROM cache_migrations WHERE source = ?", (source,)).fetchone():
+            return 0
+        
+        try:
+            with open(json_path, 'r') as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return 0
+        
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO location_cache (location_text, data) VALUES (?, ?)",
+                (
+                    (key, json.dumps(data))
+                    for key, data in (
+                        (key_func(text) if key_func else text, data)
+                        for text, data in entries.items()
+                    )
+                    if key and data
+                )
+            )
+            conn.execute(
+                "INSERT INTO cache_migrations (source, entry_count) VALUES (?, ?)",
+                (source, len(entries))
+            )
+        
+        return len(entries)
+    
+    def close(self):
+        """Close this thread's connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
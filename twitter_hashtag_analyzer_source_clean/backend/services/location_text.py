@@ -0,0 +1,32 @@
+import unicodedata
+
+# Turkish dotted and dotless i both fold to a plain i
+TURKISH_I_FOLD = str.maketrans({'İ': 'i', 'I': 'i', 'ı': 'i'})
+
+
+def normalize_location(location_text):
+    """
+    Normalize a location text into a cache key.
+    
+    Case is folded with Turkish rules for i, diacritics, emoji and
+    punctuation are dropped and whitespace is collapsed, so
+    "İstanbul, Türkiye" and " istanbul turkiye" share a key.
+    
+    Args:
+        location_text (str): Location text as written by the user
+        
+    Returns:
+        str: Normalized key, empty if nothing meaningful is left
+    """
+    folded = unicodedata.normalize('NFKD', location_text.translate(TURKISH_I_FOLD).casefold())
+    
+    characters = []
+    for character in folded:
+        category = unicodedata.category(character)
+        if category[0] in 'LN':
+            characters.append(character)
+        elif category[0] != 'M':
+            # Punctuation, symbols and emoji separate words
+            characters.append(' ')
+    
+    return ' '.join(''.join(characters).split())
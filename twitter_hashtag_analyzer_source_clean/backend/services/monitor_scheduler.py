@@ -0,0 +1,321 @@
+import time
+import heapq
+import itertools
+import threading
+
+from services.async_geocoder import TokenBucket
+
+
+class SystemClock:
+    """Wall clock used by the scheduler outside of tests."""
+    
+    def now(self):
+        """Get the current time in seconds."""
+        return time.monotonic()
+    
+    def sleep(self, seconds):
+        """Block for a number of seconds."""
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class FakeClock:
+    def __init__(self, start=0.0):
+        """
+        Initialize a clock that only moves when told to.
+        
+        Sleeping advances the clock instantly, so schedules spanning
+        days run in milliseconds and always the same way.
+        
+        Args:
+            start (float): Initial time in seconds
+        """
+        self.time = float(start)
+        self.slept = 0.0
+    
+    def now(self):
+        """Get the current fake time in seconds."""
+        return self.time
+    
+    def sleep(self, seconds):
+        """Advance the clock instead of blocking."""
+        if seconds > 0:
+            self.time += seconds
+            self.slept += seconds
+    
+    def advance(self, seconds):
+        """Move the clock forward."""
+        self.time += seconds
+
+
+class _Monitored:
+    """Scheduling state of one hashtag."""
+    
+    def __init__(self, hashtag, interval):
+        self.hashtag = hashtag
+        self.interval = interval
+        self.due_at = 0.0
+        self.velocity = None
+        self.last_polled_at = None
+        self.polls = 0
+        self.requests = 0
+        self.new_tweets = 0
+        self.last_new_tweets = 0
+        self.last_error = None
+
+
+class MonitorScheduler:
+    def __init__(self, poll, velocity, clock=None, min_interval=60, max_interval=3600,
+                 target_tweets_per_poll=100, requests_per_hour=900, burst=10, smoothing=0.5,
+                 poll_capacity=None, max_fill=0.5):
+        """
+        Initialize a scheduler that keeps polling hashtags at adaptive rates.
+        
+        Hashtags wait in a priority queue ordered by when they are due.
+        After each poll a hashtag's tweet velocity is re-estimated and its
+        next poll is planned for when about target_tweets_per_poll new
+        tweets should have arrived, within [min_interval, max_interval].
+        Every API request, whichever hashtag makes it, takes a token from
+        one shared budget, so spiking hashtags are polled often while the
+        total request rate stays bounded.
+        
+        A poll retrieves at most poll_capacity tweets, and an incremental
+        crawl never comes back for the ones it left behind, so the target
+        is kept to max_fill of that capacity. The new tweets of the last
+        poll also bound the next interval directly: a feed is only backed
+        off while its observed rate would fill less than that share, and a
+        saturated poll, whose true rate is unknown, is followed up after
+        min_interval.
+        
+        Args:
+            poll (callable): Takes a hashtag, crawls it and returns a dict with
+                the 'new_tweets' found and the API 'requests' made
+            velocity (callable): Takes a hashtag and returns a dict with the
+                'new_tweets' of the latest crawl and the 'tweets_per_minute'
+                of its recent activity
+            clock: Object with now() and sleep(seconds), defaults to SystemClock
+            min_interval (float): Shortest time between polls of a hashtag, in seconds
+            max_interval (float): Longest time between polls of a hashtag, in seconds
+            target_tweets_per_poll (int): New tweets a poll should find on average
+            requests_per_hour (float): API requests allowed per hour for all hashtags
+            burst (int): Requests that may be made at once after a quiet period
+            smoothing (float): Weight of the newest velocity estimate, 0 to 1
+            poll_capacity (int): Most new tweets one poll can retrieve, None for no limit
+            max_fill (float): Largest share of poll_capacity a poll should expect to fill
+        """
+        self.poll = poll
+        self.velocity = velocity
+        self.clock = clock or SystemClock()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_tweets_per_poll = target_tweets_per_poll
+        if poll_capacity:
+            self.target_tweets_per_poll = min(target_tweets_per_poll, max_fill * poll_capacity)
+        self.poll_capacity = poll_capacity
+        self.smoothing = smoothing
+        self.budget = TokenBucket(requests_per_hour / 3600.0, burst, clock=self.clock.now)
+        
+        self._monitored = {}
+        self._queue = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+    
+    def add(self, hashtag, delay=0.0):
+        """
+        Start monitoring a hashtag.
+        
+        Args:
+            hashtag (str): Hashtag to monitor
+            delay (float): Seconds until its first poll
+        """
+        with self._lock:
+            if hashtag in self._monitored:
+                return
+            state = _Monitored(hashtag, self.min_interval)
+            self._monitored[hashtag] = state
+            self._push(state, self.clock.now() + delay)
+    
+    def remove(self, hashtag):
+        """Stop monitoring a hashtag; its queue entry is skipped when it comes up."""
+        with self._lock:
+            self._monitored.pop(hashtag, None)
+    
+    def _push(self, state, due_at):
+        """Queue a hashtag's next poll."""
+        state.due_at = due_at
+        heapq.heappush(self._queue, (due_at, next(self._order), state))
+    
+    def _pop(self):
+        """Take the next due hashtag off the queue, skipping removed ones."""
+        with self._lock:
+            while self._queue:
+                due_at, _, state = heapq.heappop(self._queue)
+                if self._monitored.get(state.hashtag) is state:
+                    return state
+            return None
+    
+    def run_once(self):
+        """
+        Wait for the next due hashtag and the request budget, then poll it.
+        
+        Returns:
+            dict: The poll's hashtag, time, new tweets, requests and next
+                interval, None when no hashtag is monitored
+        """
+        state = self._pop()
+        if state is None:
+            return None
+        
+        self.clock.sleep(state.due_at - self.clock.now())
+        # Wait for a token for the first request; the rest are borrowed
+        # after the poll and delay whichever hashtag comes next
+        self.clock.sleep(self.budget.reserve())
+        
+        polled_at = self.clock.now()
+        try:
+            outcome = self.poll(state.hashtag)
+            state.last_error = None
+        except Exception as e:
+            print(f"Error polling #{state.hashtag}: {str(e)}")
+            outcome = {'new_tweets': 0, 'requests': 1}
+            state.last_error = str(e)
+        
+        requests = max(1, outcome.get('requests', 1))
+        if requests > 1:
+            self.budget.reserve(requests - 1)
+        
+        elapsed = polled_at - state.last_polled_at if state.last_polled_at is not None else None
+        state.last_polled_at = polled_at
+        state.polls += 1
+        state.requests += requests
+        state.new_tweets += outcome.get('new_tweets', 0)
+        state.last_new_tweets = outcome.get('new_tweets', 0)
+        
+        if state.last_error is None:
+            self._update_velocity(state, elapsed)
+        state.interval = self._interval(state, elapsed)
+        
+        with self._lock:
+            if self._monitored.get(state.hashtag) is state:
+                self._push(state, polled_at + state.interval)
+        
+        return {
+            'hashtag': state.hashtag,
+            'polled_at': polled_at,
+            'new_tweets': state.last_new_tweets,
+            'requests': requests,
+            'velocity': state.velocity,
+            'interval': state.interval,
+            'error': state.last_error
+        }
+    
+    def _update_velocity(self, state, elapsed):
+        """
+        Re-estimate a hashtag's tweets per second after a poll.
+        
+        The new tweets of the latest crawl over the time since the
+        previous poll give the observed rate. When the crawl found
+        anything, the posting rate of the newest activity counts too,
+        since a crawl capped by its tweet count underestimates a spike.
+        A crawl finding nothing decays the estimate.
+        """
+        recent = self.velocity(state.hashtag)
+        posting_rate = recent.get('tweets_per_minute', 0) / 60.0
+        
+        if elapsed is None:
+            rate = posting_rate
+        elif recent.get('new_tweets', 0) == 0:
+            rate = 0.0
+        else:
+            rate = max(recent['new_tweets'] / elapsed if elapsed > 0 else 0.0, posting_rate)
+        
+        if state.velocity is None:
+            state.velocity = rate
+        else:
+            state.velocity = self.smoothing * rate + (1 - self.smoothing) * state.velocity
+    
+    def _interval(self, state, elapsed=None):
+        """
+        Seconds until a hashtag's next poll.
+        
+        The interval follows the velocity estimate, but never exceeds the
+        time in which the rate the last poll observed brings the target
+        number of new tweets, since the smoothed estimate lags behind a
+        feed that speeds up. A poll that filled its capacity only shows
+        that the rate is higher than it could measure, so the next one
+        follows as soon as allowed and measures it again.
+        """
+        if not state.velocity:
+            interval = self.max_interval
+        else:
+            interval = self.target_tweets_per_poll / state.velocity
+        if state.last_error is None and state.last_new_tweets:
+            if self.poll_capacity and state.last_new_tweets >= self.poll_capacity:
+                interval = self.min_interval
+            elif elapsed:
+                interval = min(interval, elapsed * self.target_tweets_per_poll / state.last_new_tweets)
+        return min(self.max_interval, max(self.min_interval, interval))
+    
+    def run(self, max_polls=None, until=None, on_poll=None):
+        """
+        Keep polling hashtags as they come due.
+        
+        Args:
+            max_polls (int): Stop after this many polls, None for no limit
+            until (float): Stop before a poll due after this clock time
+            on_poll (callable): Called with each poll's record from run_once
+            
+        Returns:
+            int: Number of polls made
+        """
+        self._stop.clear()
+        polls = 0
+        while not self._stop.is_set() and (max_polls is None or polls < max_polls):
+            with self._lock:
+                next_due = self._queue[0][0] if self._queue else None
+            if next_due is None or (until is not None and next_due > until):
+                break
+            
+            record = self.run_once()
+            if record is None:
+                break
+            polls += 1
+            if on_poll:
+                on_poll(record)
+        return polls
+    
+    def stop(self):
+        """Make run return after the poll in progress."""
+        self._stop.set()
+    
+    def queue_state(self):
+        """
+        Get the monitored hashtags in the order they will be polled.
+        
+        Returns:
+            dict: 'hashtags' with each one's due time, interval, velocity
+                and totals, and the request 'budget' tokens available now
+        """
+        now = self.clock.now()
+        with self._lock:
+            states = sorted(self._monitored.values(), key=lambda state: state.due_at)
+            hashtags = [
+                {
+                    'hashtag': state.hashtag,
+                    'due_in': max(0.0, state.due_at - now),
+                    'interval': state.interval,
+                    'velocity': state.velocity,
+                    'polls': state.polls,
+                    'requests': state.requests,
+                    'new_tweets': state.new_tweets,
+                    'last_new_tweets': state.last_new_tweets,
+                    'last_error': state.last_error
+                }
+                for state in states
+            ]
+        return {
+            'now': now,
+            'hashtags': hashtags,
+            'budget': self.budget.available()
+        }
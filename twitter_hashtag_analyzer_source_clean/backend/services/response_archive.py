@@ -0,0 +1,302 @@
+import os
+import gzip
+import json
+import zlib
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from services.twitter_service import decode_response
+
+COMPRESSIONS = ('gzip', 'zstd')
+
+
+def _record_key(api, query):
+    """Key matching a replayed call to the recorded calls with the same API and query."""
+    return json.dumps([api, query or {}], sort_keys=True, default=str)
+
+
+class ResponseArchive:
+    def __init__(self, path, compression=None, level=None, readonly=False):
+        """
+        Open an archive of raw API responses for appending and reading.
+        
+        Every response is stored as one JSON line, {"api", "query",
+        "response"}, compressed on its own as a gzip member or zstd frame
+        and appended to the archive file. Concatenated members still
+        decompress as one JSONL stream with gzip -dc or zstd -dc, and an
+        index file next to the archive ('<path>.idx', one JSON line per
+        record with its offset, length, API and query) lets any record be
+        read with a single seek. Records found after the last indexed one,
+        because the index was lost or fell behind, are verified and
+        indexed again on open; only bytes that don't decompress to a
+        whole record are dropped.
+        
+        Args:
+            path (str): Archive file, created if it doesn't exist
+            compression (str): 'gzip' or 'zstd', defaults to zstd for .zst paths and gzip otherwise
+            level (int): Compression level, defaults to the codec's default
+            readonly (bool): Open an existing archive for reading only
+        """
+        if compression is None:
+            compression = 'zstd' if path.endswith('.zst') else 'gzip'
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}', expected one of {COMPRESSIONS}")
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("zstandard is not installed, use gzip compression")
+        
+        self.path = path
+        self.index_path = path + '.idx'
+        self.compression = compression
+        self.level = level
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        
+        if compression == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=level if level is not None else 3)
+            self._decompressor = zstandard.ZstdDecompressor()
+        
+        indexed = self._load_index()
+        recovered, end = self._scan(indexed[-1]['offset'] + indexed[-1]['length'] if indexed else 0)
+        self.entries = indexed + recovered
+        if readonly:
+            self._file = open(path, 'rb')
+            self._index_file = None
+        else:
+            self._file = open(path, 'a+b')
+            # Bytes after the last verified record belong to an append that was interrupted
+            self._file.truncate(end)
+            if recovered or len(indexed) < self._indexed_lines:
+                with open(self.index_path, 'w', encoding='utf-8') as f:
+                    f.writelines(json.dumps(entry, default=str) + '\n' for entry in self.entries)
+            self._index_file = open(self.index_path, 'a', encoding='utf-8')
+    
+    def _load_index(self):
+        """
+        Read the index entries that point at records inside the archive file.
+        
+        Reading stops at a torn line or at an entry reaching past the end
+        of the file, whose record was never completely written.
+        
+        Returns:
+            list: Index entries, in archive order
+        """
+        entries = []
+        self._indexed_lines = 0
+        if not os.path.exists(self.index_path):
+            return entries
+        
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                self._indexed_lines += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if entry['offset'] + entry['length'] > size:
+                    break
+                entries.append(entry)
+        return entries
+    
+    def _scan(self, offset):
+        """
+        Find the complete records stored after an offset.
+        
+        Gzip members and zstd frames end on their own, so the archive is
+        decompressed record by record from the offset until the end of
+        the file or the first member that is cut off or corrupt.
+        
+        Args:
+            offset (int): Where the last indexed record ends
+            
+        Returns:
+            tuple: Index entries of the records found, and where the last
+                of them ends
+        """
+        entries = []
+        if not os.path.exists(self.path):
+            return entries, offset
+        
+        errors = (zlib.error, ValueError) + ((zstandard.ZstdError,) if zstandard is not None else ())
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            decompressor = self._member_decompressor()
+            consumed = 0
+            output = []
+            while True:
+                chunk = f.read(1 << 20)
+                if not chunk:
+                    return entries, offset
+                while chunk:
+                    try:
+                        output.append(decompressor.decompress(chunk))
+                    except errors:
+                        return entries, offset
+                    if not decompressor.eof:
+                        consumed += len(chunk)
+                        break
+                    
+                    unused = decompressor.unused_data
+                    consumed += len(chunk) - len(unused)
+                    try:
+                        record = json.loads(b''.join(output))
+                        entry = {'offset': offset, 'length': consumed, 'api': record['api'], 'query': record['query']}
+                    except (ValueError, KeyError, TypeError):
+                        return entries, offset
+                    entries.append(entry)
+                    offset += consumed
+                    consumed = 0
+                    output = []
+                    decompressor = self._member_decompressor()
+                    chunk = unused
+    
+    def _member_decompressor(self):
+        """Decompressor for one gzip member or zstd frame, with eof and unused_data."""
+        if self.compression == 'zstd':
+            return self._decompressor.decompressobj()
+        return zlib.decompressobj(wbits=31)
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def append(self, api, query, response):
+        """
+        Add a raw API response to the archive.
+        
+        Args:
+            api (str): API name, e.g. 'Twitter/search_twitter'
+            query (dict): Query parameters of the call
+            response: Decoded response, or its undecoded JSON body as bytes or str
+            
+        Returns:
+            int: Position of the record in the archive
+        """
+        if self.readonly:
+            raise ValueError("Response archive was opened read-only")
+        
+        if isinstance(response, str):
+            response = response.encode('utf-8')
+        if not isinstance(response, (bytes, bytearray)):
+            response = json.dumps(response, ensure_ascii=False).encode('utf-8')
+        # The body is embedded as is instead of being decoded and encoded again
+        prefix = json.dumps({'api': api, 'query': query or {}}, ensure_ascii=False, default=str)
+        record = prefix[:-1].encode('utf-8') + b', "response": ' + bytes(response) + b'}\n'
+        data = self._compress(record)
+        
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            entry = {'offset': self._file.tell(), 'length': len(data), 'api': api, 'query': query or {}}
+            self._file.write(data)
+            self._file.flush()
+            # The index is written last, so it never points at a partial record
+            self._index_file.write(json.dumps(entry, default=str) + '\n')
+            self._index_file.flush()
+            self.entries.append(entry)
+            return len(self.entries) - 1
+    
+    def read(self, position):
+        """
+        Read one record of the archive.
+        
+        Args:
+            position (int): Position of the record, as returned by append
+            
+        Returns:
+            dict: The record's 'api', 'query' and decoded 'response'
+        """
+        entry = self.entries[position]
+        with self._lock:
+            self._file.seek(entry['offset'])
+            data = self._file.read(entry['length'])
+        return decode_response(self._decompress(data))
+    
+    def __iter__(self):
+        """Yield every record in the order they were appended."""
+        for position in range(len(self.entries)):
+            yield self.read(position)
+    
+    def _compress(self, data):
+        """Compress one record as a standalone gzip member or zstd frame."""
+        if self.compression == 'zstd':
+            return self._compressor.compress(data)
+        return gzip.compress(data, compresslevel=self.level if self.level is not None else 6, mtime=0)
+    
+    def _decompress(self, data):
+        """Decompress one record."""
+        if self.compression == 'zstd':
+            return self._decompressor.decompress(data)
+        return gzip.decompress(data)
+    
+    def close(self):
+        """Close the archive files."""
+        with self._lock:
+            self._file.close()
+            if self._index_file is not None:
+                self._index_file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ReplayApiClient:
+    def __init__(self, path, compression=None):
+        """
+        Initialize an API client that answers from a response archive.
+        
+        A call gets the next recorded response of the same API and query
+        that hasn't been served yet, so a replayed crawl pages through
+        exactly what was recorded, and polls repeating the same query get
+        the recordings in order, at disk speed and without the network.
+        
+        Args:
+            path (str): Archive written by ResponseArchive
+            compression (str): 'gzip' or 'zstd', detected from the path by default
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No response archive at {path}")
+        
+        self.archive = ResponseArchive(path, compression, readonly=True)
+        self.calls = 0
+        self.misses = 0
+        self._queues = {}
+        self._lock = threading.Lock()
+        for position, entry in enumerate(self.archive.entries):
+            self._queues.setdefault(_record_key(entry['api'], entry['query']), []).append(position)
+        for positions in self._queues.values():
+            positions.reverse()
+    
+    def call_api(self, api, query=None):
+        """
+        Answer an API call like ApiClient.call_api.
+        
+        Args:
+            api (str): API name, e.g. 'Twitter/search_twitter'
+            query (dict): Query parameters
+            
+        Returns:
+            dict: Recorded response, empty when none is left for this call
+        """
+        with self._lock:
+            self.calls += 1
+            positions = self._queues.get(_record_key(api, query))
+            if not positions:
+                self.misses += 1
+                return {}
+            position = positions.pop()
+        return self.archive.read(position)['response']
+    
+    def remaining(self):
+        """Get the number of recorded responses not served yet."""
+        with self._lock:
+            return sum(len(positions) for positions in self._queues.values())
+    
+    def close(self):
+        """Close the archive."""
+        self.archive.close()
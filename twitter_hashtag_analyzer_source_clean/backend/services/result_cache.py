@@ -0,0 +1,191 @@
+import os
+import json
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    def __init__(self, max_entries=128, cache_dir=None):
+        """
+        Initialize the analysis result cache.
+        
+        Results are keyed by (hashtag_id, data_version) within a
+        namespace naming the database they came from. Only the newest
+        version of a hashtag is kept: a lookup for any other version is a
+        miss and drops the stored one, so an entry is invalidated as soon
+        as the database reports a new version. Entries live in an
+        in-memory LRU and, with a cache directory, also as one JSON file
+        per hashtag, in a subdirectory per namespace, that survives
+        restarts. Without namespaces, a directory reused for another
+        database would serve its results whenever ids and versions match.
+        
+        Cached results are shared between callers; top-level keys may be
+        added to a returned result, nested values must not be modified.
+        
+        Args:
+            max_entries (int): Number of hashtags kept in memory
+            cache_dir (str): Directory for the on-disk tier, None for memory only
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+    
+    def _directory(self, namespace):
+        """Directory of a namespace's files in the on-disk tier."""
+        return os.path.join(self.cache_dir, namespace) if namespace else self.cache_dir
+    
+    def _path(self, hashtag_id, namespace=None):
+        """Path of a hashtag's file in the on-disk tier."""
+        return os.path.join(self._directory(namespace), f"{int(hashtag_id)}.json")
+    
+    def get(self, hashtag_id, data_version, namespace=None):
+        """
+        Get the cached results for a version of a hashtag's data.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+            data_version (int): Current data version from the database
+            namespace (str): Identity of the database, as Database.identity
+            
+        Returns:
+            dict: Analysis results, None on a miss
+        """
+        key = (namespace, hashtag_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == data_version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(entry[1])
+                del self._entries[key]
+        
+        result = self._read(hashtag_id, data_version, namespace)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, data_version, result)
+        return dict(result)
+    
+    def put(self, hashtag_id, data_version, result, namespace=None):
+        """
+        Store the results computed for a version of a hashtag's data.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag
+            data_version (int): Data version the results were computed for
+            result (dict): Analysis results
+            namespace (str): Identity of the database, as Database.identity
+        """
+        result = dict(result)
+        with self._lock:
+            self._remember((namespace, hashtag_id), data_version, result)
+        self._write(hashtag_id, data_version, result, namespace)
+    
+    def invalidate(self, hashtag_id=None, namespace=None):
+        """
+        Drop cached results of a database.
+        
+        Args:
+            hashtag_id (int): Database ID of the hashtag, None for every hashtag
+            namespace (str): Identity of the database, as Database.identity
+        """
+        with self._lock:
+            if hashtag_id is None:
+                for key in [key for key in self._entries if key[0] == namespace]:
+                    del self._entries[key]
+            else:
+                self._entries.pop((namespace, hashtag_id), None)
+        
+        if not self.cache_dir:
+            return
+        
+        directory = self._directory(namespace)
+        if hashtag_id is None:
+            try:
+                names = [name for name in os.listdir(directory) if name.endswith('.json')]
+            except FileNotFoundError:
+                names = []
+        else:
+            names = [os.path.basename(self._path(hashtag_id, namespace))]
+        for name in names:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    
+    def stats(self):
+        """
+        Get cache hit statistics.
+        
+        Returns:
+            dict: Memory hits, disk hits, misses and number of entries in memory
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._entries)
+            }
+    
+    def _remember(self, key, data_version, result):
+        """Put an entry in the memory tier, evicting the least recently used ones."""
+        self._entries[key] = (data_version, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def _read(self, hashtag_id, data_version, namespace=None):
+        """Load a hashtag's results from the on-disk tier if they are for this version."""
+        if not self.cache_dir:
+            return None
+        
+        path = self._path(hashtag_id, namespace)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Error reading result cache file {path}: {str(e)}")
+            return None
+        
+        if entry.get('data_version') != data_version:
+            return None
+        return entry['result']
+    
+    def _write(self, hashtag_id, data_version, result, namespace=None):
+        """Save a hashtag's results to the on-disk tier, replacing older versions."""
+        if not self.cache_dir:
+            return
+        
+        path = self._path(hashtag_id, namespace)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Readers see either the old file or the complete new one
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        except OSError as e:
+            print(f"Error writing result cache file {path}: {str(e)}")
+            return
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'data_version': data_version, 'result': result}, f, default=str)
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error writing result cache file {path}: {str(e)}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
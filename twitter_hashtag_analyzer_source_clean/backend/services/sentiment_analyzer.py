@@ -1,9 +1,95 @@
+import re
+import hashlib
+import unicodedata
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
 from textblob import TextBlob
 
+from services.lexicon_sentiment import LexiconSentimentEngine
+
+
+def _score_text(text):
+    """Score a text with TextBlob, returning 0 for empty text or on errors."""
+    if not text or text.strip() == '':
+        return 0
+    
+    try:
+        # Use TextBlob for sentiment analysis
+        analysis = TextBlob(text)
+        
+        # TextBlob returns polarity between -1 (negative) and 1 (positive)
+        return analysis.sentiment.polarity
+    except Exception as e:
+        print(f"Error analyzing sentiment: {str(e)}")
+        return 0
+
+
+def content_hash(text):
+    """
+    Hash a text after normalizing it the way TextBlob would read it.
+    
+    TextBlob's polarity ignores whitespace runs and Unicode composition,
+    so texts that only differ in those share a hash and a cached score.
+    Case is kept: emoticons such as ":D" and ":d" score differently.
+    
+    Args:
+        text (str): Text to hash
+        
+    Returns:
+        str: Hex digest of the normalized text
+    """
+    normalized = re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def _warm_up_worker():
+    """Load TextBlob's lexicon once when a pool worker starts."""
+    _score_text("warm up")
+
+
+def _score_chunk(texts):
+    """Score a chunk of texts inside a pool worker."""
+    return [_score_text(text) for text in texts]
+
+
 class SentimentAnalyzer:
-    def __init__(self):
-        """Initialize the sentiment analyzer."""
-        pass
+    ENGINES = ('textblob', 'lexicon')
+    
+    def __init__(self, workers=None, chunk_size=200, parallel_threshold=50, cache_size=50000, db=None,
+                 engine='textblob'):
+        """
+        Initialize the sentiment analyzer.
+        
+        Args:
+            workers (int): Number of worker processes for batch scoring,
+                defaults to the number of CPUs
+            chunk_size (int): Most texts sent to a worker at a time; smaller
+                batches are split evenly so every worker gets a share
+            parallel_threshold (int): Smallest batch scored in the process pool;
+                smaller batches are scored serially. The default is reached
+                by a page of up to 100 tweets with mostly new texts
+            cache_size (int): Maximum number of scores kept in memory
+            db (Database): Database whose sentiment_cache table backs the
+                in-memory cache across restarts
+            engine (str): 'textblob' to score each text with TextBlob, or
+                'lexicon' to score whole batches against TextBlob's lexicon
+                with one sparse matrix product
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown sentiment engine '{engine}', expected one of {self.ENGINES}")
+        
+        self.engine = engine
+        self._lexicon_engine = LexiconSentimentEngine() if engine == 'lexicon' else None
+        self.workers = workers or multiprocessing.cpu_count()
+        self.chunk_size = chunk_size
+        self.parallel_threshold = parallel_threshold
+        self.cache_size = cache_size
+        self.db = db
+        self._pool = None
+        self._cache = OrderedDict()
+        self.reset_cache_stats()
     
     def analyze_text(self, text):
         """
@@ -15,18 +101,7 @@ class SentimentAnalyzer:
         Returns:
             float: Sentiment score between -1 (negative) and 1 (positive)
         """
-        if not text or text.strip() == '':
-            return 0
-        
-        try:
-            # Use TextBlob for sentiment analysis
-            analysis = TextBlob(text)
-            
-            # TextBlob returns polarity between -1 (negative) and 1 (positive)
-            return analysis.sentiment.polarity
-        except Exception as e:
-            print(f"Error analyzing sentiment: {str(e)}")
-            return 0
+        return self._score_texts([text], parallel=False)[0]
     
     def analyze_tweets(self, tweets):
         """
@@ -38,12 +113,154 @@ class SentimentAnalyzer:
         Returns:
             list: List of tweet dictionaries with added 'sentiment_score' field
         """
-        for tweet in tweets:
-            if 'content' in tweet:
-                tweet['sentiment_score'] = self.analyze_text(tweet['content'])
+        return self._analyze(tweets, parallel=False)
+    
+    def analyze_tweets_parallel(self, tweets):
+        """
+        Analyze the sentiment of multiple tweets across a process pool.
+        
+        Tweets are sent to the workers in chunks and scores are assigned
+        back in the original order. Batches smaller than the parallel
+        threshold, or a single worker, use the serial path since pool
+        overhead would dominate.
+        
+        Args:
+            tweets (list): List of tweet dictionaries with 'content' field
+            
+        Returns:
+            list: List of tweet dictionaries with added 'sentiment_score' field
+        """
+        return self._analyze(tweets, parallel=True)
+    
+    def _analyze(self, tweets, parallel):
+        """Score the tweets that have content and attach the scores."""
+        scored = [tweet for tweet in tweets if 'content' in tweet]
+        scores = self._score_texts([tweet['content'] for tweet in scored], parallel)
+        
+        for tweet, score in zip(scored, scores):
+            tweet['sentiment_score'] = score
         
         return tweets
     
+    def _score_texts(self, texts, parallel):
+        """
+        Score texts, only running the engine for content not seen before.
+        
+        Scores are looked up by normalized content hash in the in-memory
+        LRU first, then in the database cache; the rest are scored by the
+        engine once per distinct hash and written back to both.
+        
+        Args:
+            texts (list): Texts to score
+            parallel (bool): Allow the process pool for the uncached texts
+            
+        Returns:
+            list: Scores in the same order as the texts
+        """
+        hashes = [self._hash(text) if text and text.strip() else None for text in texts]
+        
+        resolved = {}
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash is None:
+                continue
+            if text_hash in resolved or text_hash in missing:
+                # Repeated within the batch, looked up or scored once
+                self.cache_hits += 1
+            elif text_hash in self._cache:
+                self._cache.move_to_end(text_hash)
+                resolved[text_hash] = self._cache[text_hash]
+                self.cache_hits += 1
+            else:
+                missing[text_hash] = text
+        
+        if missing and self.db is not None:
+            stored = self.db.get_cached_sentiments(missing.keys())
+            self.db_hits += len(stored)
+            for text_hash, score in stored.items():
+                self._remember(text_hash, score)
+                resolved[text_hash] = score
+                del missing[text_hash]
+        
+        if missing:
+            self.cache_misses += len(missing)
+            computed = dict(zip(missing.keys(), self._run_engine(list(missing.values()), parallel)))
+            for text_hash, score in computed.items():
+                self._remember(text_hash, score)
+            resolved.update(computed)
+            if self.db is not None:
+                self.db.save_cached_sentiments(computed)
+        
+        return [0 if text_hash is None else resolved[text_hash] for text_hash in hashes]
+    
+    def _hash(self, text):
+        """Cache key for a text, kept apart per engine since their scores differ."""
+        if self.engine == 'textblob':
+            return content_hash(text)
+        return f"{self.engine}:{content_hash(text)}"
+    
+    def _run_engine(self, texts, parallel):
+        """Score texts with the selected engine, in the process pool for large TextBlob batches."""
+        if self._lexicon_engine is not None:
+            return self._lexicon_engine.score(texts)
+        
+        if not parallel or len(texts) < self.parallel_threshold or self.workers < 2:
+            return [_score_text(text) for text in texts]
+        
+        # A single page is smaller than one chunk, spread it over the workers instead
+        chunk_size = min(self.chunk_size, -(-len(texts) // self.workers))
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        
+        scores = []
+        for chunk_scores in self._get_pool().map(_score_chunk, chunks):
+            scores.extend(chunk_scores)
+        return scores
+    
+    def _remember(self, text_hash, score):
+        """Add a score to the in-memory LRU, evicting the oldest entries."""
+        self._cache[text_hash] = score
+        self._cache.move_to_end(text_hash)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    def cache_stats(self):
+        """
+        Get sentiment cache counters since the last reset.
+        
+        Returns:
+            dict: In-memory hits, database hits, misses and overall hit rate
+        """
+        lookups = self.cache_hits + self.db_hits + self.cache_misses
+        return {
+            'hits': self.cache_hits,
+            'db_hits': self.db_hits,
+            'misses': self.cache_misses,
+            'hit_rate': (self.cache_hits + self.db_hits) / lookups if lookups else 0
+        }
+    
+    def reset_cache_stats(self):
+        """Reset the cache hit and miss counters."""
+        self.cache_hits = 0
+        self.db_hits = 0
+        self.cache_misses = 0
+    
+    def _get_pool(self):
+        """Start the worker pool on first use."""
+        if self._pool is None:
+            # Spawn rather than fork, the collection pipeline may be running threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_warm_up_worker
+            )
+        return self._pool
+    
+    def close(self):
+        """Shut down the worker pool."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+    
     def get_sentiment_label(self, score):
         """
         Convert a sentiment score to a label.
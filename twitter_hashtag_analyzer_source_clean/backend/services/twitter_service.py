@@ -1,13 +1,106 @@
 import sys
 sys.path.append('/opt/.manus/.sandbox-runtime')
-from data_api import ApiClient
+try:
+    from data_api import ApiClient
+except ImportError:
+    # Only available in the sandbox runtime; offline runs pass their own client
+    ApiClient = None
 import json
+import functools
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+TWITTER_DATE_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+MONTHS = {
+    name: f"{number:02d}"
+    for number, name in enumerate(
+        ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1
+    )
+}
+
+# Stands in for missing nested objects so lookups can be chained
+_EMPTY = {}
+
+
+def decode_response(raw):
+    """
+    Decode an API response body, with orjson when it is installed.
+    
+    Args:
+        raw (bytes): JSON body as bytes or str
+        
+    Returns:
+        dict: Decoded response
+    """
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+@functools.lru_cache(maxsize=8192)
+def parse_twitter_date(value):
+    """
+    Convert a Twitter created_at timestamp to the format stored in the database.
+    
+    Timestamps in Twitter's fixed layout, e.g. 'Wed Oct 10 20:19:24 +0000 2018',
+    are sliced apart instead of going through strptime. Tweets posted in
+    the same second and accounts seen on many pages repeat timestamps, so
+    results are cached.
+    
+    Args:
+        value (str): Timestamp as returned by the API
+        
+    Returns:
+        str: 'YYYY-MM-DD HH:MM:SS' in the timestamp's own offset, None if it can't be parsed
+    """
+    if not isinstance(value, str):
+        return None
+    
+    month = MONTHS.get(value[4:7])
+    digits = value[8:10] + value[11:13] + value[14:16] + value[17:19] + value[21:25] + value[26:30]
+    if (month is not None and len(value) == 30 and value[20] in '+-' and value[13] == value[16] == ':'
+            and digits.isascii() and digits.isdigit()):
+        try:
+            # Building the datetime rejects impossible dates like strptime would
+            parsed = datetime(int(value[26:30]), int(month), int(value[8:10]),
+                              int(value[11:13]), int(value[14:16]), int(value[17:19]))
+        except ValueError:
+            parsed = None
+        if parsed is not None:
+            return f"{value[26:30]}-{month}-{value[8:10]} {value[11:19]}"
+    
+    try:
+        return datetime.strptime(value, TWITTER_DATE_FORMAT).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
 class TwitterService:
-    def __init__(self):
-        """Initialize the Twitter API client."""
-        self.client = ApiClient()
+    def __init__(self, client=None, archive=None):
+        """
+        Initialize the Twitter API client.
+        
+        Args:
+            client: Object with a call_api(api, query) method, defaults to ApiClient
+            archive (ResponseArchive): Archive every raw response is appended to, None to keep none
+        """
+        if client is None:
+            if ApiClient is None:
+                raise ImportError("data_api is not available, pass an API client explicitly")
+            client = ApiClient()
+        self.client = client
+        self.archive = archive
+    
+    def _call_api(self, api, query):
+        """Call the API, archiving the raw response before it is processed."""
+        response = self.client.call_api(api, query=query)
+        if self.archive is not None and response:
+            self.archive.append(api, query, response)
+        return response
     
     def search_hashtag(self, hashtag, count=100, search_type="Latest", cursor=None):
         """
@@ -27,9 +120,9 @@ class TwitterService:
             hashtag = f"#{hashtag}"
             
         # Call Twitter search API
-        response = self.client.call_api(
+        response = self._call_api(
             'Twitter/search_twitter', 
-            query={
+            {
                 'query': hashtag,
                 'count': count,
                 'type': search_type,
@@ -55,9 +148,9 @@ class TwitterService:
             username = username[1:]
             
         # Call Twitter user profile API
-        response = self.client.call_api(
+        response = self._call_api(
             'Twitter/get_user_profile_by_username',
-            query={'username': username}
+            {'username': username}
         )
         
         # Process and return the user data
@@ -68,7 +161,7 @@ class TwitterService:
         Process raw Twitter search API response into structured data.
         
         Args:
-            response (dict): Raw API response
+            response (dict): Raw API response, or its undecoded JSON body as bytes or str
             hashtag (str): The hashtag that was searched
             
         Returns:
@@ -80,64 +173,61 @@ class TwitterService:
             'cursor': None
         }
         
+        if isinstance(response, (bytes, bytearray, str)):
+            try:
+                response = decode_response(response)
+            except ValueError as e:
+                print(f"Error decoding search results: {str(e)}")
+                return processed_data
+        
         if not response or 'result' not in response:
             return processed_data
             
         # Extract cursor for pagination
-        if 'cursor' in response:
+        cursor = response.get('cursor')
+        if cursor is not None:
             processed_data['cursor'] = {
-                'top': response['cursor'].get('top', ''),
-                'bottom': response['cursor'].get('bottom', '')
+                'top': cursor.get('top', ''),
+                'bottom': cursor.get('bottom', '')
             }
         
+        tweets = processed_data['tweets']
+        users = processed_data['users']
+        extract_user_data = self._extract_user_data
+        extract_tweet_data = self._extract_tweet_data
+        
         # Extract tweets and user data from the timeline
         try:
             timeline = response['result']['timeline']
-            instructions = timeline.get('instructions', [])
             
-            for instruction in instructions:
-                if 'entries' not in instruction:
-                    continue
-                    
-                for entry in instruction['entries']:
-                    if 'content' not in entry:
-                        continue
-                        
-                    content = entry['content']
+            for instruction in timeline.get('instructions', ()):
+                for entry in instruction.get('entries', ()):
+                    content = entry.get('content')
                     
                     # Skip non-tweet entries
-                    if content.get('entryType') != 'TimelineTimelineItem':
+                    if content is None or content.get('entryType') != 'TimelineTimelineItem':
                         continue
                         
-                    # Process tweet items
-                    if 'items' in content:
-                        for item_wrapper in content['items']:
-                            if 'item' not in item_wrapper:
-                                continue
-                                
-                            item = item_wrapper['item']
-                            if 'itemContent' not in item:
-                                continue
-                                
-                            item_content = item['itemContent']
-                            
-                            # Skip non-tweet content
-                            if item_content.get('itemType') != 'TimelineTweet':
-                                continue
-                                
-                            # Extract user data
-                            if 'user_results' in item_content and 'result' in item_content['user_results']:
-                                user_data = item_content['user_results']['result']
-                                user = self._extract_user_data(user_data)
-                                if user:
-                                    processed_data['users'][user['id']] = user
+                    for item_wrapper in content.get('items', ()):
+                        item_content = item_wrapper.get('item', _EMPTY).get('itemContent')
+                        
+                        # Skip non-tweet content
+                        if item_content is None or item_content.get('itemType') != 'TimelineTweet':
+                            continue
                             
-                            # Extract tweet data
-                            if 'tweet_results' in item_content and 'result' in item_content['tweet_results']:
-                                tweet_data = item_content['tweet_results']['result']
-                                tweet = self._extract_tweet_data(tweet_data, hashtag)
-                                if tweet:
-                                    processed_data['tweets'].append(tweet)
+                        # Extract user data
+                        user_data = item_content.get('user_results', _EMPTY).get('result')
+                        if user_data is not None:
+                            user = extract_user_data(user_data)
+                            if user:
+                                users[user['id']] = user
+                        
+                        # Extract tweet data
+                        tweet_data = item_content.get('tweet_results', _EMPTY).get('result')
+                        if tweet_data is not None:
+                            tweet = extract_tweet_data(tweet_data, hashtag)
+                            if tweet:
+                                tweets.append(tweet)
         except Exception as e:
             print(f"Error processing search results: {str(e)}")
         
@@ -177,31 +267,25 @@ class TwitterService:
             return None
             
         try:
-            user = {}
-            
             # Basic user info
-            user['id'] = user_data.get('rest_id', '')
+            user = {'id': user_data.get('rest_id', '')}
             
             # Legacy data contains most user information
-            if 'legacy' in user_data:
-                legacy = user_data['legacy']
-                user['username'] = legacy.get('screen_name', '')
-                user['display_name'] = legacy.get('name', '')
-                user['profile_image_url'] = legacy.get('profile_image_url_https', '')
-                user['followers_count'] = legacy.get('followers_count', 0)
-                user['following_count'] = legacy.get('friends_count', 0)
-                user['tweet_count'] = legacy.get('statuses_count', 0)
-                user['location'] = legacy.get('location', '')
+            legacy = user_data.get('legacy')
+            if legacy is not None:
+                get = legacy.get
+                user['username'] = get('screen_name', '')
+                user['display_name'] = get('name', '')
+                user['profile_image_url'] = get('profile_image_url_https', '')
+                user['followers_count'] = get('followers_count', 0)
+                user['following_count'] = get('friends_count', 0)
+                user['tweet_count'] = get('statuses_count', 0)
+                user['location'] = get('location', '')
                 
-                # Parse created_at date
                 if 'created_at' in legacy:
-                    try:
-                        created_at = datetime.strptime(legacy['created_at'], '%a %b %d %H:%M:%S %z %Y')
-                        user['account_created_at'] = created_at.strftime('%Y-%m-%d %H:%M:%S')
-                    except:
-                        user['account_created_at'] = ''
+                    user['account_created_at'] = parse_twitter_date(legacy['created_at']) or ''
                 
-                user['is_verified'] = legacy.get('verified', False) or user_data.get('is_blue_verified', False)
+                user['is_verified'] = get('verified', False) or user_data.get('is_blue_verified', False)
             
             return user
         except Exception as e:
@@ -223,42 +307,25 @@ class TwitterService:
             return None
             
         try:
-            tweet = {}
-            
             # Core tweet data
-            tweet['id'] = tweet_data.get('rest_id', '')
+            tweet = {'id': tweet_data.get('rest_id', '')}
             
             # Legacy data contains most tweet information
-            if 'legacy' in tweet_data:
-                legacy = tweet_data['legacy']
-                tweet['content'] = legacy.get('full_text', '')
-                tweet['retweet_count'] = legacy.get('retweet_count', 0)
-                tweet['like_count'] = legacy.get('favorite_count', 0)
-                tweet['reply_count'] = legacy.get('reply_count', 0)
-                
-                # Parse created_at date
-                if 'created_at' in legacy:
-                    try:
-                        created_at = datetime.strptime(legacy['created_at'], '%a %b %d %H:%M:%S %z %Y')
-                        tweet['created_at'] = created_at.strftime('%Y-%m-%d %H:%M:%S')
-                    except:
-                        tweet['created_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                else:
-                    tweet['created_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                
-                # Check if it's a retweet
+            legacy = tweet_data.get('legacy')
+            if legacy is not None:
+                get = legacy.get
+                tweet['content'] = get('full_text', '')
+                tweet['retweet_count'] = get('retweet_count', 0)
+                tweet['like_count'] = get('favorite_count', 0)
+                tweet['reply_count'] = get('reply_count', 0)
+                tweet['created_at'] = (
+                    parse_twitter_date(get('created_at')) or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                )
                 tweet['is_retweet'] = 'retweeted_status_result' in legacy
-                
-                # Check if it's a reply
-                tweet['is_reply'] = legacy.get('in_reply_to_status_id_str', '') != ''
-                
-                # Check if it has media
-                tweet['has_media'] = 'entities' in legacy and 'media' in legacy['entities']
-                
-                # Get user ID
-                tweet['user_id'] = legacy.get('user_id_str', '')
-                
-                # Set hashtag
+                tweet['is_reply'] = get('in_reply_to_status_id_str', '') != ''
+                entities = get('entities')
+                tweet['has_media'] = entities is not None and 'media' in entities
+                tweet['user_id'] = get('user_id_str', '')
                 tweet['hashtag'] = hashtag
             
             return tweet
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from hashtag_analyzer import HashtagAnalyzer
+from services.fake_api_client import FakeApiClient, SimpleDataset
+from services.fake_nominatim_server import FakeNominatimServer
+from services.geocoding_service import GeocodingService
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    with FakeNominatimServer() as server:
+        geocoding_service = GeocodingService(
+            cache_file=str(tmp_path / 'location_cache.db'), legacy_cache_file=None, endpoint=server.url
+        )
+        client = FakeApiClient(dataset=SimpleDataset(total_tweets=500, user_count=60, seed=5))
+        analyzer = HashtagAnalyzer(os.path.join(tmp_path, 'batch.db'), api_client=client,
+                                   geocoding_service=geocoding_service)
+        yield analyzer
+        analyzer.close()
+
+
+def test_interrupted_batch_can_be_resumed(analyzer):
+    process_page = analyzer._process_page
+    processed = []
+    
+    def interrupted(page):
+        if len(processed) == 3:
+            raise KeyboardInterrupt()
+        processed.append(page)
+        return process_page(page)
+    
+    analyzer._process_page = interrupted
+    with pytest.raises(KeyboardInterrupt):
+        analyzer.analyze_many(['alpha', 'beta'], 300, workers=2)
+    analyzer._process_page = process_page
+    
+    db = analyzer.db
+    jobs = [dict(row) for row in db.conn.execute("SELECT * FROM crawl_jobs ORDER BY id")]
+    assert [job['status'] for job in jobs] == ['failed', 'failed']
+    assert all(job['error'].startswith("Batch interrupted") for job in jobs)
+    assert sum(job['fetched_count'] for job in jobs) == 300
+    
+    # The fake datasets serve the same tweets for every hashtag
+    batch = analyzer.analyze_many(['alpha', 'beta'], resume=True)
+    for hashtag, job in zip(['alpha', 'beta'], jobs):
+        collection = batch['results'][hashtag]['collection']
+        assert collection['crawl']['job_id'] == job['id']
+        assert collection['crawl']['resumed'] == (job['fetched_count'] > 0)
+        finished = db.get_crawl_job(job['id'])
+        assert finished['status'] == 'completed'
+        assert finished['fetched_count'] == 300
+    assert db.conn.execute("SELECT COUNT(*) FROM tweets").fetchone()[0] == 300
+
+
+def test_resume_without_unfinished_crawl_reports_error(analyzer):
+    analyzer.analyze_many(['alpha'], 100)
+    batch = analyzer.analyze_many(['alpha', 'beta'], resume=True)
+    assert 'No unfinished crawl' in batch['results']['alpha']['error']
+    assert 'No unfinished crawl' in batch['results']['beta']['error']
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+from urllib.parse import urlsplit
+
+import pytest
+
+from services.async_geocoder import AsyncGeocoder
+from services.fake_nominatim_server import FakeNominatimServer
+
+
+@pytest.fixture
+def server():
+    with FakeNominatimServer(latency=0.05) as server:
+        yield server
+
+
+def make_geocoder(server, concurrency=4, rate=None, burst=1):
+    host = urlsplit(server.url).netloc
+    return AsyncGeocoder(server.url, concurrency=concurrency, rate_limits={host: (rate, burst)})
+
+
+def test_answers_known_and_unknown_places(server):
+    geocoder = make_geocoder(server)
+    try:
+        results = geocoder.geocode_batch({'place 7': "Place 7", 'nowhere': "Nowhere"})
+    finally:
+        geocoder.close()
+    
+    assert results['place 7'][1] == 'found'
+    assert results['place 7'][0]['city'] == "Place 7"
+    assert results['nowhere'] == (None, 'not_found')
+
+
+def test_rate_limit_at_server(server):
+    rate = 20.0
+    count = 16
+    geocoder = make_geocoder(server, concurrency=8, rate=rate, burst=1)
+    try:
+        geocoder.geocode_batch({f"place {index}": f"Place {index}" for index in range(count)})
+    finally:
+        geocoder.close()
+    
+    times = sorted(server.request_times)
+    assert len(times) == count
+    observed = (count - 1) / (times[-1] - times[0])
+    # Tokens are spaced 1/rate apart; allow for scheduling jitter
+    assert observed <= rate * 1.1
+
+
+def test_concurrency_bound(server):
+    geocoder = make_geocoder(server, concurrency=3)
+    try:
+        geocoder.geocode_batch({f"place {index}": f"Place {index}" for index in range(15)})
+    finally:
+        geocoder.close()
+    
+    assert server.requests == 15
+    assert server.max_active == 3
+
+
+def test_duplicate_lookups_in_flight_share_one_request(server):
+    geocoder = make_geocoder(server)
+    
+    async def same_place():
+        return await asyncio.gather(*(geocoder.lookup("Place 1", "place 1") for _ in range(20)))
+    
+    try:
+        results = asyncio.run(same_place())
+    finally:
+        geocoder.close()
+    
+    assert server.requests == 1
+    assert geocoder.coalesced == 19
+    assert all(result == results[0] for result in results)
+
+
+def test_direct_lookups_share_the_concurrency_bound(server):
+    geocoder = make_geocoder(server, concurrency=3)
+    bucket = geocoder.bucket()
+    acquire = bucket.acquire
+    get = geocoder._get
+    holding = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+    
+    async def counting_acquire():
+        with lock:
+            holding['now'] += 1
+            holding['max'] = max(holding['max'], holding['now'])
+        await acquire()
+    
+    async def places():
+        return await asyncio.gather(*(geocoder.lookup(f"Place {index}") for index in range(12)))
+    
+    def counting_get(location_text):
+        try:
+            return get(location_text)
+        finally:
+            with lock:
+                holding['now'] -= 1
+    
+    bucket.acquire = counting_acquire
+    geocoder._get = counting_get
+    try:
+        results = asyncio.run(places())
+        # A new loop gets its own semaphore
+        asyncio.run(places())
+    finally:
+        geocoder.close()
+    
+    assert all(outcome == 'found' for _, outcome in results)
+    assert holding['max'] == 3
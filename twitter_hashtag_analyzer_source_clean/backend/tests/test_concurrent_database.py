@@ -0,0 +1,98 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'concurrent.db'), concurrent=True, max_readers=2)
+    yield db
+    db.close()
+
+
+def make_page(number, size=50):
+    start = datetime(2025, 4, 1, 12, 0, 0)
+    tweets = [
+        {
+            'id': str(9000000 + number * size + index),
+            'user_id': str(index % 7),
+            'content': f"tweet {number} {index}",
+            'created_at': start + timedelta(minutes=number * size + index)
+        }
+        for index in range(size)
+    ]
+    users = [{'id': str(user), 'username': f"user{user}"} for user in range(7)]
+    return tweets, users
+
+
+def test_reads_run_while_pages_are_written(db):
+    hashtag_id = db.get_or_create_hashtag('concurrent')['id']
+    pages = 20
+    errors = []
+    
+    def write():
+        try:
+            for number in range(pages):
+                db.save_page(*make_page(number), hashtag_id)
+        except Exception as e:
+            errors.append(e)
+    
+    writer = threading.Thread(target=write)
+    writer.start()
+    
+    # Readers on other threads see whole pages only, and never go backwards
+    seen = []
+    while writer.is_alive() or not seen or seen[-1] < pages * 50:
+        timeline = db.get_activity_timeline(hashtag_id, 'day')
+        seen.append(sum(bucket['tweet_count'] for bucket in timeline))
+    writer.join()
+    
+    assert errors == []
+    assert seen == sorted(seen)
+    assert all(count % 50 == 0 for count in seen)
+    assert seen[-1] == pages * 50
+    assert db.get_data_version(hashtag_id) >= pages
+
+
+def test_reads_from_many_threads_share_the_pool(db):
+    hashtag_id = db.get_or_create_hashtag('concurrent')['id']
+    db.save_page(*make_page(0), hashtag_id)
+    results = []
+    
+    def read():
+        for _ in range(20):
+            results.append(db.get_data_version(hashtag_id))
+    
+    threads = [threading.Thread(target=read) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(results) == 120
+    assert len(set(results)) == 1
+    assert len(db._readers.all) <= 2
+
+
+def test_connection_outside_an_operation_is_refused(db):
+    with pytest.raises(RuntimeError):
+        db.conn.execute("SELECT 1")
+
+
+def test_failed_write_is_rolled_back_on_the_writer(db, monkeypatch):
+    hashtag_id = db.get_or_create_hashtag('concurrent')['id']
+    
+    def fail(tweets):
+        raise RuntimeError("disk full")
+    
+    monkeypatch.setattr(db, '_new_tweets', fail)
+    with pytest.raises(RuntimeError):
+        db.save_page(*make_page(0), hashtag_id)
+    monkeypatch.undo()
+    
+    # The writer thread is still usable and left no transaction open
+    assert db.save_page(*make_page(1), hashtag_id)['inserted'] == 50
+    assert sum(bucket['tweet_count'] for bucket in db.get_activity_timeline(hashtag_id, 'day')) == 50
@@ -0,0 +1,124 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'counters.db'))
+    yield db
+    db.close()
+
+
+def make_pages(page_count=8, page_size=100, user_count=120, seed=11):
+    """Pages of a skewed timeline, each overlapping the one before like a crawl retried mid-way."""
+    rng = random.Random(seed)
+    start = datetime(2025, 4, 1, 12, 0, 0)
+    # A few users post most of the tweets, many users only a few
+    weights = [1 / (rank + 1) for rank in range(user_count)]
+    tweets = []
+    for index in range(page_count * page_size):
+        user_index = rng.choices(range(user_count), weights)[0]
+        tweets.append({
+            'id': str(5000000 + index),
+            'user_id': str(100 + user_index),
+            'content': f"tweet {index}",
+            'created_at': start - timedelta(minutes=7 * index),
+            'retweet_count': rng.randint(0, 50),
+            'like_count': rng.randint(0, 200),
+            'reply_count': rng.randint(0, 10),
+            'is_retweet': rng.random() < 0.3,
+            'is_reply': rng.random() < 0.2,
+            'has_media': rng.random() < 0.1,
+            'sentiment_score': round(rng.uniform(-1, 1), 3)
+        })
+    
+    return [
+        tweets[max(0, number * page_size - 10):(number + 1) * page_size]
+        for number in range(page_count)
+    ]
+
+
+def make_users(tweets, followers):
+    return [
+        {'id': user_id, 'username': f"user{user_id}", 'followers_count': followers.get(user_id, 1000)}
+        for user_id in sorted({tweet['user_id'] for tweet in tweets})
+    ]
+
+
+def snapshot(db, hashtag_id):
+    """Running counters, per-user counts, rollups and top contributors of a hashtag."""
+    counters = dict(db.conn.execute(
+        """
+        SELECT tweet_count, contributor_count, retweet_count, reply_count, media_count, sentiment_sum
+        FROM hashtag_counters WHERE hashtag_id = ?
+        """,
+        (hashtag_id,)
+    ).fetchone())
+    counters['sentiment_sum'] = pytest.approx(counters['sentiment_sum'])
+    user_counts = set(tuple(row) for row in db.conn.execute(
+        "SELECT user_id, tweet_count, retweet_count, reply_count FROM hashtag_user_counts WHERE hashtag_id = ?",
+        (hashtag_id,)
+    ))
+    rollups = {
+        (row[0], row[1]): tuple(row[2:])
+        for row in db.conn.execute(
+            """
+            SELECT resolution, bucket, tweet_count, original_count, retweet_count, reply_count,
+                media_count, positive_count, negative_count, user_count
+            FROM tweet_rollups WHERE hashtag_id = ?
+            """,
+            (hashtag_id,)
+        )
+    }
+    top = set(tuple(row) for row in db.conn.execute(
+        """
+        SELECT user_id, tweet_count, retweet_count, reply_count, influence_score
+        FROM top_contributors WHERE hashtag_id = ?
+        """,
+        (hashtag_id,)
+    ))
+    return {'counters': counters, 'user_counts': user_counts, 'rollups': rollups, 'top': top}
+
+
+def test_running_counters_match_a_full_rebuild(db):
+    hashtag_id = db.get_or_create_hashtag('counters')['id']
+    followers = {}
+    
+    for number, page in enumerate(make_pages()):
+        # Profiles change between pages too, which changes influence without new tweets
+        if number % 3 == 2:
+            followers[page[0]['user_id']] = 900000 + number
+        db.save_page(page, make_users(page, followers), hashtag_id)
+        db.update_top_contributors(hashtag_id)
+    
+    incremental = snapshot(db, hashtag_id)
+    assert len(incremental['top']) == 50
+    assert incremental['counters']['contributor_count'] > 50
+    
+    db.rebuild_hashtag_counters(hashtag_id)
+    db.update_top_contributors(hashtag_id)
+    assert snapshot(db, hashtag_id) == incremental
+
+
+def test_top_contributors_match_the_tweets(db):
+    hashtag_id = db.get_or_create_hashtag('counters')['id']
+    for page in make_pages():
+        db.save_page(page, make_users(page, {}), hashtag_id)
+        db.update_top_contributors(hashtag_id)
+    
+    expected = db.conn.execute(
+        """
+        SELECT user_id, COUNT(*) AS tweet_count FROM tweets WHERE hashtag_id = ?
+        GROUP BY user_id ORDER BY tweet_count DESC, user_id LIMIT 50
+        """,
+        (hashtag_id,)
+    ).fetchall()
+    top = db.conn.execute(
+        "SELECT user_id, tweet_count FROM top_contributors WHERE hashtag_id = ? ORDER BY tweet_count DESC, user_id",
+        (hashtag_id,)
+    ).fetchall()
+    assert [tuple(row) for row in top] == [tuple(row) for row in expected]
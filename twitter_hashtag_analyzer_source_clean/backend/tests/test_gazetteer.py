@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from services.gazetteer import Gazetteer
+
+ROWS = [
+    # name, alternate names, latitude, longitude, feature class, feature code, country code, population
+    ("France", "FR", 46.0, 2.0, "A", "PCLI", "FR", 68000000),
+    ("United States", "USA,US", 39.8, -98.6, "A", "PCLI", "US", 331000000),
+    ("Paris", "Paname", 48.8566, 2.3522, "P", "PPLC", "FR", 2100000),
+    ("Paris", "", 33.6609, -95.5555, "P", "PPLA2", "US", 25000),
+    ("Springfield", "", 39.7817, -89.6501, "P", "PPLA", "US", 114000),
+    ("Springfield", "", 37.2090, -93.2923, "P", "PPLA2", "US", 169000),
+    ("London", "", 51.5074, -0.1278, "P", "PPLC", "GB", 8900000),
+]
+
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    path = tmp_path / 'gazetteer.tsv'
+    lines = ["# test gazetteer"]
+    for geonameid, (name, alternates, lat, lon, feature_class, code, country, population) in enumerate(ROWS, 1):
+        fields = [str(geonameid), name, name, alternates, str(lat), str(lon), feature_class, code, country,
+                  '', '', '', '', '', str(population), '', '', '', '']
+        lines.append('\t'.join(fields))
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    
+    gazetteer = Gazetteer(str(path))
+    yield gazetteer
+    gazetteer.close()
+
+
+def test_bare_homonym_resolves_to_most_populous(gazetteer):
+    assert gazetteer.lookup("Paris")['country'] == "France"
+
+
+def test_country_qualifier_picks_homonym(gazetteer):
+    location = gazetteer.lookup("Paris, USA")
+    assert (location['latitude'], location['longitude']) == (33.6609, -95.5555)
+    assert gazetteer.lookup("Paris USA")['latitude'] == 33.6609
+
+
+@pytest.mark.parametrize("text", ["Paris, TX", "Springfield, IL", "Paris TX", "Springfield, IL, USA"])
+def test_unresolved_qualifier_is_left_to_nominatim(gazetteer, text):
+    assert gazetteer.lookup(text) is None
+
+
+def test_qualifier_rules_out_other_countries(gazetteer):
+    assert gazetteer.lookup("London, France") is None
+
+
+def test_prefix_and_fuzzy_only_for_bare_names(gazetteer):
+    assert gazetteer.lookup("Lond")['city'] == "London"
+    assert gazetteer.lookup("Londn")['city'] == "London"
+    assert gazetteer.lookup("Lond, TX") is None
+    assert gazetteer.lookup("Londn, TX") is None
+
+
+def test_prefix_needs_similar_name(gazetteer):
+    # A short start of a much longer name is not a match
+    assert gazetteer.lookup("Spri") is None
+
+
+def test_saved_index_is_reused(gazetteer, monkeypatch):
+    assert gazetteer.lookup("Paname")['city'] == "Paris"
+    assert os.path.exists(gazetteer.index_path)
+    
+    def rebuild(self):
+        raise AssertionError("index rebuilt")
+    
+    monkeypatch.setattr(Gazetteer, '_build_index', rebuild)
+    reopened = Gazetteer(gazetteer.path)
+    try:
+        assert len(reopened) == len(gazetteer)
+        assert reopened.lookup("Springfield, USA")['latitude'] == 37.2090
+        assert reopened.lookup("Lond")['city'] == "London"
+    finally:
+        reopened.close()
+
+
+def test_index_is_rebuilt_when_gazetteer_changes(gazetteer):
+    assert gazetteer.lookup("Berlin") is None
+    gazetteer.close()
+    
+    fields = ['8', 'Berlin', 'Berlin', '', '52.52', '13.405', 'P', 'PPLC', 'DE',
+              '', '', '', '', '', '3600000', '', '', '', '']
+    with open(gazetteer.path, 'a', encoding='utf-8') as f:
+        f.write('\t'.join(fields) + '\n')
+    
+    reopened = Gazetteer(gazetteer.path)
+    try:
+        assert reopened.lookup("Berlin")['latitude'] == 52.52
+        assert reopened.lookup("Paris")['country'] == "France"
+    finally:
+        reopened.close()
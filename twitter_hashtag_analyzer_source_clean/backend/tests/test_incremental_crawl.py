@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from hashtag_analyzer import HashtagAnalyzer
+from services.fake_api_client import FakeApiClient, SimpleDataset
+from services.fake_nominatim_server import FakeNominatimServer
+from services.geocoding_service import GeocodingService
+
+
+class GrowingDataset(SimpleDataset):
+    """SimpleDataset that can receive tweets newer than all the ones before."""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.new_tweets = 0
+    
+    def __len__(self):
+        return self.total_tweets + self.new_tweets
+    
+    def item(self, index, hashtag):
+        return super().item(index - self.new_tweets, hashtag)
+
+
+@pytest.fixture
+def dataset():
+    return GrowingDataset(total_tweets=300, user_count=30, seed=9)
+
+
+@pytest.fixture
+def analyzer(tmp_path, dataset):
+    with FakeNominatimServer() as server:
+        geocoding_service = GeocodingService(
+            cache_file=str(tmp_path / 'location_cache.db'), legacy_cache_file=None, endpoint=server.url
+        )
+        analyzer = HashtagAnalyzer(os.path.join(tmp_path, 'incremental.db'), api_client=FakeApiClient(dataset=dataset),
+                                   geocoding_service=geocoding_service)
+        yield analyzer
+        analyzer.close()
+
+
+def mark(analyzer):
+    return analyzer.db.get_or_create_hashtag('growing')['newest_tweet_id']
+
+
+def test_incremental_needs_latest_searches(analyzer):
+    with pytest.raises(ValueError):
+        analyzer.analyze_hashtag('growing', 100, 'Top', incremental=True)
+    with pytest.raises(ValueError):
+        analyzer.analyze_many(['growing'], 100, 'Top', incremental=True)
+    with pytest.raises(ValueError):
+        analyzer.create_monitor(['growing'], 100, 'Top')
+    assert analyzer.db.conn.execute("SELECT COUNT(*) FROM crawl_jobs").fetchone()[0] == 0
+
+
+def test_top_search_leaves_the_mark_alone(analyzer, dataset):
+    analyzer.analyze_hashtag('growing', 100)
+    first_mark = mark(analyzer)
+    dataset.new_tweets = 50
+    analyzer.analyze_hashtag('growing', 100, 'Top')
+    assert mark(analyzer) == first_mark
+
+
+def test_short_crawl_records_a_gap_instead_of_advancing(analyzer, dataset):
+    analyzer.analyze_hashtag('growing', 100)
+    first_mark = mark(analyzer)
+    newest_id = dataset.item(0, 'growing')[0]['id']
+    assert first_mark == newest_id
+    
+    # More tweets arrived than the next crawl fetches
+    dataset.new_tweets = 250
+    results = analyzer.analyze_hashtag('growing', 100, incremental=True)
+    crawl = results['collection']['crawl']
+    assert results['collection']['inserted'] == 100
+    assert not crawl['reached_known']
+    assert mark(analyzer) == first_mark
+    hashtag_id = results['summary']['hashtag']['id']
+    gaps = analyzer.db.get_crawl_gaps(hashtag_id)
+    assert crawl['gap'] == {key: gaps[0][key] for key in crawl['gap']}
+    assert (gaps[0]['after_tweet_id'], gaps[0]['before_tweet_id']) == (first_mark, dataset.item(99, 'growing')[0]['id'])
+    
+    # A crawl that pages down to the stored tweets fills the gap
+    results = analyzer.analyze_hashtag('growing', 300, incremental=True)
+    assert results['collection']['crawl']['reached_known']
+    assert results['collection']['inserted'] == 150
+    assert results['collection']['crawl']['gap'] is None
+    assert mark(analyzer) == dataset.item(0, 'growing')[0]['id']
+    assert analyzer.db.get_crawl_gaps(hashtag_id) == []
+    assert results['summary']['hashtag']['total_tweets'] == 350
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from hashtag_analyzer import HashtagAnalyzer
+from services.fake_api_client import FakeApiClient, SimpleDataset
+from services.fake_nominatim_server import FakeNominatimServer
+from services.geocoding_service import GeocodingService
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    with FakeNominatimServer() as server:
+        geocoding_service = GeocodingService(
+            cache_file=str(tmp_path / 'location_cache.db'), legacy_cache_file=None, endpoint=server.url
+        )
+        client = FakeApiClient(dataset=SimpleDataset(total_tweets=200, user_count=30, seed=7))
+        analyzer = HashtagAnalyzer(os.path.join(tmp_path, 'locations.db'), api_client=client,
+                                   geocoding_service=geocoding_service)
+        yield analyzer
+        analyzer.close()
+
+
+def distinct_counts(db, hashtag_id, columns):
+    """Count distinct users per place by joining tweets, as the stats did before materializing them."""
+    rows = db.conn.execute(
+        f"""
+        SELECT {', '.join('l.' + column for column in columns)}, COUNT(DISTINCT t.user_id)
+        FROM tweets t
+        JOIN user_locations ul ON ul.user_id = t.user_id
+        JOIN locations l ON l.id = ul.location_id
+        WHERE t.hashtag_id = ? AND l.{columns[0]} IS NOT NULL
+        GROUP BY {', '.join('l.' + column for column in columns)}
+        """,
+        (hashtag_id,)
+    )
+    return {tuple(row[:-1]): row[-1] for row in rows}
+
+
+def test_user_with_several_places_is_counted_once(analyzer):
+    results = analyzer.analyze_hashtag('places', 200)
+    hashtag_id = results['summary']['hashtag']['id']
+    db = analyzer.db
+    berlin = [row for row in results['locations']['locations'] if row['location_text'] == "Berlin, Germany"][0]
+    berliners = berlin['user_count']
+    
+    # A Berliner also linked to another spelling of the same place
+    user_id = db.conn.execute(
+        """
+        SELECT ul.user_id FROM user_locations ul JOIN locations l ON l.id = ul.location_id
+        WHERE l.location_text = 'Berlin, Germany'
+        """
+    ).fetchone()[0]
+    location_id = db.save_location("Berlin, DE", berlin['latitude'], berlin['longitude'], berlin['country'], "Berlin")
+    assert db.link_user_location(user_id, location_id)
+    
+    stats = db.get_location_stats(hashtag_id)
+    countries = {row['country']: row['user_count'] for row in stats['countries']}
+    cities = {(row['city'], row['country']): row['user_count'] for row in stats['cities']}
+    assert countries[berlin['country']] == berliners
+    assert cities[("Berlin", berlin['country'])] == berliners
+    assert countries == {key[0]: count for key, count in distinct_counts(db, hashtag_id, ['country']).items()}
+    assert cities == distinct_counts(db, hashtag_id, ['city', 'country'])
+    
+    # Each place still lists the user
+    places = {row['location_text']: row['user_count'] for row in stats['locations']}
+    assert places["Berlin, DE"] == 1
+    assert places["Berlin, Germany"] == berliners
@@ -0,0 +1,108 @@
+import sqlite3
+
+import pytest
+
+from models.database import Database, to_epoch
+from models.migrations import _backfill_epochs, schema_version, MIGRATIONS
+
+CREATED_AT = [
+    "2025-04-01 12:00:00",
+    "2025-04-01 12:00:59",
+    "2024-02-29 23:59:59",
+    "1970-01-01 00:00:00",
+    "2025-04-01T12:00:00",
+    "2025-04-01 12:00:00.250",
+    "2025-04-01 14:00:00+02:00",
+    "2025-03-31 19:30:00-04:30",
+]
+
+
+def downgrade_to_version_6(path):
+    """Turn a current database back into one from before epoch timestamps."""
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        DROP INDEX idx_tweets_hashtag_epoch;
+        ALTER TABLE tweets DROP COLUMN created_epoch;
+        DROP INDEX idx_hashtag_stats_hashtag_epoch;
+        ALTER TABLE hashtag_stats DROP COLUMN timestamp_epoch;
+        CREATE INDEX idx_tweets_created_at ON tweets(created_at);
+        DROP TABLE tweet_rollups;
+        CREATE TABLE tweet_rollups (
+            hashtag_id INTEGER NOT NULL,
+            resolution TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            tweet_count INTEGER DEFAULT 0,
+            original_count INTEGER DEFAULT 0,
+            retweet_count INTEGER DEFAULT 0,
+            reply_count INTEGER DEFAULT 0,
+            media_count INTEGER DEFAULT 0,
+            positive_count INTEGER DEFAULT 0,
+            negative_count INTEGER DEFAULT 0,
+            sentiment_sum REAL DEFAULT 0,
+            users BLOB,
+            PRIMARY KEY (hashtag_id, resolution, bucket)
+        ) WITHOUT ROWID;
+        PRAGMA user_version = 6;
+        """
+    )
+    return conn
+
+
+def test_epoch_timestamps_are_backfilled(tmp_path):
+    path = str(tmp_path / 'old.db')
+    Database(path).close()
+    
+    conn = downgrade_to_version_6(path)
+    with conn:
+        conn.execute("INSERT INTO hashtags (id, name) VALUES (1, 'old')")
+        conn.executemany(
+            "INSERT INTO tweets (id, hashtag_id, user_id, content, created_at) VALUES (?, 1, 'u', 'text', ?)",
+            [(str(index), created_at) for index, created_at in enumerate(CREATED_AT)]
+        )
+        conn.execute(
+            "INSERT INTO hashtag_stats (hashtag_id, timestamp, tweet_count) VALUES (1, '2025-04-01 12:30:00', 8)"
+        )
+        conn.executemany(
+            "INSERT INTO tweet_rollups (hashtag_id, resolution, bucket, tweet_count) VALUES (1, 'hour', ?, ?)",
+            [("2025-04-01 12:00:00", 5), ("2025-04-01 11:00:00", 3)]
+        )
+    conn.close()
+    
+    db = Database(path)
+    try:
+        assert schema_version(db.conn) == MIGRATIONS[-1][0]
+        rows = db.conn.execute("SELECT created_at, created_epoch FROM tweets ORDER BY CAST(id AS INTEGER)")
+        # Rows stored before the migration get the same epochs as rows saved after it
+        assert [(row[0], row[1]) for row in rows] == [(value, to_epoch(value)) for value in CREATED_AT]
+        assert db.conn.execute("SELECT timestamp_epoch FROM hashtag_stats").fetchone()[0] == \
+            to_epoch("2025-04-01 12:30:00")
+        
+        buckets = db.conn.execute("SELECT typeof(bucket), bucket, tweet_count FROM tweet_rollups ORDER BY bucket")
+        assert [tuple(row) for row in buckets] == [
+            ('integer', to_epoch("2025-04-01 11:00:00"), 3),
+            ('integer', to_epoch("2025-04-01 12:00:00"), 5),
+        ]
+        indexes = {row[1] for row in db.conn.execute("PRAGMA index_list(tweets)")}
+        assert 'idx_tweets_hashtag_epoch' in indexes
+        assert 'idx_tweets_created_at' not in indexes
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("batch_size", [1, 3, 10000])
+def test_backfill_covers_every_batch(batch_size):
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE events (happened_at TEXT, happened_epoch INTEGER)")
+    conn.executemany("INSERT INTO events (happened_at) VALUES (?)",
+                     [(f"2025-04-01 12:00:{second:02d}",) for second in range(20)])
+    # Deleted rows leave gaps in the rowids, and filled rows are left alone
+    conn.execute("DELETE FROM events WHERE rowid IN (4, 5, 6, 13)")
+    conn.execute("UPDATE events SET happened_epoch = -1 WHERE rowid = 20")
+    
+    _backfill_epochs(conn.cursor(), 'events', 'happened_at', 'happened_epoch', batch_size=batch_size)
+    
+    rows = conn.execute("SELECT rowid, happened_at, happened_epoch FROM events ORDER BY rowid").fetchall()
+    assert len(rows) == 16
+    for rowid, happened_at, happened_epoch in rows:
+        assert happened_epoch == (-1 if rowid == 20 else to_epoch(happened_at))
@@ -0,0 +1,59 @@
+from services.monitor_scheduler import FakeClock, MonitorScheduler
+
+
+class Feed:
+    """Hashtag receiving tweets at a constant rate, crawled up to a capacity per poll."""
+    
+    def __init__(self, clock, rate, capacity, backlog=0):
+        self.clock = clock
+        self.rate = rate
+        self.capacity = capacity
+        self.backlog = backlog
+        self.retrieved = 0
+        self.missed = 0
+        self.last_new_tweets = 0
+    
+    def poll(self, hashtag):
+        # An incremental crawl takes the newest tweets and never returns for older ones
+        pending = self.backlog + int(self.clock.now() * self.rate) - self.retrieved - self.missed
+        self.last_new_tweets = min(pending, self.capacity)
+        self.retrieved += self.last_new_tweets
+        self.missed += pending - self.last_new_tweets
+        return {'new_tweets': self.last_new_tweets, 'requests': 1}
+    
+    def velocity(self, hashtag):
+        # Stats snapshots that lag far behind the feed
+        return {'new_tweets': self.last_new_tweets, 'tweets_per_minute': 0.5}
+
+
+def run(feed, clock, hours=12, **options):
+    scheduler = MonitorScheduler(feed.poll, feed.velocity, clock=clock, poll_capacity=feed.capacity,
+                                 requests_per_hour=3600, **options)
+    scheduler.add('feed')
+    records = []
+    scheduler.run(until=hours * 3600, on_poll=records.append)
+    return records
+
+
+def test_steady_feed_is_not_polled_less_often_than_needed():
+    clock = FakeClock()
+    feed = Feed(clock, rate=0.1, capacity=100, backlog=200)
+    records = run(feed, clock)
+    
+    # Only the history behind the first poll is out of reach
+    assert feed.missed == 100
+    assert all(record['new_tweets'] < feed.capacity for record in records[1:])
+    assert max(record['interval'] for record in records[1:]) * feed.rate <= feed.capacity
+
+
+def test_saturated_poll_is_followed_up_quickly():
+    clock = FakeClock()
+    feed = Feed(clock, rate=2.0, capacity=100)
+    records = run(feed, clock, hours=1, min_interval=10)
+    
+    saturated = [record for record in records if record['new_tweets'] == feed.capacity]
+    assert saturated
+    assert all(record['interval'] == 10 for record in saturated)
+    # Polls settle at half the capacity once the rate has been measured
+    assert records[-1]['interval'] * feed.rate <= feed.capacity / 2
+    assert len(saturated) == 1
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from hashtag_analyzer import HashtagAnalyzer
+from models.query_plans import QueryPlanRecorder, check_query_plans, explain, plan_problems
+from services.fake_api_client import FakeApiClient, SimpleDataset
+from services.fake_nominatim_server import FakeNominatimServer
+from services.geocoding_service import GeocodingService
+
+
+@pytest.fixture(scope='module')
+def workload(tmp_path_factory):
+    """Ingest a seeded timeline twice and read the dashboard, recording every statement."""
+    tmp = str(tmp_path_factory.mktemp('plans'))
+    with FakeNominatimServer() as server:
+        geocoding_service = GeocodingService(
+            cache_file=os.path.join(tmp, 'location_cache.db'), legacy_cache_file=None, endpoint=server.url
+        )
+        client = FakeApiClient(dataset=SimpleDataset(total_tweets=600, user_count=80, seed=7))
+        analyzer = HashtagAnalyzer(os.path.join(tmp, 'plans.db'), api_client=client,
+                                   geocoding_service=geocoding_service)
+        db = analyzer.db
+        
+        with QueryPlanRecorder(db.conn) as recorder:
+            # A first run, then one overlapping it, so backfill, new and duplicate paths all run
+            analyzer.analyze_hashtag('plans', 300)
+            results = analyzer.analyze_hashtag('plans', 600)
+            hashtag_id = results['summary']['hashtag']['id']
+            activity = db.get_activity_timeline(hashtag_id, 'minute')
+            window = (activity[0]['bucket'], activity[-1]['bucket'])
+            db.get_activity_timeline(hashtag_id, 'minute', *window)
+            db.get_sentiment_timeline(hashtag_id, 'day', start=window[0])
+            db.get_recent_velocity(hashtag_id)
+            db.get_top_contributors(hashtag_id)
+        
+        yield db, recorder.statements
+        analyzer.close()
+
+
+def test_workload_records_hot_queries(workload):
+    db, statements = workload
+    text = '\n'.join(statements)
+    for table in ('tweets', 'tweet_rollups', 'top_contributors', 'hashtag_user_counts', 'hashtag_locations'):
+        assert table in text
+    assert len(statements) > 100
+
+
+def test_no_full_scans_or_temp_sorts(workload):
+    db, statements = workload
+    failures = [
+        (' '.join(sql.split())[:200], problems)
+        for sql, plan, problems in check_query_plans(db.conn, statements)
+        if problems
+    ]
+    assert failures == []
+
+
+def test_checker_flags_bad_plans(workload):
+    db, statements = workload
+    sql = "SELECT * FROM tweets WHERE content LIKE '%news%' ORDER BY like_count"
+    problems = plan_problems(sql, explain(db.conn, sql))
+    assert any(step.startswith('SCAN') for step in problems)
+    assert any('USE TEMP B-TREE' in step for step in problems)
@@ -0,0 +1,88 @@
+import os
+
+from services.response_archive import ResponseArchive, ReplayApiClient
+
+
+def record(archive, count, start=0):
+    for number in range(start, start + count):
+        archive.append('Twitter/search_twitter', {'query': '#archive', 'cursor': f"offset:{number}"},
+                       {'page': number, 'text': "ünïcode"})
+
+
+def pages(path):
+    with ResponseArchive(path, readonly=True) as archive:
+        return [entry['response']['page'] for entry in archive]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'responses.jsonl.gz')
+    with ResponseArchive(path) as archive:
+        record(archive, 3)
+        archive.append('Twitter/user', None, b'{"raw": true}')
+    
+    with ResponseArchive(path, readonly=True) as archive:
+        assert len(archive) == 4
+        assert archive.read(1) == {
+            'api': 'Twitter/search_twitter',
+            'query': {'query': '#archive', 'cursor': "offset:1"},
+            'response': {'page': 1, 'text': "ünïcode"}
+        }
+        assert archive.read(3)['response'] == {'raw': True}
+    
+    client = ReplayApiClient(path)
+    assert client.call_api('Twitter/search_twitter', {'query': '#archive', 'cursor': "offset:2"})['page'] == 2
+    assert client.call_api('Twitter/search_twitter', {'query': '#archive', 'cursor': "offset:2"}) == {}
+    assert client.remaining() == 3
+    client.close()
+
+
+def test_missing_index_is_rebuilt(tmp_path):
+    path = str(tmp_path / 'responses.jsonl.gz')
+    with ResponseArchive(path) as archive:
+        record(archive, 5)
+    os.remove(path + '.idx')
+    
+    with ResponseArchive(path) as archive:
+        assert len(archive) == 5
+        record(archive, 1, start=5)
+    assert pages(path) == list(range(6))
+    with open(path + '.idx') as f:
+        assert len(f.readlines()) == 6
+
+
+def test_unflushed_index_entries_are_recovered(tmp_path):
+    path = str(tmp_path / 'responses.jsonl.gz')
+    with ResponseArchive(path) as archive:
+        record(archive, 4)
+    with open(path + '.idx') as f:
+        lines = f.readlines()
+    # The last entry is torn and the one before it never reached the index
+    with open(path + '.idx', 'w') as f:
+        f.writelines(lines[:2] + [lines[3][:10]])
+    
+    assert pages(path) == list(range(4))
+    with ResponseArchive(path) as archive:
+        assert len(archive) == 4
+    with open(path + '.idx') as f:
+        assert f.readlines() == lines
+
+
+def test_torn_record_is_trimmed(tmp_path):
+    path = str(tmp_path / 'responses.jsonl.gz')
+    with ResponseArchive(path) as archive:
+        record(archive, 3)
+        size = os.path.getsize(path)
+        record(archive, 1, start=3)
+    # The last record was cut off before its index entry was written
+    with open(path, 'r+b') as f:
+        f.truncate(size + 10)
+    with open(path + '.idx') as f:
+        lines = f.readlines()
+    with open(path + '.idx', 'w') as f:
+        f.writelines(lines[:3])
+    
+    with ResponseArchive(path) as archive:
+        assert len(archive) == 3
+        assert os.path.getsize(path) == size
+        record(archive, 1, start=3)
+    assert pages(path) == list(range(4))
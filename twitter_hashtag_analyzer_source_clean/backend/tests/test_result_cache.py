@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+from hashtag_analyzer import HashtagAnalyzer
+from services.fake_api_client import FakeApiClient, SimpleDataset
+from services.fake_nominatim_server import FakeNominatimServer
+from services.geocoding_service import GeocodingService
+from services.result_cache import ResultCache
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    with FakeNominatimServer() as server:
+        geocoding_service = GeocodingService(
+            cache_file=str(tmp_path / 'location_cache.db'), legacy_cache_file=None, endpoint=server.url
+        )
+        client = FakeApiClient(dataset=SimpleDataset(total_tweets=300, user_count=40, seed=3))
+        analyzer = HashtagAnalyzer(os.path.join(tmp_path, 'cache.db'), api_client=client,
+                                   geocoding_service=geocoding_service)
+        yield analyzer
+        analyzer.close()
+
+
+def cached_results(analyzer, hashtag_id):
+    """Get analysis results, asserting they came from the result cache."""
+    hits = analyzer.result_cache.stats()['hits']
+    results = analyzer._get_analysis_results(hashtag_id)
+    assert analyzer.result_cache.stats()['hits'] == hits + 1
+    return results
+
+
+def test_profile_change_invalidates_cached_results(analyzer):
+    results = analyzer.analyze_hashtag('cache', 300)
+    hashtag_id = results['summary']['hashtag']['id']
+    contributor = results['top_contributors'][0]
+    cached_results(analyzer, hashtag_id)
+    
+    db = analyzer.db
+    version = db.get_data_version(hashtag_id)
+    user = dict(db.conn.execute("SELECT * FROM users WHERE id = ?", (contributor['user_id'],)).fetchone())
+    assert not db.save_user(user)
+    assert db.get_data_version(hashtag_id) == version
+    
+    assert db.save_user(dict(user, display_name="Renamed", username="renamed"))
+    assert db.get_data_version(hashtag_id) > version
+    
+    results = analyzer._get_analysis_results(hashtag_id)
+    renamed = [row for row in results['top_contributors'] if row['user_id'] == contributor['user_id']]
+    assert renamed[0]['display_name'] == "Renamed"
+    assert renamed[0]['username'] == "renamed"
+
+
+def test_location_change_invalidates_cached_results(analyzer):
+    results = analyzer.analyze_hashtag('cache', 300)
+    hashtag_id = results['summary']['hashtag']['id']
+    location = results['locations']['locations'][0]
+    cached_results(analyzer, hashtag_id)
+    
+    db = analyzer.db
+    version = db.get_data_version(hashtag_id)
+    place = (location['latitude'], location['longitude'], location['country'], location['city'])
+    db.save_location(location['location_text'], *place)
+    assert db.get_data_version(hashtag_id) == version
+    
+    db.save_location(location['location_text'], 1.5, 2.5, "Elsewhere", "Moved")
+    assert db.get_data_version(hashtag_id) > version
+    
+    results = analyzer._get_analysis_results(hashtag_id)
+    moved = [row for row in results['locations']['locations'] if row['location_text'] == location['location_text']]
+    assert (moved[0]['latitude'], moved[0]['longitude'], moved[0]['city']) == (1.5, 2.5, "Moved")
+
+
+def test_disk_tier_is_kept_apart_per_database(tmp_path):
+    cache_dir = str(tmp_path / 'results')
+    
+    def open_analyzer(name):
+        geocoding_service = GeocodingService(cache_file=str(tmp_path / 'location_cache.db'), legacy_cache_file=None,
+                                             endpoint='http://127.0.0.1:9')
+        analyzer = HashtagAnalyzer(str(tmp_path / name), api_client=FakeApiClient(),
+                                   geocoding_service=geocoding_service,
+                                   result_cache=ResultCache(cache_dir=cache_dir))
+        hashtag_id = analyzer.db.get_or_create_hashtag('shared')['id']
+        if analyzer.db.get_data_version(hashtag_id) is None:
+            analyzer.db.rebuild_hashtag_counters(hashtag_id)
+        return analyzer, (hashtag_id, analyzer.db.get_data_version(hashtag_id))
+    
+    def disk_hits(name):
+        analyzer, (hashtag_id, _) = open_analyzer(name)
+        analyzer._get_analysis_results(hashtag_id)
+        hits = analyzer.result_cache.stats()['disk_hits']
+        analyzer.close()
+        return hits
+    
+    first, key = open_analyzer('first.db')
+    first._get_analysis_results(key[0])
+    first.close()
+    assert disk_hits('first.db') == 1
+    
+    # Same hashtag id and data version in another database
+    second, second_key = open_analyzer('second.db')
+    second.close()
+    assert second_key == key
+    assert disk_hits('second.db') == 0
+    
+    # A database recreated at the same path is another database too
+    os.remove(str(tmp_path / 'first.db'))
+    assert disk_hits('first.db') == 0
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from hashtag_analyzer import HashtagAnalyzer
+from services.fake_api_client import FakeApiClient, SimpleDataset
+from services.fake_nominatim_server import FakeNominatimServer
+from services.geocoding_service import GeocodingService
+
+
+@pytest.fixture
+def make_analyzer(tmp_path):
+    analyzers = []
+    with FakeNominatimServer() as server:
+        def make_analyzer(name):
+            geocoding_service = GeocodingService(
+                cache_file=str(tmp_path / f'{name}_location_cache.db'), legacy_cache_file=None, endpoint=server.url
+            )
+            client = FakeApiClient(dataset=SimpleDataset(total_tweets=1000, user_count=60, seed=3))
+            analyzer = HashtagAnalyzer(os.path.join(tmp_path, f'{name}.db'), api_client=client,
+                                       geocoding_service=geocoding_service)
+            drop_authors(analyzer)
+            analyzers.append(analyzer)
+            return analyzer
+        
+        yield make_analyzer
+        for analyzer in analyzers:
+            analyzer.close()
+
+
+def drop_authors(analyzer):
+    """Serve every tenth tweet without its author, as the service does for tweets it can't parse fully."""
+    search_hashtag = analyzer.twitter_service.search_hashtag
+    
+    def search_with_incomplete_tweets(*args, **kwargs):
+        results = search_hashtag(*args, **kwargs)
+        for tweet in results['tweets']:
+            if int(tweet['id']) % 10 == 0:
+                tweet['user_id'] = None
+        return results
+    
+    analyzer.twitter_service.search_hashtag = search_with_incomplete_tweets
+
+
+def test_resumed_crawl_collects_the_same_total(make_analyzer):
+    straight = make_analyzer('straight')
+    straight.analyze_hashtag('resume', 300)
+    job = straight.db.conn.execute("SELECT * FROM crawl_jobs").fetchone()
+    assert job['fetched_count'] == 300
+    assert straight.db.conn.execute("SELECT COUNT(*) FROM tweets").fetchone()[0] == 300
+    
+    interrupted = make_analyzer('interrupted')
+    process_page = interrupted._process_page
+    processed = []
+    
+    def failing(page):
+        if len(processed) == 2:
+            raise RuntimeError("connection lost")
+        processed.append(page)
+        return process_page(page)
+    
+    interrupted._process_page = failing
+    with pytest.raises(RuntimeError):
+        interrupted.analyze_hashtag('resume', 300)
+    interrupted._process_page = process_page
+    
+    results = interrupted.resume_crawl('resume')
+    assert results['collection']['crawl']['resumed']
+    finished = interrupted.db.get_crawl_job(results['collection']['crawl']['job_id'])
+    assert finished['status'] == 'completed'
+    assert finished['fetched_count'] == 300
+    stored = interrupted.db.conn.execute("SELECT id FROM tweets ORDER BY id").fetchall()
+    assert [row[0] for row in stored] == [
+        row[0] for row in straight.db.conn.execute("SELECT id FROM tweets ORDER BY id")
+    ]
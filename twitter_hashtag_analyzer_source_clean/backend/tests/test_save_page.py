@@ -0,0 +1,115 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from models.database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'pages.db'))
+    yield db
+    db.close()
+
+
+def make_user(user_id, **fields):
+    user = {
+        'id': user_id,
+        'username': f'user{user_id}',
+        'display_name': f'User {user_id}',
+        'profile_image_url': '',
+        'followers_count': 100,
+        'following_count': 10,
+        'tweet_count': 5,
+        'location': 'Berlin, Germany',
+        'account_created_at': datetime(2020, 1, 1, tzinfo=timezone.utc),
+        'is_verified': False
+    }
+    user.update(fields)
+    return user
+
+
+def make_tweet(tweet_id, user_id):
+    return {
+        'id': str(tweet_id),
+        'user_id': user_id,
+        'content': f'tweet {tweet_id}',
+        'created_at': datetime(2024, 5, 1, 12, tweet_id % 60, tzinfo=timezone.utc)
+    }
+
+
+def test_unchanged_profiles_are_not_rewritten(db):
+    hashtag_id = db.get_or_create_hashtag('pages')['id']
+    fingerprints = {}
+    first = db.save_page([make_tweet(1, 'a')], [make_user('a')], hashtag_id, fingerprints=fingerprints)
+    assert first['users_written'] == 1
+    
+    # Compared against the map, and against the stored row by a fresh crawl
+    assert db.save_page([make_tweet(2, 'a')], [make_user('a')], hashtag_id, fingerprints=fingerprints)['users_written'] == 0
+    assert db.save_page([make_tweet(3, 'a')], [make_user('a')], hashtag_id, fingerprints={})['users_written'] == 0
+    
+    changed = make_user('a', followers_count=101)
+    assert db.save_page([make_tweet(4, 'a')], [changed], hashtag_id, fingerprints=fingerprints)['users_written'] == 1
+    assert db.conn.execute("SELECT followers_count FROM users WHERE id = 'a'").fetchone()[0] == 101
+
+
+def test_rolled_back_page_is_written_when_retried(db, monkeypatch):
+    hashtag_id = db.get_or_create_hashtag('pages')['id']
+    job_id = db.create_crawl_job(hashtag_id, 'Latest', 10)['id']
+    fingerprints = {}
+    page = ([make_tweet(1, 'a')], [make_user('a'), make_user('b')])
+    
+    def fail(job_id, tweets):
+        raise RuntimeError("connection lost")
+    
+    monkeypatch.setattr(db, '_crawl_job_range', fail)
+    with pytest.raises(RuntimeError):
+        db.save_page(*page, hashtag_id, job_id=job_id, cursor='next', fingerprints=fingerprints)
+    monkeypatch.undo()
+    
+    assert fingerprints == {}
+    assert db.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
+    
+    result = db.save_page(*page, hashtag_id, job_id=job_id, cursor='next', fingerprints=fingerprints)
+    assert result['inserted'] == 1
+    assert result['users_written'] == 2
+    assert db.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 2
+    assert set(fingerprints) == {'a', 'b'}
+
+
+def test_page_counts_inserted_and_duplicate_tweets(db):
+    hashtag_id = db.get_or_create_hashtag('pages')['id']
+    first = db.save_page([make_tweet(1, 'a'), make_tweet(2, 'b')], [make_user('a'), make_user('b')], hashtag_id)
+    assert (first['inserted'], first['duplicates'], first['users']) == (2, 0, 2)
+    
+    # Overlapping pages, and a tweet repeated within one page
+    second = db.save_page([make_tweet(2, 'b'), make_tweet(3, 'a'), make_tweet(3, 'a')],
+                          [make_user('a'), make_user('b')], hashtag_id)
+    assert (second['inserted'], second['duplicates']) == (1, 2)
+    
+    counters = db.conn.execute("SELECT tweet_count, contributor_count FROM hashtag_counters").fetchone()
+    assert tuple(counters) == (3, 2)
+    assert db.conn.execute("SELECT COUNT(*) FROM tweets").fetchone()[0] == 3
+
+
+def test_failed_page_leaves_nothing_behind(db, monkeypatch):
+    hashtag_id = db.get_or_create_hashtag('pages')['id']
+    job_id = db.create_crawl_job(hashtag_id, 'Latest', 10)['id']
+    db.save_page([make_tweet(1, 'a')], [make_user('a')], hashtag_id, job_id=job_id, cursor='page 2')
+    version = db.get_data_version(hashtag_id)
+    
+    def fail(job_id, tweets):
+        raise RuntimeError("connection lost")
+    
+    monkeypatch.setattr(db, '_crawl_job_range', fail)
+    with pytest.raises(RuntimeError):
+        db.save_page([make_tweet(2, 'b')], [make_user('b')], hashtag_id, job_id=job_id, cursor='page 3')
+    
+    # Tweets, users, counters and the job's cursor all roll back together
+    assert [row[0] for row in db.conn.execute("SELECT id FROM tweets")] == ['1']
+    assert [row[0] for row in db.conn.execute("SELECT id FROM users")] == ['a']
+    assert db.conn.execute("SELECT tweet_count FROM hashtag_counters").fetchone()[0] == 1
+    assert db.conn.execute("SELECT COUNT(*) FROM hashtag_user_counts").fetchone()[0] == 1
+    assert db.get_data_version(hashtag_id) == version
+    job = db.get_crawl_job(job_id)
+    assert (job['last_cursor'], job['fetched_count']) == ('page 2', 1)
@@ -0,0 +1,24 @@
+from models.database import Database
+from services.sentiment_analyzer import SentimentAnalyzer, content_hash
+
+
+def test_content_hash_keeps_case():
+    assert content_hash(":D great") != content_hash(":d great")
+    assert content_hash("  :D\tgreat \n") == content_hash(":D great")
+    assert content_hash("cafe\u0301") == content_hash("caf\u00e9")
+
+
+def test_emoticon_case_variants_are_scored_separately(tmp_path):
+    db = Database(str(tmp_path / 'sentiment.db'))
+    analyzer = SentimentAnalyzer(workers=1, db=db)
+    try:
+        assert analyzer.analyze_text(":D great") == 0.9
+        assert analyzer.analyze_text(":d great") == 0.8
+        
+        # The scores kept in the database are just as distinct
+        restarted = SentimentAnalyzer(workers=1, db=db)
+        assert restarted.analyze_text(":d great") == 0.8
+        assert restarted.cache_stats()['db_hits'] == 1
+    finally:
+        analyzer.close()
+        db.close()
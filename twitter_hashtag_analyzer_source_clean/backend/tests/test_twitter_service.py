@@ -0,0 +1,56 @@
+import random
+from datetime import datetime
+
+import pytest
+
+from services.twitter_service import TWITTER_DATE_FORMAT, parse_twitter_date
+
+
+def strptime_date(value):
+    """Parse a timestamp the way the service did before slicing it apart."""
+    try:
+        return datetime.strptime(value, TWITTER_DATE_FORMAT).strftime('%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return None
+
+
+def random_dates(count, seed=3):
+    rng = random.Random(seed)
+    dates = []
+    for _ in range(count):
+        moment = datetime(2006, 3, 21) + (datetime(2030, 1, 1) - datetime(2006, 3, 21)) * rng.random()
+        offset = rng.choice(['+0000', '+0530', '-0800', '+1400'])
+        dates.append(moment.strftime(f'%a %b %d %H:%M:%S {offset} %Y'))
+    return dates
+
+
+def test_matches_strptime_on_api_timestamps():
+    for value in random_dates(1000):
+        assert parse_twitter_date(value) == strptime_date(value), value
+
+
+@pytest.mark.parametrize("value", [
+    "Wed Oct 10 20:19:24 +0000 2018",
+    "Thu Feb 29 00:00:00 +0000 2024",
+    # Impossible dates and times
+    "Fri Feb 30 10:00:00 +0000 2024",
+    "Sat Feb 29 10:00:00 +0000 2025",
+    "Wed Oct 10 24:19:24 +0000 2018",
+    "Wed Oct 10 20:60:24 +0000 2018",
+    # Not in the fixed layout, left to strptime
+    "Wed Oct  1 20:19:24 +0000 2018",
+    "Wed Oct 10 20:19:24 +00:00 2018",
+    "Wed Oct 10 20:19:24 Z 2018",
+    "Wed Okt 10 20:19:24 +0000 2018",
+    "Wed Oct 1a 20:19:24 +0000 2018",
+    "Wed Oct １0 20:19:24 +0000 2018",
+    "2018-10-10 20:19:24",
+    "",
+])
+def test_matches_strptime_on_edge_cases(value):
+    assert parse_twitter_date(value) == strptime_date(value)
+
+
+@pytest.mark.parametrize("value", [None, 1539202764, b"Wed Oct 10 20:19:24 +0000 2018"])
+def test_non_strings_are_not_parsed(value):
+    assert parse_twitter_date(value) is None